@@ -7,6 +7,7 @@ import tempfile
 import uuid
 import logging
 import time
+import functools
 from pathlib import Path
 from typing import Optional, Tuple, Dict
 from dataclasses import dataclass
@@ -53,6 +54,12 @@ class MLSettings:
     demucs_device: str = os.getenv("DEMUCS_DEVICE", "cpu")
     demucs_num_workers: int = int(os.getenv("DEMUCS_NUM_WORKERS", "1"))
     omp_num_threads: int = int(os.getenv("OMP_NUM_THREADS", "4"))
+    # Minimum seconds between Demucs separation progress reports
+    demucs_progress_interval: float = float(os.getenv("DEMUCS_PROGRESS_INTERVAL", "5"))
+    # Drum hit classifier backend: "keras" (complete_network.h5) or "onnx" (complete_network.onnx, no TensorFlow)
+    drumhit_backend: str = os.getenv("DRUMHIT_BACKEND", "keras")
+    # Intra-op threads of the onnx backend (0: onnxruntime default)
+    drumhit_num_threads: int = int(os.getenv("DRUMHIT_NUM_THREADS", "0"))
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
     protocol_buffers_implementation: str = os.getenv(
         "PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "python"
@@ -79,11 +86,21 @@ import librosa
 import pandas as pd
 import soundfile as sf
 from inference.input_transform import drum_to_frame, drum_extraction
-from inference.prediction import predict_drumhit
+from inference.prediction import load_drumhit_model, predict_drumhit
 from inference.transcriber import drum_transcriber
+from services.progress import SeparationProgress
 logger.info("✓ All ML libraries loaded")
 
 
+@functools.lru_cache(maxsize=None)
+def _load_drumhit_model(model_path: str, backend: str, num_threads: int):
+    """Load the drum hit classifier once per process, and share it between jobs"""
+    start_time = time.time()
+    model = load_drumhit_model(model_path, backend=backend, num_threads=num_threads or None)
+    logger.info(f"✓ Drum hit classifier loaded ({backend}) in {time.time() - start_time:.1f}s")
+    return model
+
+
 class AnNOTEatorService:
     """Service for transcribing drums using AnNOTEator"""
     
@@ -95,7 +112,8 @@ class AnNOTEatorService:
             output_dir: Directory to save output files
         """
         self.annoteator_path = ANNOTEATOR_PATH
-        self.model_path = ANNOTEATOR_PATH / "inference" / "pretrained_models" / "annoteators" / "complete_network.h5"
+        model_file = "complete_network.onnx" if ml_settings.drumhit_backend == "onnx" else "complete_network.h5"
+        self.model_path = ANNOTEATOR_PATH / "inference" / "pretrained_models" / "annoteators" / model_file
         
         if output_dir:
             self.output_dir = Path(output_dir)
@@ -127,6 +145,8 @@ class AnNOTEatorService:
             output_name: Optional output filename (without extension)
             song_title: Title for the sheet music
             use_demucs: Whether to process through Demucs first (recommended: True)
+            progress_callback: Optional callable(progress, message, **details); Demucs
+                separation reports between 35% and 55% with its ETA (`eta_seconds`)
         
         Returns:
             Tuple of (musicxml_path, metadata)
@@ -186,32 +206,21 @@ class AnNOTEatorService:
                     else:
                         logger.warning(f"Demucs model directory missing: {demucs_dir}")
 
-                    # Heartbeat thread so we know it's still working even if tqdm progress bars are suppressed in Cloud logs
-                    import threading as _threading
-                    import itertools as _itertools
-                    _stop_event = _threading.Event()
-                    def _demucs_heartbeat():
-                        for i in _itertools.count(1):
-                            if _stop_event.wait(timeout=30):  # log every 30s until finished
-                                break
-                            logger.info(f"[Demucs heartbeat] Still processing... {i*30}s elapsed")
-                            sys.stdout.flush(); sys.stderr.flush()
-                    _hb_thread = _threading.Thread(target=_demucs_heartbeat, daemon=True)
-                    _hb_thread.start()
-                    sys.stdout.flush()
-                    sys.stderr.flush()
+                    # Segment progress, throughput and ETA instead of tqdm bars, which Cloud logs drop
+                    separation_progress = SeparationProgress(
+                        progress_callback or (lambda progress, message, **details: logger.info(f"[Demucs] {message}")),
+                        start_pct=35, end_pct=55,
+                        min_interval=ml_settings.demucs_progress_interval
+                    )
                     
                     drum_track, sample_rate = drum_extraction(
                         audio_path,
                         dir=str(self.annoteator_path / "inference" / "pretrained_models" / "demucs"),
                         kernel='demucs',
-                        mode='speed'
+                        mode='speed',
+                        callback=separation_progress
                     )
-                    _stop_event.set()
-                    try:
-                        _hb_thread.join(timeout=5)
-                    except Exception:
-                        pass
+                    separation_progress.finish()
                     
                     logger.info("✅ drum_extraction returned successfully")
                     if progress_callback:
@@ -278,7 +287,12 @@ class AnNOTEatorService:
             sys.stderr.flush()
             
             start_time = time.time()
-            prediction_df = predict_drumhit(str(self.model_path), df, sample_rate)
+            drumhit_model = _load_drumhit_model(
+                str(self.model_path),
+                ml_settings.drumhit_backend,
+                ml_settings.drumhit_num_threads
+            )
+            prediction_df = predict_drumhit(drumhit_model, df, sample_rate)
             elapsed = time.time() - start_time
             
             logger.info(f"✅ Predictions complete in {elapsed:.1f} seconds!")
@@ -313,24 +327,15 @@ class AnNOTEatorService:
             if progress_callback:
                 progress_callback(90, "Sheet music constructed")
             
-            # Step 5: Save to MusicXML
+            # Step 5: Save to MusicXML (the writer already sets up the percussion clef and drumset)
             logger.info(f"Saving to MusicXML format: {output_musicxml}")
-            sheet_music.sheet.write(fp=str(output_musicxml))
+            sheet_music.write_musicxml(output_musicxml)
             logger.info("✅ MusicXML file saved")
             sys.stdout.flush()
             sys.stderr.flush()
             if progress_callback:
                 progress_callback(95, "MusicXML saved")
             
-            # Step 6: Fix percussion setup
-            logger.info("Applying percussion clef fix for MuseScore...")
-            self._fix_percussion_setup(str(output_musicxml))
-            logger.info("✅ Percussion setup fixed")
-            sys.stdout.flush()
-            sys.stderr.flush()
-            if progress_callback:
-                progress_callback(97, "Percussion clef fix applied")
-            
             # Extract metadata
             metadata = self._extract_metadata(prediction_df, bpm, song_duration)
             if demucs_output_path:
@@ -356,61 +361,6 @@ class AnNOTEatorService:
             logger.error(f"Error during transcription: {e}", exc_info=True)
             raise
     
-    def _fix_percussion_setup(self, musicxml_path: str):
-        """Fix MusicXML to display as drums in MuseScore"""
-        from music21 import converter, clef, instrument, stream
-        
-        try:
-            logger.info("Applying percussion fix...")
-            
-            # Load the score
-            score = converter.parse(musicxml_path)
-            
-            # Get the part
-            part = score.parts[0]
-            
-            # Remove existing clefs at offset 0
-            clefs_to_remove = [
-                elem for elem in part.flatten()
-                if isinstance(elem, clef.Clef) and elem.offset == 0
-            ]
-            for c in clefs_to_remove:
-                part.remove(c, recurse=True)
-            
-            # Add percussion clef at the beginning
-            part.insert(0, clef.PercussionClef())
-            
-            # Remove existing instruments
-            instruments_to_remove = [
-                elem for elem in part.flatten()
-                if isinstance(elem, instrument.Instrument)
-            ]
-            for i in instruments_to_remove:
-                part.remove(i, recurse=True)
-            
-            # Add drumset instrument
-            drumset = instrument.Instrument()
-            drumset.instrumentName = "Drumset"
-            drumset.midiProgram = 0
-            drumset.midiChannel = 9  # MIDI channel 10 (0-indexed)
-            part.insert(0, drumset)
-            
-            # Set part ID
-            part.id = "Percussion"
-            
-            # Update metadata
-            if not score.metadata:
-                score.metadata = stream.Metadata()
-            score.metadata.composer = "Generated by GrooveSheet"
-            
-            # Save back
-            score.write('musicxml', fp=musicxml_path)
-            
-            logger.info("Percussion fix applied successfully")
-            
-        except Exception as e:
-            logger.warning(f"Could not fix percussion setup: {e}")
-    
     def _extract_metadata(self, prediction_df, bpm: float, duration: float) -> Dict:
         """Extract metadata from prediction results"""
         instrument_cols = ['KD', 'SD', 'HH', 'TT', 'RC', 'CC']
@@ -438,7 +388,7 @@ class AnNOTEatorService:
             "instruments_detected": counts,
             "bpm": round(bpm, 2),
             "duration_seconds": round(duration, 2),
-            "model": "AnNOTEator complete_network.h5"
+            "model": f"AnNOTEator {self.model_path.name}"
         }
     
     def cleanup_old_files(self, max_age_hours: int = 24):
@@ -60,6 +60,8 @@ class Settings:
     demucs_num_workers: int = int(os.getenv("DEMUCS_NUM_WORKERS", "1"))
     omp_num_threads: int = int(os.getenv("OMP_NUM_THREADS", "4"))
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    # Minimum seconds between job metadata progress writes
+    progress_interval: float = float(os.getenv("PROGRESS_INTERVAL", "10"))
     protocol_buffers_implementation: str = os.getenv(
         "PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "python"
     )
@@ -132,12 +134,14 @@ def start_health_server(port: int):
 # Import your service AFTER basic setup
 
 from services.annoteator_service import AnNOTEatorService
+from services.progress import ProgressWriter
 
 
 def run_transcription(
     audio_path: str,
     output_dir: str,
     song_title: str,
+    progress_callback: Optional[ProgressWriter] = None,
 ) -> Tuple[str, dict]:
     """
     Shared transcription logic for both cloud and local jobs.
@@ -164,6 +168,7 @@ def run_transcription(
             output_name="output",
             song_title=song_title,
             use_demucs=True,
+            progress_callback=progress_callback,
         )
 
         logger.info("annoteator.transcribe_audio() returned successfully!")
@@ -226,11 +231,21 @@ class CloudJobProcessor:
             # Load metadata + song title
             metadata, song_title = self._load_metadata(metadata_blob)
 
+            # Job progress and ETA go to the metadata blob, at most every progress_interval
+            progress = ProgressWriter(
+                metadata,
+                lambda m: metadata_blob.upload_from_string(
+                    json.dumps(m), content_type="application/json"
+                ),
+                min_interval=settings.progress_interval,
+            )
+
             # Transcribe
             result_path, _ = run_transcription(
                 audio_path=input_path,
                 output_dir=temp_dir,
                 song_title=song_title,
+                progress_callback=progress,
             )
 
             # Upload result
@@ -240,6 +255,7 @@ class CloudJobProcessor:
             # Update metadata
             metadata["status"] = "completed"
             metadata["progress"] = 100
+            metadata["eta_seconds"] = 0
             metadata_blob.upload_from_string(
                 json.dumps(metadata), content_type="application/json"
             )
@@ -296,6 +312,14 @@ class LocalJobProcessor:
     def __init__(self, jobs_dir: str):
         self.jobs_dir = jobs_dir
 
+    @staticmethod
+    def _write_metadata(metadata_path: str, metadata: dict):
+        """Replace metadata.json atomically, so pollers never read a partial file."""
+        tmp_path = metadata_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, metadata_path)
+
     def process_job_dir(self, job_dir: str):
         job_id = os.path.basename(job_dir)
         logger.info(f"Processing job {job_id}")
@@ -324,21 +348,26 @@ class LocalJobProcessor:
 
         song_title = metadata.get("filename", "Drum Transcription")
 
-        # Update progress before heavy work
-        metadata["progress"] = 30
-        with open(metadata_path, "w") as f:
-            json.dump(metadata, f)
+        # Update progress before heavy work, then let the job report its own progress
+        progress = ProgressWriter(
+            metadata,
+            lambda m: self._write_metadata(metadata_path, m),
+            min_interval=settings.progress_interval,
+        )
+        progress(30, "Job started")
 
         # Transcribe
         result_path, _ = run_transcription(
             audio_path=input_path,
             output_dir=job_dir,
             song_title=song_title,
+            progress_callback=progress,
         )
 
         # Mark completed
         metadata["status"] = "completed"
         metadata["progress"] = 100
+        metadata["eta_seconds"] = 0
         with open(metadata_path, "w") as f:
             json.dump(metadata, f)
 
@@ -0,0 +1,252 @@
+"""
+Demucs Autotuner - Calibrates segment/overlap/thread settings for CPU separation
+
+Runs a short calibration on synthetic audio, searching the segment length, overlap,
+intra-op thread count and apply_model pool workers under a memory cap. The best
+configuration is persisted per (model signature, cpu count, memory limit) so that
+DemucsService picks it up automatically on the same instance shape.
+
+Usage (from the demucs-worker directory, or /app in Docker):
+    python -m services.demucs_autotune --mode speed --duration 60
+"""
+import os
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Iterable
+from dataclasses import dataclass, asdict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TUNING_FILE = Path(__file__).parent.parent / "demucs_tuning.json"
+
+
+@dataclass
+class TuningConfig:
+    """Best apply_model settings found for one instance shape."""
+    segment: Optional[float]
+    overlap: float
+    num_threads: int
+    num_workers: int
+    realtime_factor: float  # processing seconds per audio second
+    peak_rss_bytes: int
+
+
+def tuning_file() -> Path:
+    """Location of the persisted tuning results."""
+    return Path(os.getenv("DEMUCS_TUNING_FILE", str(DEFAULT_TUNING_FILE)))
+
+
+def detect_memory_limit() -> int:
+    """Memory available to this container: cgroup limit if any, else physical memory."""
+    for cgroup_file in ("/sys/fs/cgroup/memory.max",  # cgroup v2
+                        "/sys/fs/cgroup/memory/memory.limit_in_bytes"):  # cgroup v1
+        try:
+            value = Path(cgroup_file).read_text().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 2**60:
+            return int(value)
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def tuning_key(model_signature: str, cpu_count: Optional[int] = None,
+               memory_limit: Optional[int] = None) -> str:
+    """Key under which a configuration is stored for a given model and instance shape."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    memory_limit = memory_limit or detect_memory_limit()
+    return f"{model_signature}|cpus={cpu_count}|mem={memory_limit // 2**20}MiB"
+
+
+def load_tuned_config(model_signature: str, path: Optional[Path] = None) -> Optional[TuningConfig]:
+    """Return the persisted configuration for this instance shape, or None if not tuned yet."""
+    path = path or tuning_file()
+    if not path.exists():
+        return None
+    try:
+        entries = json.loads(path.read_text())
+        entry = entries.get(tuning_key(model_signature))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read Demucs tuning file {path}: {e}")
+        return None
+    return TuningConfig(**entry) if entry else None
+
+
+def save_tuned_config(model_signature: str, config: TuningConfig, path: Optional[Path] = None):
+    """Persist `config` for this instance shape, keeping entries for other shapes."""
+    path = path or tuning_file()
+    entries = {}
+    if path.exists():
+        try:
+            entries = json.loads(path.read_text())
+        except ValueError:
+            logger.warning(f"Overwriting unreadable Demucs tuning file {path}")
+    entries[tuning_key(model_signature)] = asdict(config)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(entries, indent=2))
+    tmp_path.replace(path)
+
+
+class _PeakRSSSampler:
+    """Samples the resident set size of this process in a background thread."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_rss() -> int:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, self.current_rss())
+            self._stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop_event.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current_rss())
+
+
+def thread_layouts(cpu_count: int) -> List[Dict]:
+    """Intra-op threads / pool workers splits that never oversubscribe the cpus."""
+    layouts = []
+    for num_threads in sorted({cpu_count, max(1, cpu_count // 2), max(1, cpu_count // 4)},
+                              reverse=True):
+        layouts.append({"num_threads": num_threads, "num_workers": 0})
+        pool_workers = cpu_count // num_threads
+        if pool_workers > 1:
+            layouts.append({"num_threads": num_threads, "num_workers": pool_workers})
+    return layouts
+
+
+def _run_trial(model, wav, knobs: Dict, device: str, memory_cap: int) -> Optional[TuningConfig]:
+    """Time one apply_model run, returning None if it went over the memory cap."""
+    import torch
+    from demucs import apply
+
+    torch.set_num_threads(knobs["num_threads"])
+    duration = wav.shape[-1] / model.samplerate
+    with _PeakRSSSampler() as sampler:
+        start_time = time.time()
+        apply.apply_model(
+            model, wav,
+            device=device,
+            shifts=1,
+            split=True,
+            overlap=knobs["overlap"],
+            segment=knobs["segment"],
+            num_workers=knobs["num_workers"],
+        )
+        elapsed = time.time() - start_time
+    config = TuningConfig(realtime_factor=elapsed / duration, peak_rss_bytes=sampler.peak, **knobs)
+    within_cap = sampler.peak <= memory_cap
+    logger.info(f"Calibration {knobs}: {config.realtime_factor:.3f}s per audio second, "
+                f"peak RSS {sampler.peak / 2**30:.2f} GiB"
+                f"{'' if within_cap else ' (over memory cap, rejected)'}")
+    return config if within_cap else None
+
+
+def calibrate(model, duration: float = 60., memory_fraction: float = 0.8,
+              overlaps: Iterable[float] = (0.25, 0.1), device: str = "cpu") -> TuningConfig:
+    """
+    Time apply_model on `duration` seconds of synthetic audio and return the fastest
+    setting whose peak RSS stays below `memory_fraction` of the container memory limit.
+
+    The search is staged to keep calibration short: the thread layout is picked first
+    with the model's own segment and the default overlap, then the segment length,
+    then the overlap.
+    """
+    import torch
+
+    cpu_count = os.cpu_count() or 1
+    memory_cap = int(memory_fraction * detect_memory_limit())
+    max_segment = getattr(model, "max_allowed_segment", float("inf"))
+    segments = [s for s in (20., 10.) if s < max_segment]
+    overlaps = list(overlaps)
+
+    generator = torch.Generator().manual_seed(1234)
+    wav = torch.randn(1, model.audio_channels, int(duration * model.samplerate),
+                      generator=generator)
+
+    original_threads = torch.get_num_threads()
+    best: Optional[TuningConfig] = None
+
+    def _try(candidates: List[Dict]):
+        nonlocal best
+        for knobs in candidates:
+            config = _run_trial(model, wav, knobs, device, memory_cap)
+            if config is not None and (best is None or
+                                       config.realtime_factor < best.realtime_factor):
+                best = config
+
+    try:
+        _try([dict(layout, segment=None, overlap=overlaps[0])
+              for layout in thread_layouts(cpu_count)])
+        if best is not None:
+            layout = {"num_threads": best.num_threads, "num_workers": best.num_workers}
+            _try([dict(layout, segment=segment, overlap=best.overlap) for segment in segments])
+            _try([dict(layout, segment=best.segment, overlap=overlap) for overlap in overlaps[1:]])
+    finally:
+        torch.set_num_threads(original_threads)
+
+    if best is None:
+        raise RuntimeError(f"No Demucs configuration fits in {memory_cap / 2**30:.2f} GiB")
+    return best
+
+
+def ensure_tuned(mode: Optional[str] = None, duration: float = 60.,
+                 memory_fraction: float = 0.8, force: bool = False) -> TuningConfig:
+    """Load the persisted configuration for `mode`, calibrating first if there is none."""
+    from services.demucs_service import DemucsService, demucs_settings, model_signature
+
+    mode = mode or demucs_settings.demucs_mode
+    signature = model_signature(mode)
+    config = None if force else load_tuned_config(signature)
+    if config is not None:
+        logger.info(f"Demucs already tuned for {tuning_key(signature)}: {config}")
+        return config
+
+    logger.info(f"Calibrating Demucs for {tuning_key(signature)} "
+                f"on {duration:.0f}s of synthetic audio...")
+    model = DemucsService(output_dir=None).load_model(mode)
+    config = calibrate(model, duration=duration, memory_fraction=memory_fraction,
+                       device=demucs_settings.demucs_device)
+    save_tuned_config(signature, config)
+    logger.info(f"✓ Best Demucs configuration saved to {tuning_file()}: {config}")
+    return config
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calibrate Demucs CPU separation settings")
+    parser.add_argument("--mode", choices=["speed", "performance"], default=None,
+                        help="Demucs mode to tune (default: DEMUCS_MODE)")
+    parser.add_argument("--duration", type=float, default=60.,
+                        help="Seconds of synthetic audio per calibration run")
+    parser.add_argument("--memory-fraction", type=float, default=0.8,
+                        help="Reject settings whose peak RSS exceeds this fraction of the memory limit")
+    parser.add_argument("--force", action="store_true",
+                        help="Recalibrate even if a configuration exists for this instance shape")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    ensure_tuned(args.mode, duration=args.duration,
+                 memory_fraction=args.memory_fraction, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -31,15 +31,17 @@ except ImportError:
 
 # Add demucs library to path if it exists in library directory
 # In Docker: /app/services/demucs_service.py -> /app/library/demucs
-# Locally: demucs-worker/services/demucs_service.py -> library/demucs
+# Locally: demucs-worker/services/demucs_service.py -> library/demucs/build/lib
+# The vendored package takes precedence over the PyPI demucs release, which lacks
+# the apply_model options used below.
 if (Path(__file__).parent.parent / "library" / "demucs").exists():
     # Docker container structure: /app/services -> /app/library/demucs
     DEMUCS_LIB_PATH = Path(__file__).parent.parent / "library" / "demucs"
 else:
-    # Local development structure: demucs-worker/services -> library/demucs
-    DEMUCS_LIB_PATH = Path(__file__).parent.parent.parent / "library" / "demucs"
-    if DEMUCS_LIB_PATH.exists():
-        sys.path.insert(0, str(DEMUCS_LIB_PATH))
+    # Local development structure: demucs-worker/services -> library/demucs/build/lib
+    DEMUCS_LIB_PATH = Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"
+if (DEMUCS_LIB_PATH / "demucs").exists():
+    sys.path.insert(0, str(DEMUCS_LIB_PATH))
 
 # ---------------------------
 # Configuration
@@ -52,7 +54,15 @@ class DemucsSettings:
     demucs_device: str = os.getenv("DEMUCS_DEVICE", "cpu")
     demucs_num_workers: int = int(os.getenv("DEMUCS_NUM_WORKERS", "1"))
     demucs_mode: str = os.getenv("DEMUCS_MODE", "speed")  # 'speed' or 'performance'
+    # 'torch' or 'onnx' (ONNX exports of the models in DEMUCS_MODEL_DIR, run with onnxruntime)
+    demucs_backend: str = os.getenv("DEMUCS_BACKEND", "torch")
     demucs_model_dir: str = os.getenv("DEMUCS_MODEL_DIR", "")
+    # Segments quieter than this (dB relative to the whole track) skip the model, e.g. -50, empty disables
+    demucs_silence_threshold_db: str = os.getenv("DEMUCS_SILENCE_THRESHOLD_DB", "")
+    # Segments queued between prep/forward/overlap-add stages, 0 uses the plain worker pool
+    demucs_pipeline_depth: int = int(os.getenv("DEMUCS_PIPELINE_DEPTH", "0"))
+    # Minimum seconds between separation progress reports
+    demucs_progress_interval: float = float(os.getenv("DEMUCS_PROGRESS_INTERVAL", "5"))
     omp_num_threads: int = int(os.getenv("OMP_NUM_THREADS", "4"))
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
 
@@ -64,6 +74,19 @@ class DemucsSettings:
 # Initialize settings and apply to environment
 demucs_settings = DemucsSettings()
 
+# Model signatures used by each mode (the bag order matters for the model weights)
+MODEL_SIGNATURES = {
+    "speed": ["83fc094f"],
+    "performance": ["14fc6a69", "464b36d7", "7fd6ef75", "83fc094f"],
+}
+
+
+def model_signature(mode: str) -> str:
+    """Signature identifying the model(s) used by `mode`, e.g. for tuning lookups."""
+    if mode not in MODEL_SIGNATURES:
+        raise ValueError(f"Invalid mode: {mode}. Must be 'speed' or 'performance'")
+    return "+".join(MODEL_SIGNATURES[mode])
+
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
@@ -73,6 +96,8 @@ logger = logging.getLogger(__name__)
 logger.info("Loading Demucs libraries (one-time startup cost)...")
 import librosa
 import soundfile as sf
+from services.demucs_autotune import load_tuned_config, tuning_key
+from services.progress import SeparationProgress, count_segments
 logger.info("✓ Demucs libraries loaded")
 
 
@@ -106,7 +131,66 @@ class DemucsService:
         logger.info(f"Output directory: {self.output_dir}")
         logger.info(f"Device: {demucs_settings.demucs_device}")
         logger.info(f"Mode: {demucs_settings.demucs_mode}")
-        logger.info(f"Workers: {demucs_settings.demucs_num_workers}")
+        logger.info(f"Backend: {demucs_settings.demucs_backend}")
+        
+        # Separation settings, overridden by the autotuner results for this instance shape
+        self.segment = None
+        self.overlap = 0.25
+        self.num_workers = demucs_settings.demucs_num_workers
+        self.num_threads = demucs_settings.omp_num_threads
+        self.tuned_config = None
+        if demucs_settings.demucs_mode in MODEL_SIGNATURES:
+            signature = model_signature(demucs_settings.demucs_mode)
+            self.tuned_config = load_tuned_config(signature)
+            if self.tuned_config:
+                import torch
+                torch.set_num_threads(self.tuned_config.num_threads)
+                self.segment = self.tuned_config.segment
+                self.overlap = self.tuned_config.overlap
+                self.num_workers = self.tuned_config.num_workers
+                self.num_threads = self.tuned_config.num_threads
+                logger.info(f"Using autotuned settings for {tuning_key(signature)}: {self.tuned_config}")
+        if demucs_settings.demucs_backend == 'onnx' and self.segment is not None:
+            # An ONNX export only runs on segments of the length it was exported for
+            logger.info(f"ONNX backend: using the segment of the ONNX export instead of {self.segment}s")
+            self.segment = None
+        logger.info(f"Workers: {self.num_workers}")
+    
+    def load_model(self, mode: Optional[str] = None):
+        """
+        Load the Demucs model(s) for `mode` ('speed' or 'performance') as a BagOfModels.
+        With the onnx backend, each model runs from its `{signature}.onnx` export in the model directory.
+        """
+        from demucs import pretrained, apply
+        
+        mode = mode or demucs_settings.demucs_mode
+        model_repo = Path(self.model_dir) if self.model_dir else None
+        if mode == 'speed':
+            logger.info("Loading Demucs model (speed mode - single model)...")
+        elif mode == 'performance':
+            logger.info("Loading Demucs models (performance mode - bag of 4 models)...")
+        signatures = MODEL_SIGNATURES.get(mode, [])
+        models = [pretrained.get_model(name=sig, repo=model_repo) for sig in signatures]
+        if not models:
+            raise ValueError(f"Invalid mode: {mode}. Must be 'speed' or 'performance'")
+        if demucs_settings.demucs_backend == 'onnx':
+            models = [self._load_onnx_model(sig, model, model_repo) for sig, model in zip(signatures, models)]
+        elif demucs_settings.demucs_backend != 'torch':
+            raise ValueError(f"Invalid backend: {demucs_settings.demucs_backend}. Must be 'torch' or 'onnx'")
+        return apply.BagOfModels(models)
+    
+    def _load_onnx_model(self, signature: str, model, model_repo: Optional[Path]):
+        """Wrap `model` to run its network from the ONNX export in `model_repo` with onnxruntime"""
+        from demucs.onnx_model import ONNX_SUFFIX, OnnxModel
+        
+        if model_repo is None:
+            raise ValueError("The onnx backend needs DEMUCS_MODEL_DIR, where the ONNX exports are")
+        onnx_path = model_repo / (signature + ONNX_SUFFIX)
+        if not onnx_path.exists():
+            raise FileNotFoundError(
+                f"{onnx_path} not found, export it with "
+                f"development/others/export_demucs_onnx.py {signature} --repo {model_repo}")
+        return OnnxModel(model, onnx_path, num_threads=self.num_threads)
     
     def separate_audio(
         self,
@@ -122,6 +206,8 @@ class DemucsService:
             audio_path: Path to audio file (mp3, wav, etc.)
             output_name: Optional output filename (without extension)
             extract_drums_only: If True, only return drums track. If False, return all sources.
+            progress_callback: Optional callable(progress, message, **details), called with
+                separation progress between 30% and 90% and its ETA (`eta_seconds`).
         
         Returns:
             Tuple of (output_path, metadata)
@@ -145,27 +231,14 @@ class DemucsService:
             logger.info(f"Mode: {demucs_settings.demucs_mode}")
             
             # Import demucs
-            from demucs import pretrained, apply, audio
-            
-            # Determine model directory
-            model_repo = Path(self.model_dir) if self.model_dir else None
+            from demucs import apply, audio
             
             # Load model(s) based on mode
+            model = self.load_model()
             if demucs_settings.demucs_mode == 'speed':
-                logger.info("Loading Demucs model (speed mode - single model)...")
-                model = pretrained.get_model(name='83fc094f', repo=model_repo)
-                model = apply.BagOfModels([model])
                 logger.info("✓ Speed mode: processing time typically 1-2 mins.")
-            elif demucs_settings.demucs_mode == 'performance':
-                logger.info("Loading Demucs models (performance mode - bag of 4 models)...")
-                model_1 = pretrained.get_model(name='14fc6a69', repo=model_repo)
-                model_2 = pretrained.get_model(name='464b36d7', repo=model_repo)
-                model_3 = pretrained.get_model(name='7fd6ef75', repo=model_repo)
-                model_4 = pretrained.get_model(name='83fc094f', repo=model_repo)
-                model = apply.BagOfModels([model_1, model_2, model_3, model_4])
-                logger.info("✓ Performance mode: bag of 4 models, expect 4 progress bars (4-6 mins).")
             else:
-                raise ValueError(f"Invalid mode: {demucs_settings.demucs_mode}. Must be 'speed' or 'performance'")
+                logger.info("✓ Performance mode: bag of 4 models, expect 4 progress bars (4-6 mins).")
             
             # Load audio
             logger.info("Loading audio file...")
@@ -180,19 +253,58 @@ class DemucsService:
             wav = (wav - ref.mean()) / ref.std()
             
             # Apply model
-            logger.info(f"Applying Demucs model (workers={demucs_settings.demucs_num_workers})...")
+            logger.info(f"Applying Demucs model (workers={self.num_workers}, "
+                        f"segment={self.segment}, overlap={self.overlap})...")
             if progress_callback:
                 progress_callback(30, "Applying Demucs separation model")
             
+            silence_threshold = (
+                float(demucs_settings.demucs_silence_threshold_db)
+                if demucs_settings.demucs_silence_threshold_db else None
+            )
+            segment_states = {"start": 0, "skip": 0}
+            pipeline_stats = {}
+            expected_segments = sum(
+                count_segments(wav.shape[-1], model.samplerate, self.segment or sub_model.segment,
+                               overlap=self.overlap, shifts=1)
+                for sub_model in model.models
+            )
+            separation_progress = None
+            if progress_callback:
+                separation_progress = SeparationProgress(
+                    progress_callback, start_pct=30, end_pct=90, total_segments=expected_segments,
+                    min_interval=demucs_settings.demucs_progress_interval)
+            def _count_segments(info: dict):
+                if info["state"] in segment_states:
+                    segment_states[info["state"]] += 1
+                if "pipeline" in info:
+                    pipeline_stats.update(info["pipeline"])
+                if separation_progress is not None:
+                    separation_progress(info)
+            
             sources = apply.apply_model(
                 model, wav[None],
                 device=demucs_settings.demucs_device,
                 shifts=1,
                 split=True,
-                overlap=0.25,
+                overlap=self.overlap,
+                segment=self.segment,
                 progress=True,
-                num_workers=demucs_settings.demucs_num_workers
+                num_workers=self.num_workers,
+                silence_threshold=silence_threshold,
+                pipeline_depth=demucs_settings.demucs_pipeline_depth,
+                callback=_count_segments
             )[0]
+            if separation_progress is not None:
+                separation_progress.finish()
+            skipped_segments = segment_states["skip"]
+            total_segments = skipped_segments + segment_states["start"]
+            logger.info(f"Skipped {skipped_segments}/{total_segments} silent segments "
+                        f"(threshold={silence_threshold} dB)")
+            if pipeline_stats:
+                logger.info(f"Pipeline stage times: prepare={pipeline_stats['prepare_time']:.2f}s, "
+                            f"forward={pipeline_stats['forward_time']:.2f}s, "
+                            f"accumulate={pipeline_stats['accumulate_time']:.2f}s")
             
             # Denormalize
             sources = sources * ref.std() + ref.mean()
@@ -215,7 +327,10 @@ class DemucsService:
                     "output_type": "drums_only",
                     "sample_rate": sample_rate,
                     "mode": demucs_settings.demucs_mode,
-                    "device": demucs_settings.demucs_device
+                    "backend": demucs_settings.demucs_backend,
+                    "device": demucs_settings.demucs_device,
+                    "skipped_segments": skipped_segments,
+                    "total_segments": total_segments
                 }
                 
                 return str(output_path), metadata
@@ -240,7 +355,10 @@ class DemucsService:
                     "output_files": output_files,
                     "sample_rate": model.samplerate,
                     "mode": demucs_settings.demucs_mode,
-                    "device": demucs_settings.demucs_device
+                    "backend": demucs_settings.demucs_backend,
+                    "device": demucs_settings.demucs_device,
+                    "skipped_segments": skipped_segments,
+                    "total_segments": total_segments
                 }
                 
                 return str(output_files["drums"]), metadata
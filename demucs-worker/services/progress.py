@@ -0,0 +1,160 @@
+"""
+Progress reporting - Turns Demucs segment callbacks into job progress and ETA
+
+Kept identical to annoteator-worker/services/progress.py: each worker image only copies its own services/ directory,
+so apply any change to both copies. The annoteator-worker counts segments through forward
+hooks instead of the apply_model callback, see _add_segment_callbacks in
+library/AnNOTEator/inference/input_transform.py, which repeats count_segments.
+"""
+import collections
+import logging
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def count_segments(length: int, samplerate: int, segment: float, overlap: float = 0.25,
+                   shifts: int = 1, models: int = 1) -> int:
+    """
+    Number of segments apply_model runs for a mix of `length` samples.
+
+    With shifts, each shifted mix is up to 0.5s longer than the input, so the count is
+    the worst case and progress never goes past 100% before separation finishes.
+    """
+    segment_length = int(samplerate * segment)
+    stride = int((1 - overlap) * segment_length)
+    if shifts:
+        length += int(0.5 * samplerate)
+    return models * max(1, shifts) * math.ceil(length / stride)
+
+
+class SeparationProgress:
+    """
+    Aggregates apply_model callbacks into fractional completion, segments/sec and ETA.
+
+    Use an instance as the `callback` of apply_model. The total number of segments is
+    taken from `total_segments`, or from the `segments` entry of the callback dicts
+    (pass it through `callback_arg`). Every `"end"` or `"skip"` callback completes one
+    segment; throughput and ETA only count `"end"` callbacks over the last `window`
+    segments, as skipped segments cost nothing.
+
+    At most every `min_interval` seconds, `report(progress, message, **details)` is called
+    with the completion mapped onto [start_pct, end_pct] and details such as `eta_seconds`.
+    """
+
+    def __init__(self, report: Callable, start_pct: int = 30, end_pct: int = 90,
+                 total_segments: Optional[int] = None, min_interval: float = 5.0,
+                 window: int = 20):
+        self.report = report
+        self.start_pct = start_pct
+        self.end_pct = end_pct
+        self.total_segments = total_segments
+        self.min_interval = min_interval
+        self.done = 0
+        self.skipped = 0
+        self.start_time = time.time()
+        # Completion times of the last processed segments, seeded with the start time
+        self._ends = collections.deque([self.start_time], maxlen=window + 1)
+        self._last_report = 0.
+        self._lock = threading.Lock()
+
+    def __call__(self, info: dict):
+        with self._lock:
+            if self.total_segments is None and "segments" in info:
+                self.total_segments = info["segments"]
+            if info.get("state") == "end":
+                self.done += 1
+                self._ends.append(time.time())
+            elif info.get("state") == "skip":
+                self.done += 1
+                self.skipped += 1
+            else:
+                return
+            now = time.time()
+            if now - self._last_report < self.min_interval:
+                return
+            self._last_report = now
+            progress, message, details = self._snapshot()
+        self.report(progress, message, **details)
+
+    @property
+    def fraction(self) -> float:
+        if not self.total_segments:
+            return 0.
+        return min(1., self.done / self.total_segments)
+
+    @property
+    def segments_per_second(self) -> Optional[float]:
+        if len(self._ends) < 2 or self._ends[-1] <= self._ends[0]:
+            return None
+        return (len(self._ends) - 1) / (self._ends[-1] - self._ends[0])
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        rate = self.segments_per_second
+        if rate is None or not self.total_segments:
+            return None
+        return max(0, self.total_segments - self.done) / rate
+
+    def _snapshot(self):
+        fraction = self.fraction
+        progress = int(self.start_pct + fraction * (self.end_pct - self.start_pct))
+        rate = self.segments_per_second
+        eta = self.eta_seconds
+        message = f"Separating: {fraction:.0%} ({self.done}/{self.total_segments or '?'} segments"
+        if rate is not None:
+            message += f", {rate:.2f} seg/s, ETA {eta:.0f}s"
+        message += ")"
+        details = {
+            "eta_seconds": None if eta is None else round(eta, 1),
+            "segments_per_second": None if rate is None else round(rate, 3),
+        }
+        return progress, message, details
+
+    def finish(self):
+        """Report the end of separation, regardless of the rate limit"""
+        with self._lock:
+            self.done = max(self.done, self.total_segments or 0)
+            self._last_report = time.time()
+            progress, message, details = self._snapshot()
+        elapsed = time.time() - self.start_time
+        logger.info(f"⏱️  Separation took {elapsed:.1f}s for {self.done} segments "
+                    f"({self.skipped} skipped)")
+        self.report(progress, message, **details)
+
+
+class ProgressWriter:
+    """
+    Rate-limited `progress_callback` that logs progress and persists it in the job metadata.
+
+    `write(metadata)` stores the metadata dict (GCS upload or local file). Writes happen
+    at most every `min_interval` seconds, except for progress 100, and failures are logged
+    without interrupting the job.
+    """
+
+    def __init__(self, metadata: dict, write: Callable[[dict], None],
+                 min_interval: float = 10.0):
+        self.metadata = metadata
+        self.write = write
+        self.min_interval = min_interval
+        self._last_write = 0.
+        self._lock = threading.Lock()
+
+    def __call__(self, progress: int, message: str = "", eta_seconds: Optional[float] = None,
+                 **details):
+        logger.info(f"📊 Progress: {progress}% - {message}")
+        with self._lock:
+            self.metadata["progress"] = progress
+            self.metadata["progress_message"] = message
+            self.metadata["eta_seconds"] = eta_seconds
+            now = time.time()
+            if progress < 100 and now - self._last_write < self.min_interval:
+                return
+            self._last_write = now
+            try:
+                self.write(self.metadata)
+            except Exception as e:
+                logger.warning(f"⚠️  Could not write job progress: {e}")
@@ -59,7 +59,11 @@ class Settings:
     demucs_num_workers: int = int(os.getenv("DEMUCS_NUM_WORKERS", "1"))
     demucs_mode: str = os.getenv("DEMUCS_MODE", "speed")
     omp_num_threads: int = int(os.getenv("OMP_NUM_THREADS", "4"))
+    # Calibrate Demucs settings at startup if this instance shape has not been tuned yet
+    demucs_autotune: bool = os.getenv("DEMUCS_AUTOTUNE", "false").lower() == "true"
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    # Minimum seconds between job metadata progress writes
+    progress_interval: float = float(os.getenv("PROGRESS_INTERVAL", "10"))
 
     def __post_init__(self):
         """Apply environment variable settings to os.environ for libraries."""
@@ -127,12 +131,14 @@ def start_health_server(port: int):
 # Import your service AFTER basic setup
 
 from services.demucs_service import DemucsService
+from services.progress import ProgressWriter
 
 
 def run_demucs_separation(
     audio_path: str,
     output_dir: str,
     extract_drums_only: bool = True,
+    progress_callback: Optional[ProgressWriter] = None,
 ) -> Tuple[str, dict]:
     """
     Shared Demucs separation logic for both cloud and local jobs.
@@ -154,6 +160,7 @@ def run_demucs_separation(
             audio_path=str(audio_path),
             output_name="output",
             extract_drums_only=extract_drums_only,
+            progress_callback=progress_callback,
         )
 
         logger.info("demucs_service.separate_audio() returned successfully!")
@@ -216,11 +223,21 @@ class CloudJobProcessor:
             # Load metadata + configuration
             metadata, extract_drums_only = self._load_metadata(metadata_blob)
 
+            # Job progress and ETA go to the metadata blob, at most every progress_interval
+            progress = ProgressWriter(
+                metadata,
+                lambda m: metadata_blob.upload_from_string(
+                    json.dumps(m), content_type="application/json"
+                ),
+                min_interval=settings.progress_interval,
+            )
+
             # Separate audio
             result_path, result_metadata = run_demucs_separation(
                 audio_path=input_path,
                 output_dir=temp_dir,
                 extract_drums_only=extract_drums_only,
+                progress_callback=progress,
             )
 
             # Upload result
@@ -242,6 +259,7 @@ class CloudJobProcessor:
             # Update metadata
             metadata["status"] = "completed"
             metadata["progress"] = 100
+            metadata["eta_seconds"] = 0
             metadata["demucs_output"] = result_metadata
             metadata_blob.upload_from_string(
                 json.dumps(metadata), content_type="application/json"
@@ -299,6 +317,14 @@ class LocalJobProcessor:
     def __init__(self, jobs_dir: str):
         self.jobs_dir = jobs_dir
 
+    @staticmethod
+    def _write_metadata(metadata_path: str, metadata: dict):
+        """Replace metadata.json atomically, so pollers never read a partial file."""
+        tmp_path = metadata_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, metadata_path)
+
     def process_job_dir(self, job_dir: str):
         job_id = os.path.basename(job_dir)
         logger.info(f"Processing job {job_id}")
@@ -327,16 +353,20 @@ class LocalJobProcessor:
 
         extract_drums_only = metadata.get("extract_drums_only", True)
 
-        # Update progress before heavy work
-        metadata["progress"] = 30
-        with open(metadata_path, "w") as f:
-            json.dump(metadata, f)
+        # Update progress before heavy work, then let the job report its own progress
+        progress = ProgressWriter(
+            metadata,
+            lambda m: self._write_metadata(metadata_path, m),
+            min_interval=settings.progress_interval,
+        )
+        progress(30, "Job started")
 
         # Separate audio
         result_path, result_metadata = run_demucs_separation(
             audio_path=input_path,
             output_dir=job_dir,
             extract_drums_only=extract_drums_only,
+            progress_callback=progress,
         )
 
         # Copy result to expected location if needed
@@ -347,6 +377,7 @@ class LocalJobProcessor:
         # Mark completed
         metadata["status"] = "completed"
         metadata["progress"] = 100
+        metadata["eta_seconds"] = 0
         metadata["demucs_output"] = result_metadata
         with open(metadata_path, "w") as f:
             json.dump(metadata, f)
@@ -396,6 +427,14 @@ def main():
         logger.info("Health check server started")
         sys.stdout.flush()
 
+    if settings.demucs_autotune:
+        from services.demucs_autotune import ensure_tuned
+        try:
+            ensure_tuned(settings.demucs_mode)
+        except Exception as e:
+            logger.error(f"Demucs autotuning failed, using default settings: {e}", exc_info=True)
+        sys.stdout.flush()
+
     # Start worker
     if settings.use_cloud_storage:
         logger.info(
@@ -0,0 +1,65 @@
+"""
+Onset Clip Resampling Benchmark
+Compares the per-clip librosa.resample calls drum_to_frame used to bring every onset clip
+to the 8820 samples of the drum hit classifier with resample_clips (one soxr call for
+the whole batch of clips), for the clip lengths of a few tempos, and checks that both
+produce the same clips.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import librosa
+import numpy as np
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "AnNOTEator"))
+
+from inference.input_transform import resample_clips
+
+
+def clip_length(bpm, sample_rate=44100):
+    """Clip length drum_to_frame uses at the default resolution: a 16th note plus the onset padding"""
+    window_size = librosa.time_to_samples(60 / bpm / 4, sr=sample_rate)
+    padding = librosa.time_to_samples(60 / bpm / 8 / 2 / 2, sr=sample_rate)
+    return int(padding + window_size)
+
+
+def per_clip_resampling(clips, sample_rate, target_length):
+    """The resampling of drum_to_frame before resample_clips, one librosa.resample call per clip"""
+    target_sr = int(sample_rate * target_length / clips.shape[1])
+    return [librosa.resample(clip, orig_sr=sample_rate, target_sr=target_sr) for clip in clips]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the resampling of onset clips")
+    parser.add_argument("--bpms", type=float, nargs="+", default=[90., 125., 160., 200.])
+    parser.add_argument("--clips", type=int, default=2000, help="Number of onset clips")
+    args = parser.parse_args()
+
+    sample_rate = 44100
+    rng = np.random.default_rng(0)
+    print(f"{'bpm':>6} {'length':>7} {'per clip s':>11} {'batch s':>8} {'speedup':>8} {'max diff':>9}")
+    for bpm in args.bpms:
+        length = clip_length(bpm, sample_rate)
+        decay = np.exp(-np.arange(length) / rng.uniform(300, 3000, size=(args.clips, 1)))
+        clips = (rng.normal(0, 0.3, (args.clips, length)) * decay).astype(np.float32)
+
+        start = time.perf_counter()
+        expected = per_clip_resampling(clips, sample_rate, 8820)
+        per_clip_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        resampled, _ = resample_clips(clips, sample_rate, 8820)
+        batch_time = time.perf_counter() - start
+
+        # librosa may return a sample less than 8820, resample_clips pads it
+        max_diff = max(np.abs(clip[:len(ref)] - ref).max() for clip, ref in zip(resampled, expected))
+        print(f"{bpm:>6.0f} {length:>7} {per_clip_time:>11.2f} {batch_time:>8.3f} "
+              f"{per_clip_time / batch_time:>7.1f}x {max_diff:>9.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Demucs ONNX Backend Benchmark
+Separates the same mix with the torch and onnxruntime backends through apply_model (same
+segments, overlap-add and silence gating as the demucs-worker) and compares:
+  - parity: nSDR (evaluate.new_sdr) of the onnxruntime sources against the torch ones
+  - CPU throughput: seconds of audio separated per second, for a few thread counts
+
+Export the model first with export_demucs_onnx.py.
+
+Usage:
+    python benchmark_demucs_onnx.py --repo /path/to/demucs/models [--model 83fc094f] \\
+        [--audio song.mp3] [--threads 1 4] [--workers 1]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+import numpy as np
+import torch as th
+
+from demucs.apply import apply_model
+from demucs.evaluate import new_sdr
+from demucs.onnx_model import ONNX_SUFFIX, OnnxModel
+from demucs.pretrained import get_model
+
+
+def synthetic_mix(duration=60., bpm=120., sample_rate=44100, seed=0):
+    """Stereo mix of a drum pattern, a bass line and a chord pad, with a silent intro"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    beat = 60 / bpm
+    mix = 0.2 * np.sin(2 * np.pi * 55 * 2 ** (np.floor(t / (4 * beat)) % 4 / 12) * t)
+    mix += 0.05 * sum(np.sin(2 * np.pi * f * t) for f in (220., 277.2, 329.6))
+    hit = np.arange(int(0.2 * sample_rate)) / sample_rate
+    for i, start in enumerate(np.arange(0, duration - 0.2, beat / 2)):
+        s = int(start * sample_rate)
+        if i % 2 == 0:
+            mix[s:s + len(hit)] += np.sin(2 * np.pi * 60 * hit) * np.exp(-hit * 20)
+        else:
+            mix[s:s + len(hit)] += rng.normal(0, 0.3, len(hit)) * np.exp(-hit * 60)
+    mix[:int(5 * sample_rate)] = 0
+    mix = np.stack([mix, np.roll(mix, 100)])
+    return th.from_numpy(mix).float()
+
+
+def load_mix(audio, model):
+    """Mix normalized like in the demucs-worker, for an audio file or the synthetic mix"""
+    if audio:
+        from demucs.audio import AudioFile
+        wav = AudioFile(audio).read(streams=0, samplerate=model.samplerate,
+                                    channels=model.audio_channels)
+    else:
+        wav = synthetic_mix(sample_rate=model.samplerate)
+    ref = wav.mean(0)
+    return (wav - ref.mean()) / ref.std()
+
+
+def separate(model, mix, workers, silence_threshold):
+    start = time.perf_counter()
+    sources = apply_model(model, mix[None], shifts=0, split=True, overlap=0.25,
+                          num_workers=workers, silence_threshold=silence_threshold)
+    return sources, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Demucs torch and onnxruntime backends")
+    parser.add_argument("--repo", type=Path, required=True, help="Directory containing the model and its export")
+    parser.add_argument("--model", default="83fc094f", help="Model signature (speed mode: 83fc094f)")
+    parser.add_argument("--audio", help="Mix to separate (default: 60s synthetic mix)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4], help="Intra-op threads")
+    parser.add_argument("--workers", type=int, default=1, help="apply_model worker threads")
+    parser.add_argument("--silence-threshold", type=float, default=-50.)
+    parser.add_argument("--min-nsdr", type=float, default=60., help="Fail under this nSDR (dB)")
+    args = parser.parse_args()
+
+    model = get_model(args.model, repo=args.repo)
+    mix = load_mix(args.audio, model)
+    duration = mix.shape[-1] / model.samplerate
+
+    print(f"{'threads':>7} {'torch s':>8} {'onnx s':>8} {'torch x rt':>11} {'onnx x rt':>10} "
+          f"{'speedup':>8} {'min nSDR dB':>12}")
+    worst_nsdr = float("inf")
+    for threads in args.threads:
+        th.set_num_threads(threads)
+        start = time.perf_counter()
+        onnx_model = OnnxModel(model, args.repo / (args.model + ONNX_SUFFIX), num_threads=threads)
+        session_time = time.perf_counter() - start
+
+        expected, torch_time = separate(model, mix, args.workers, args.silence_threshold)
+        predicted, onnx_time = separate(onnx_model, mix, args.workers, args.silence_threshold)
+        nsdr = new_sdr(expected.double(), predicted.double())[0]
+        worst_nsdr = min(worst_nsdr, nsdr.min().item())
+        print(f"{threads:>7} {torch_time:>8.2f} {onnx_time:>8.2f} {duration / torch_time:>11.2f} "
+              f"{duration / onnx_time:>10.2f} {torch_time / onnx_time:>7.2f}x {nsdr.min().item():>12.1f}"
+              f"   (session {session_time:.2f}s)")
+
+    print(f"\nnSDR per source at {args.threads[-1]} threads: " +
+          ", ".join(f"{source} {value:.1f}" for source, value in zip(model.sources, nsdr.tolist())))
+    if worst_nsdr < args.min_nsdr:
+        sys.exit(f"❌ onnxruntime sources are only {worst_nsdr:.1f} dB nSDR from the torch ones")
+    print(f"✅ onnxruntime sources match torch (nSDR ≥ {worst_nsdr:.1f} dB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Drum Hit Classifier Backend Benchmark
+Compares the Keras and ONNX backends of predict_drumhit:
+  - parity: drum hit labels predicted on the onset clips of a drum track
+    (the tutorial audio, or a synthetic drum track if no audio is given)
+  - cold start: import + model load + first prediction in a fresh interpreter, and its peak RSS
+  - per-batch latency of the classifier alone, for a few batch sizes
+
+Convert the network first with convert_drumhit_onnx.py.
+
+Usage:
+    python benchmark_drumhit_backends.py [--audio drums.wav] [--threads 1 4]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ANNOTEATOR_PATH = Path(__file__).parent.parent.parent / "library" / "AnNOTEator"
+NETWORKS = {
+    "keras": ANNOTEATOR_PATH / "inference" / "pretrained_models" / "annoteators" / "complete_network.h5",
+    "onnx": ANNOTEATOR_PATH / "inference" / "pretrained_models" / "annoteators" / "complete_network.onnx",
+}
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(ANNOTEATOR_PATH))
+
+from inference.prediction import load_drumhit_model, predict_drumhit
+
+COLD_START = """
+import re, sys, time, json
+import numpy as np
+start = time.perf_counter()
+sys.path.insert(0, {path!r})
+from inference.prediction import load_drumhit_model
+model = load_drumhit_model({network!r}, backend={backend!r}, num_threads={threads!r})
+model.predict(np.zeros((32, 128, 18, 1), dtype=np.float32))
+seconds = time.perf_counter() - start
+# Peak RSS of this process only (ru_maxrss would include the parent's, kept across exec)
+peak_kib = int(re.search(r"VmHWM:\\s+(\\d+)", open("/proc/self/status").read()).group(1))
+print(json.dumps({{"seconds": seconds, "rss_mib": peak_kib / 1024}}))
+"""
+
+
+def synthetic_drum_track(duration=20., bpm=110., sample_rate=44100, seed=0):
+    """Noise bursts on a 16th note grid: low decaying thumps, snappy mid hits and short high ticks"""
+    rng = np.random.default_rng(seed)
+    track = np.zeros(int(duration * sample_rate), dtype=np.float32)
+    t = np.arange(int(0.3 * sample_rate)) / sample_rate
+    for i, start in enumerate(np.arange(0.5, duration - 0.5, 60 / bpm / 4)):
+        s = int(start * sample_rate)
+        if i % 4 == 0:
+            hit = np.sin(2 * np.pi * 60 * t) * np.exp(-t * 15)
+        elif i % 8 == 4:
+            hit = rng.normal(0, 0.5, len(t)) * np.exp(-t * 25)
+        else:
+            hit = rng.normal(0, 0.2, len(t)) * np.exp(-t * 120)
+        track[s:s + len(t)] += hit.astype(np.float32)
+    return track, sample_rate
+
+
+def onset_clips(audio):
+    """Onset dataframe of drum_to_frame, for an audio file or the synthetic drum track"""
+    import librosa
+    from inference.input_transform import drum_to_frame
+
+    if audio:
+        track, sample_rate = librosa.load(audio, sr=None)
+    else:
+        track, sample_rate = synthetic_drum_track()
+    df, bpm = drum_to_frame(track, sample_rate)
+    return df, sample_rate
+
+
+def cold_start(backend, threads):
+    code = COLD_START.format(path=str(ANNOTEATOR_PATH), network=str(NETWORKS[backend]),
+                             backend=backend, threads=threads)
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def batch_latency(model, backend, batch_size, repeats=20):
+    X = np.random.default_rng(0).gamma(0.5, 2., size=(batch_size, 128, 18, 1)).astype(np.float32)
+    predict = (lambda X: model.predict(X, verbose=0)) if backend == "keras" else model.predict
+    predict(X)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the drum hit classifier backends")
+    parser.add_argument("--audio", help="Drum track to run the parity check on (default: synthetic)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4], help="onnx intra-op threads")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 256, 1024])
+    args = parser.parse_args()
+
+    # Parity on real onset clips
+    df, sample_rate = onset_clips(args.audio)
+    keras_df = predict_drumhit(load_drumhit_model(NETWORKS["keras"]), df.copy(), sample_rate)
+    onnx_df = predict_drumhit(load_drumhit_model(NETWORKS["onnx"]), df.copy(), sample_rate)
+    labels = ["SD", "HH", "KD", "RC", "TT", "CC"]
+    mismatches = int((keras_df[labels].to_numpy() != onnx_df[labels].to_numpy()).any(axis=1).sum())
+    print(f"Parity on {len(df)} onset clips: {mismatches} clips with different labels")
+
+    # Cold start and memory
+    print(f"\n{'backend':<10} {'threads':>7} {'cold start s':>13} {'peak RSS MiB':>13}")
+    configs = [("keras", None)] + [("onnx", threads) for threads in args.threads]
+    for backend, threads in configs:
+        result = cold_start(backend, threads)
+        print(f"{backend:<10} {threads or '-':>7} {result['seconds']:>13.2f} {result['rss_mib']:>13.0f}")
+
+    # Latency per batch
+    print(f"\n{'backend':<10} {'threads':>7} " + " ".join(f"{'batch ' + str(b) + ' ms':>14}" for b in args.batch_sizes))
+    for backend, threads in configs:
+        model = load_drumhit_model(NETWORKS[backend], backend=backend, num_threads=threads)
+        latencies = [batch_latency(model, backend, batch_size) * 1000 for batch_size in args.batch_sizes]
+        print(f"{backend:<10} {threads or '-':>7} " + " ".join(f"{latency:>14.1f}" for latency in latencies))
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Note Offset Search Benchmark
+Compares the brute-force note_offset search of drum_transcriber (one eighth note grid,
+the np.argmin based sync_8 and np.intersect1d per candidate offset) with the vectorized
+drum_transcriber.score_note_offsets, on synthetic dense onset tracks (fast double bass
+metal at 200+ BPM), and checks that both give the same scores and pick the same note_offset.
+Onsets fall on multiples of the 512 samples hop length, as in drum_to_frame.
+
+Usage:
+    python benchmark_note_offset.py [--bpms 200 230 260] [--duration 300]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "AnNOTEator"))
+
+from inference.transcriber import drum_transcriber
+
+
+def synthetic_prediction(bpm, duration, sample_rate=44100, hop_length=512, seed=0):
+    """Prediction dataframe of a dense drum track: 16th note double bass with a leading
+    pickup, timing jitter and a few missing hits"""
+    rng = np.random.default_rng(seed)
+    _16_duration = 60 / bpm / 4
+    times = np.arange(0.37, duration, _16_duration)
+    times = times + rng.normal(0, 0.004, len(times))
+    times = times[rng.random(len(times)) > 0.05]
+    frames = np.unique(np.round(times * sample_rate / hop_length).astype(int))
+    df = pd.DataFrame({"peak_sample": frames * hop_length})
+    for label in ["SD", "HH", "KD", "RC", "TT", "CC"]:
+        df[label] = (rng.random(len(df)) > 0.7).astype(int)
+    return df
+
+
+def make_transcriber(df, bpm, sample_rate=44100):
+    """drum_transcriber with only the attributes the note_offset search uses"""
+    transcriber = drum_transcriber.__new__(drum_transcriber)
+    transcriber.offset = False
+    transcriber.beats_in_measure = 8
+    transcriber.bpm = bpm
+    transcriber.df = df
+    transcriber.sample_rate = sample_rate
+    transcriber.onsets = df.peak_sample
+    transcriber.note_line = df.peak_sample.to_numpy() / sample_rate
+    transcriber.get_note_duration()
+    return transcriber
+
+
+def brute_force_sync_8(transcriber, _8_div):
+    """drum_transcriber.sync_8 as the brute-force search ran it: np.argmin over all onsets for every eighth note"""
+    synced_8_div = [_8_div[0]]
+    diff_log = 0
+    for note in _8_div[1:]:
+        pos = np.argmin(np.abs(transcriber.note_line - (note + diff_log)))
+        diff = transcriber.note_line[pos] - (note + diff_log)
+        if np.abs(diff) > transcriber._32_duration:
+            synced_8_div.append(synced_8_div[-1] + transcriber._8_duration)
+        else:
+            diff_log = diff_log + diff
+            synced_8_div.append(note + diff_log)
+    return np.array(synced_8_div)
+
+
+def brute_force_scores(transcriber, song_duration):
+    """The note_offset scores drum_transcriber computed before score_note_offsets"""
+    total_8_note = []
+    for n in range(20):
+        temp_8_div = transcriber.get_eighth_note_time_grid(song_duration, note_offset=n)
+        temp_synced_8_div = brute_force_sync_8(transcriber, temp_8_div)
+        total_8_note.append(len(np.intersect1d(np.around(transcriber.note_line, 8),
+                                               np.around(temp_synced_8_div, 8))))
+    return np.array(total_8_note)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the drum_transcriber note_offset search")
+    parser.add_argument("--bpms", type=float, nargs="+", default=[200., 230., 260.])
+    parser.add_argument("--duration", type=float, default=300., help="Song duration in seconds")
+    args = parser.parse_args()
+
+    print(f"{'bpm':>6} {'onsets':>7} {'brute s':>9} {'vector s':>9} {'speedup':>8} {'offset':>7}")
+    for seed, bpm in enumerate(args.bpms):
+        df = synthetic_prediction(bpm, args.duration, seed=seed)
+        transcriber = make_transcriber(df, bpm)
+
+        start = time.perf_counter()
+        expected = brute_force_scores(transcriber, args.duration)
+        brute_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores = transcriber.score_note_offsets(args.duration)
+        vector_time = time.perf_counter() - start
+
+        chosen = np.argmax(scores)
+        same = np.array_equal(scores, expected)
+        status = "✓" if same else f"✗ scores differ, expected offset {np.argmax(expected)}"
+        print(f"{bpm:>6.0f} {len(df):>7} {brute_time:>9.3f} {vector_time:>9.3f} "
+              f"{brute_time / vector_time:>7.1f}x {chosen:>6} {status}")
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Percussion Setup Benchmark
+Times the MusicXML export step of a transcription job before and after the percussion
+setup moved in front of the first write:
+  - before: music21 write, then the former AnNOTEatorService._fix_percussion_setup
+    (parse the file back, swap clef and instrument, write it again)
+  - music21: music21 write of drum_transcriber.sheet, percussion setup already in the stream
+  - writer: drum_transcriber.write_musicxml, the streaming writer used by the worker
+on synthetic drum tracks of increasing length.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "AnNOTEator"))
+
+from music21 import clef, converter, instrument, stream
+from inference.transcriber import drum_transcriber
+
+
+def reference_fix_percussion_setup(musicxml_path):
+    """AnNOTEatorService._fix_percussion_setup as it was before the percussion setup moved in front of the write"""
+    score = converter.parse(musicxml_path)
+    part = score.parts[0]
+    clefs_to_remove = [elem for elem in part.flatten()
+                       if isinstance(elem, clef.Clef) and elem.offset == 0]
+    for c in clefs_to_remove:
+        part.remove(c, recurse=True)
+    part.insert(0, clef.PercussionClef())
+    instruments_to_remove = [elem for elem in part.flatten()
+                             if isinstance(elem, instrument.Instrument)]
+    for i in instruments_to_remove:
+        part.remove(i, recurse=True)
+    drumset = instrument.Instrument()
+    drumset.instrumentName = "Drumset"
+    drumset.midiProgram = 0
+    drumset.midiChannel = 9
+    part.insert(0, drumset)
+    part.id = "Percussion"
+    if not score.metadata:
+        score.metadata = stream.Metadata()
+    score.metadata.composer = "Generated by GrooveSheet"
+    score.write('musicxml', fp=musicxml_path)
+
+
+def synthetic_prediction(bpm, duration, sample_rate=44100, seed=0):
+    """Prediction dataframe of a drum track mixing 8th, 16th notes and triplets"""
+    rng = np.random.default_rng(seed)
+    _8_duration = 60 / bpm / 2
+    times = []
+    for start in np.arange(0.5, duration, _8_duration):
+        split = rng.choice([1, 2, 2, 3, 4])
+        times.extend(start + np.arange(split) * _8_duration / split)
+    times = np.array(times) + rng.normal(0, 0.003, len(times))
+    samples = np.unique(np.round(np.clip(times, 0, None) * sample_rate).astype(int))
+    df = pd.DataFrame({"peak_sample": samples})
+    for label in ["SD", "HH", "KD", "RC", "TT", "CC"]:
+        df[label] = (rng.random(len(df)) > 0.6).astype(int)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MusicXML export step with its percussion setup")
+    parser.add_argument("--durations", type=float, nargs="+", default=[30., 120., 240.],
+                        help="Song durations in seconds")
+    parser.add_argument("--bpm", type=float, default=120.)
+    args = parser.parse_args()
+
+    print(f"{'song s':>7} {'notes':>6} {'before s':>9} {'music21 s':>10} {'writer s':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for seed, duration in enumerate(args.durations):
+            df = synthetic_prediction(args.bpm, duration, seed=seed)
+            transcriber = drum_transcriber(df, duration, args.bpm, 44100, song_title="Benchmark")
+            notes = sum(len(measure) for measure in transcriber.music21_data)
+            # Build the music21 stream up front, only the export step is timed
+            transcriber.sheet
+
+            path = str(Path(tmp_dir) / "before.musicxml")
+            start = time.perf_counter()
+            transcriber.sheet.write(fp=path)
+            reference_fix_percussion_setup(path)
+            before_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            transcriber.sheet.write(fp=str(Path(tmp_dir) / "music21.musicxml"))
+            music21_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            transcriber.write_musicxml(Path(tmp_dir) / "writer.musicxml")
+            writer_time = time.perf_counter() - start
+
+            print(f"{duration:>7.0f} {notes:>6} {before_time:>9.2f} {music21_time:>10.2f} {writer_time:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
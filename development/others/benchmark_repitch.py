@@ -0,0 +1,62 @@
+"""
+Repitch Throughput Benchmark
+Compares the soundstretch subprocess path of demucs.repitch (temp WAV files + external
+process per stream) with the in-process torch backend (phase vocoder + resampling, all
+streams of an example in one batch), on training-sized examples.
+"""
+
+import argparse
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+import torch as th
+from demucs.repitch import repitch, repitch_torch
+
+
+def run(backend, examples, max_pitch=2, max_tempo=12, tempo_std=5):
+    """Return (seconds of audio processed, elapsed seconds) for one backend"""
+    rng = random.Random(1234)
+    audio_seconds = 0.
+    start = time.perf_counter()
+    for streams in examples:
+        delta_pitch = rng.randint(-max_pitch, max_pitch)
+        delta_tempo = min(max(-max_tempo, rng.gauss(0, tempo_std)), max_tempo)
+        if backend == "torch":
+            repitch_torch(streams, delta_pitch, delta_tempo)
+        else:
+            for stream in streams:
+                repitch(stream, delta_pitch, delta_tempo)
+        audio_seconds += streams.shape[-1] / 44100
+    return audio_seconds, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repitch backends")
+    parser.add_argument("--examples", type=int, default=20, help="Number of training examples")
+    parser.add_argument("--segment", type=float, default=11., help="Example length in seconds")
+    parser.add_argument("--sources", type=int, default=4, help="Streams per example")
+    args = parser.parse_args()
+
+    generator = th.Generator().manual_seed(0)
+    examples = [0.1 * th.randn(args.sources, 2, int(args.segment * 44100), generator=generator)
+                for _ in range(args.examples)]
+    print(f"{args.examples} examples of {args.sources} x {args.segment}s stereo streams")
+    print(f"{'backend':<14} {'audio s':>8} {'wall s':>8} {'audio s / s':>12}")
+    for backend in ["soundstretch", "torch"]:
+        if backend == "soundstretch" and shutil.which("soundstretch") is None:
+            print(f"{backend:<14} skipped (soundstretch is not installed)")
+            continue
+        audio_seconds, elapsed = run(backend, examples)
+        # Each stream is processed, so count audio seconds per stream
+        audio_seconds *= args.sources
+        print(f"{backend:<14} {audio_seconds:>8.1f} {elapsed:>8.2f} {audio_seconds / elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+TensorChunk Padding Microbenchmark
+Compares TensorChunk.padded (fresh F.pad per segment) with TensorChunk.padded_view
+(views for interior segments, reused buffer for edge segments) over the same
+segmentation apply_model performs, and reports allocator churn and per-segment overhead.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+import torch as th
+from demucs.apply import TensorChunk
+
+
+def iterate_segments(mix, samplerate, segment, overlap, shifts):
+    """Yield (chunk, target_length) exactly like apply_model with shifts and split"""
+    length = mix.shape[-1]
+    max_shift = int(0.5 * samplerate)
+    padded_mix = TensorChunk(mix).padded(length + 2 * max_shift)
+    segment_length = int(samplerate * segment)
+    stride = int((1 - overlap) * segment_length)
+    for shift_idx in range(shifts):
+        offset = (shift_idx * 7919) % max_shift  # deterministic stand-in for random.randint
+        shifted = TensorChunk(padded_mix, offset, length + max_shift - offset)
+        for chunk_offset in range(0, shifted.length, stride):
+            yield TensorChunk(shifted, chunk_offset, segment_length), segment_length
+
+
+def run(method, mix, samplerate, segment, overlap, shifts):
+    """Return (segments, fresh allocations, allocated bytes, seconds) for one method"""
+    source_storage = None
+    seen_storages = set()
+    allocations = 0
+    allocated_bytes = 0
+    segments = 0
+    elapsed = 0.
+    for chunk, target_length in iterate_segments(mix, samplerate, segment, overlap, shifts):
+        if source_storage is None:
+            source_storage = chunk.tensor.untyped_storage().data_ptr()
+        start = time.perf_counter()
+        out = getattr(chunk, method)(target_length).to('cpu')
+        elapsed += time.perf_counter() - start
+        segments += 1
+        storage = out.untyped_storage().data_ptr()
+        if storage != source_storage and storage not in seen_storages:
+            allocations += 1
+            allocated_bytes += out.numel() * out.element_size()
+            if method == "padded_view":
+                # Reused buffers keep their address, fresh F.pad outputs may recycle one.
+                seen_storages.add(storage)
+        del out
+    return segments, allocations, allocated_bytes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TensorChunk padding strategies")
+    parser.add_argument("--minutes", type=float, default=10., help="Input duration in minutes")
+    parser.add_argument("--samplerate", type=int, default=44100)
+    parser.add_argument("--segment", type=float, default=10., help="Segment length in seconds")
+    parser.add_argument("--overlap", type=float, default=0.25)
+    parser.add_argument("--shifts", type=int, default=1)
+    args = parser.parse_args()
+
+    mix = th.randn(1, 2, int(args.minutes * 60 * args.samplerate))
+    print(f"Input: {args.minutes:.1f} min stereo @ {args.samplerate} Hz, "
+          f"segment={args.segment}s, overlap={args.overlap}, shifts={args.shifts}")
+    print(f"{'method':<12} {'segments':>9} {'allocs':>7} {'alloc MiB':>10} {'us/segment':>11}")
+    for method in ["padded", "padded_view"]:
+        segments, allocations, allocated_bytes, elapsed = run(
+            method, mix, args.samplerate, args.segment, args.overlap, args.shifts)
+        print(f"{method:<12} {segments:>9} {allocations:>7} {allocated_bytes / 2**20:>10.1f} "
+              f"{elapsed / segments * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
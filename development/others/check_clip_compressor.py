@@ -0,0 +1,68 @@
+"""
+Clip Compressor Equivalence Check
+Compares compress_clips (the whole clip matrix through Pedalboard, clips as channels) with
+the row by row Pedalboard calls drum_to_frame used before, on random onset clips: every
+clip must come out identical, whatever the number of clips and batch size.
+
+Usage:
+    python check_clip_compressor.py [--clips 2000] [--seed 0]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pedalboard import Compressor, Pedalboard
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "AnNOTEator"))
+
+from inference.input_transform import compress_clips
+
+
+def row_wise_compression(clips, sample_rate):
+    """The compression of drum_to_frame before compress_clips, one Pedalboard call per dataframe row"""
+    df = pd.DataFrame({"audio_clip": list(clips), "sampling_rate": [sample_rate] * len(clips)})
+    pb = Pedalboard([Compressor(threshold_db=-27, ratio=4, attack_ms=1, release_ms=200)])
+    return np.array(df.apply(lambda x: pb(x.audio_clip, x.sampling_rate), axis=1).tolist())
+
+
+def random_clips(rng, n_clips, length=8820):
+    """Decaying noise bursts of random loudness, some of them under the compressor threshold"""
+    decay = np.exp(-np.arange(length) / rng.uniform(100, 5000, size=(n_clips, 1)))
+    gain = 10 ** rng.uniform(-3, 0, size=(n_clips, 1))
+    return (rng.normal(0, 1, (n_clips, length)) * decay * gain).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check compress_clips against row by row Pedalboard calls")
+    parser.add_argument("--clips", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for n_clips, sample_rate, batch_size in [(1, 44100, 1024), (37, 65343, 8), (args.clips, 65343, 1024)]:
+        clips = random_clips(rng, n_clips)
+
+        start = time.perf_counter()
+        expected = row_wise_compression(clips, sample_rate)
+        row_wise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compressed = compress_clips(clips, sample_rate, batch_size=batch_size)
+        batch_time = time.perf_counter() - start
+
+        max_diff = np.abs(compressed - expected).max()
+        print(f"{n_clips:>5} clips, batch size {batch_size:>4}: max difference {max_diff:.2e} "
+              f"(row by row {row_wise_time:.3f}s, batched {batch_time:.3f}s)")
+        if max_diff > 0:
+            print("❌ compress_clips differs from the row by row compression")
+            sys.exit(1)
+    print("✅ compress_clips matches the row by row compression")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Demucs Import-Time Check
+Imports the inference surface of the vendored demucs package (pretrained.get_model,
+apply.apply_model, audio.AudioFile) in a fresh interpreter with `-X importtime`, and fails
+if training/encoding/resampling dependencies get pulled in at import time again.
+Also prints the cumulative import time of demucs itself versus torch.
+
+Usage:
+    python check_demucs_import_time.py [--budget-ms 300]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+DEMUCS_LIB_PATH = Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"
+
+INFERENCE_IMPORTS = "import demucs.pretrained, demucs.apply, demucs.audio"
+
+# Modules that must only load on first use
+LAZY_MODULES = ["dora", "omegaconf", "lameenc", "julius", "torchaudio", "openunmix", "diffq"]
+
+
+def import_times():
+    """Return (all imported modules, {top level module: cumulative microseconds}) for a fresh
+    import of the inference surface"""
+    env = dict(os.environ, PYTHONPATH=str(DEMUCS_LIB_PATH))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", INFERENCE_IMPORTS],
+                            env=env, capture_output=True, text=True, check=True)
+    modules = {}
+    top_level = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+        if name.startswith(" ") and not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative)
+    return modules, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import cost of the demucs inference surface")
+    parser.add_argument("--budget-ms", type=float, default=300.,
+                        help="Maximum import time of demucs on top of torch")
+    args = parser.parse_args()
+
+    modules, top_level = import_times()
+    eager = sorted({name.split(".")[0] for name in modules if name.split(".")[0] in LAZY_MODULES})
+    torch_ms = modules.get("torch", 0) / 1000
+    # The first demucs module imported also accounts for the torch import
+    demucs_ms = sum(us for name, us in top_level.items() if name.startswith("demucs")) / 1000
+    demucs_ms -= torch_ms
+
+    print(f"torch:  {torch_ms:8.1f} ms")
+    print(f"demucs: {demucs_ms:8.1f} ms (excluding torch)")
+    failed = False
+    if eager:
+        print(f"❌ Imported eagerly: {', '.join(eager)}")
+        failed = True
+    if demucs_ms > args.budget_ms:
+        print(f"❌ demucs import time over budget ({args.budget_ms:.0f} ms)")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Inference surface only imports what it uses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+master_sync Equivalence Check
+Randomized check of drum_transcriber.master_sync (onsets bucketed into eighth note
+intervals, note divisions matched in batch) against the original implementation (full
+array scans for every onset and every division): both must return bit-identical synced
+division lines, on random tempos, mixes of 16th/32nd/triplet/sextuplet fills, timing
+jitter and duplicated onsets. Also reports the runtime of both on a long dense track.
+
+Usage:
+    python check_master_sync.py [--cases 200] [--seed 0]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "AnNOTEator"))
+
+from inference.transcriber import drum_transcriber
+
+
+def reference_master_sync(self, _16_div, _32_div, _8_triplet_div, _8_sixlet_div):
+    """drum_transcriber.master_sync as it was before the interval-local rewrite"""
+    #round the onsets amd synced eighth note position (in the unit of seconds) to 8 decimal places for convinience purpose
+    note_line_r=np.round(self.note_line,8)
+    synced_eighth_r=np.round(self.synced_8_div,8)
+
+    #declare a few variables to store the result
+    synced_16_div=[]
+    synced_32_div=[]
+    synced_8_3_div=[]
+    synced_8_6_div=[]
+
+    # iterate though all synced 8 notes
+    for i in range(len(synced_eighth_r) - 1):
+        #retrive the current 8th note and the next 8th note (n and n+1)
+        eighth_pair=synced_eighth_r[i:i+2]
+        sub_notes=note_line_r[(note_line_r>eighth_pair[0]) & (note_line_r<eighth_pair[1])]
+        #Check whether there is any detected onset exist between 2 consecuive eighth notes
+        if len(sub_notes)>0:
+            #if onsets are deteced between 2 consecuive eighth notes, 
+            #the below algo will match each note (based on its position in the time domain) to the closest note division (16th, 32th, eighth triplets or eighth sixthlet note)
+            dist_dict={'_16':[],'_32':[], '_8_3':[], '_8_6':[]}
+            sub_notes_dict={'_16':np.round(np.linspace(self.synced_8_div[i], self.synced_8_div[i+1], 3),8)[:-1],
+                            '_32':np.round(np.linspace(self.synced_8_div[i], self.synced_8_div[i+1], 5),8)[:-1],
+                            '_8_3':np.round(np.linspace(self.synced_8_div[i], self.synced_8_div[i+1], 4),8)[:-1],
+                            '_8_6':np.round(np.linspace(self.synced_8_div[i], self.synced_8_div[i+1], 7),8)[:-1]}
+
+            for sub_note in sub_notes:
+                diff_16=np.min(np.abs(_16_div-sub_note))
+                dist_dict['_16'].append(diff_16)
+                _16closest_line=_16_div[np.argmin(np.abs(_16_div-sub_note))]
+                sub_notes_dict['_16'] = np.where(sub_notes_dict['_16'] == np.round(_16closest_line,8), sub_note, sub_notes_dict['_16'])
+
+                diff_32=np.min(np.abs(_32_div-sub_note))
+                dist_dict['_32'].append(diff_32)
+                _32closest_line=_32_div[np.argmin(np.abs(_32_div-sub_note))]
+                sub_notes_dict['_32'] = np.where(sub_notes_dict['_32'] == np.round(_32closest_line,8), sub_note, sub_notes_dict['_32'])
+
+                diff_8_triplet=np.min(np.abs(_8_triplet_div-sub_note))
+                dist_dict['_8_3'].append(diff_8_triplet)
+                _8_3closest_line=_8_triplet_div[np.argmin(np.abs(_8_triplet_div-sub_note))]
+                sub_notes_dict['_8_3'] = np.where(sub_notes_dict['_8_3'] == np.round(_8_3closest_line,8), sub_note, sub_notes_dict['_8_3'])
+
+                diff_8_sixlet=np.min(np.abs(_8_sixlet_div-sub_note))
+                dist_dict['_8_6'].append(diff_8_sixlet)
+                _8_6closest_line=_8_sixlet_div[np.argmin(np.abs(_8_sixlet_div-sub_note))]
+                sub_notes_dict['_8_6'] = np.where(sub_notes_dict['_8_6'] == np.round(_8_6closest_line,8), sub_note, sub_notes_dict['_8_6'])
+
+
+            for key in dist_dict.keys():
+                dist_dict[key]=sum(dist_dict[key])/len(dist_dict[key])
+            best_div=min(dist_dict, key=dist_dict.get)
+            if best_div=='_16':
+                synced_16_div.extend(sub_notes_dict['_16'])
+            elif best_div=='_32':
+                synced_32_div.extend(sub_notes_dict['_32'])
+            elif best_div=='_8_3':
+                synced_8_3_div.extend(sub_notes_dict['_8_3'])
+            else:
+                synced_8_6_div.extend(sub_notes_dict['_8_6'])
+
+        else:
+            pass
+
+    #If there is any notes living in between 2 consecutive 8th notes, the first 8th note is not an 8th note anymore.
+    # Bleow for loop will remove those notes from the synced_8_div variable
+    synced_8_div_clean=self.synced_8_div.copy()
+    for div in [synced_16_div, synced_32_div, synced_8_3_div, synced_8_6_div]:
+        synced_8_div_clean=synced_8_div_clean[~np.isin(np.around(synced_8_div_clean,8), np.around(div, 8))]
+    return synced_8_div_clean, np.array(synced_16_div), np.array(synced_32_div), np.array(synced_8_3_div), np.array(synced_8_6_div)
+
+
+def random_transcriber(rng, duration=None, sample_rate=44100):
+    """drum_transcriber synced to a random track, up to the master_sync step"""
+    bpm = rng.uniform(60, 260)
+    duration = duration or rng.uniform(10, 120)
+    _8_duration = 60 / bpm / 2
+    times = []
+    for start in np.arange(rng.uniform(0, 1), duration, _8_duration):
+        # Each eighth note is played alone or split into a random subdivision
+        split = rng.choice([1, 1, 1, 2, 2, 3, 4, 6])
+        times.extend(start + np.arange(split) * _8_duration / split)
+    times = np.array(times)
+    times = times + rng.normal(0, rng.uniform(0, _8_duration / 12), len(times))
+    times = times[rng.random(len(times)) > rng.uniform(0, 0.3)]
+    if rng.random() < 0.2:
+        times = np.concatenate([times, rng.choice(times, size=len(times) // 20)])
+    samples = np.sort(np.round(np.clip(times, 0, None) * sample_rate).astype(int))
+    df = pd.DataFrame({"peak_sample": samples})
+
+    transcriber = drum_transcriber.__new__(drum_transcriber)
+    transcriber.offset = bool(rng.random() < 0.5)
+    transcriber.beats_in_measure = 8
+    transcriber.bpm = bpm
+    transcriber.df = df
+    transcriber.sample_rate = sample_rate
+    transcriber.note_line = samples / sample_rate
+    transcriber.get_note_duration()
+    _8_div = transcriber.get_eighth_note_time_grid(duration, note_offset=int(rng.integers(0, 8)))
+    transcriber.synced_8_div = transcriber.sync_8(_8_div)
+    return transcriber
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check drum_transcriber.master_sync against the original implementation")
+    parser.add_argument("--cases", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for case in range(args.cases):
+        transcriber = random_transcriber(rng)
+        divisions = transcriber.get_note_division()
+        expected = reference_master_sync(transcriber, *divisions)
+        synced = transcriber.master_sync(*divisions)
+        for name, a, b in zip(["8", "16", "32", "8_3", "8_6"], expected, synced):
+            if a.dtype != b.dtype or not np.array_equal(a, b):
+                print(f"❌ Case {case}: synced_{name}_div differs (bpm={transcriber.bpm:.1f})")
+                sys.exit(1)
+    print(f"✅ {args.cases} cases identical")
+
+    transcriber = random_transcriber(rng, duration=600.)
+    divisions = transcriber.get_note_division()
+    start = time.perf_counter()
+    reference_master_sync(transcriber, *divisions)
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    transcriber.master_sync(*divisions)
+    sync_time = time.perf_counter() - start
+    print(f"10 min track, {len(transcriber.note_line)} onsets: original {reference_time:.2f}s, "
+          f"interval-local {sync_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+MusicXML Writer Round-Trip Check
+Writes random drum transcriptions with the streaming MusicXML writer, parses the files back
+with music21.converter.parse and checks them against the music21 sheet of the same
+drum_transcriber: same notes at the same offsets (durations, tuplets, display pitches and
+noteheads), same time signature and length, plus the percussion clef and drumset instrument.
+Also reports the time spent by both export paths.
+
+Usage:
+    python check_musicxml_writer.py [--cases 50] [--seed 0]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from fractions import Fraction
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "AnNOTEator"))
+
+from music21 import chord, clef, converter, instrument, meter
+from inference.transcriber import drum_transcriber
+
+
+def random_prediction(rng, sample_rate=44100):
+    """Prediction dataframe of a random drum track mixing 8th, 16th, 32th notes, triplets and sixthlets"""
+    bpm = rng.uniform(60, 240)
+    duration = rng.uniform(5, 40)
+    _8_duration = 60 / bpm / 2
+    times = []
+    for start in np.arange(rng.uniform(0.1, 2), duration, _8_duration):
+        split = rng.choice([1, 1, 1, 2, 2, 3, 4, 6])
+        times.extend(start + np.arange(split) * _8_duration / split)
+    times = np.array(times) + rng.normal(0, _8_duration / 20, len(times))
+    times = times[rng.random(len(times)) > 0.15]
+    samples = np.unique(np.round(np.clip(times, 0, None) * sample_rate).astype(int))
+    df = pd.DataFrame({"peak_sample": samples})
+    for label in ["SD", "HH", "KD", "RC", "TT", "CC"]:
+        df[label] = (rng.random(len(df)) > 0.6).astype(int)
+    return df, duration, bpm, sample_rate
+
+
+def note_events(score):
+    """(offset, duration, sorted display pitches and noteheads) of every note or chord"""
+    events = []
+    for n in score.flatten().notes:
+        notes = n.notes if isinstance(n, chord.ChordBase) else [n]
+        pitches = sorted((p.displayStep, p.displayOctave, p.notehead) for p in notes)
+        events.append((Fraction(n.offset), Fraction(n.quarterLength), tuple(pitches)))
+    return events
+
+
+def check_case(transcriber, path):
+    """Return a list of differences between the written file and the music21 sheet"""
+    parsed = converter.parse(path)
+    errors = []
+    if note_events(parsed) != note_events(transcriber.sheet):
+        errors.append("notes differ")
+
+    expected_length = sum(Fraction(dur).limit_denominator(48)
+                          for measure in transcriber.music21_data for dur, _ in measure)
+    if Fraction(parsed.highestTime) != expected_length:
+        errors.append(f"length {parsed.highestTime} instead of {expected_length}")
+
+    part = parsed.parts[0]
+    time_signatures = part.recurse().getElementsByClass(meter.TimeSignature)
+    expected_ts = transcriber.sheet.recurse().getElementsByClass(meter.TimeSignature)[0].ratioString
+    if not time_signatures or time_signatures[0].ratioString != expected_ts:
+        errors.append("wrong time signature")
+    if not isinstance(part.recurse().getElementsByClass(clef.Clef)[0], clef.PercussionClef):
+        errors.append("no percussion clef")
+    instruments = part.recurse().getElementsByClass(instrument.Instrument)
+    if not instruments or instruments[0].instrumentName != "Drumset" or instruments[0].midiChannel != 9:
+        errors.append("no drumset instrument on MIDI channel 10")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-trip the streaming MusicXML writer through music21")
+    parser.add_argument("--cases", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    music21_time = 0.
+    writer_time = 0.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for case in range(args.cases):
+            df, duration, bpm, sample_rate = random_prediction(rng)
+            transcriber = drum_transcriber(df, duration, bpm, sample_rate, song_title=f"Case {case}")
+            path = Path(tmp_dir) / f"case_{case}.musicxml"
+
+            start = time.perf_counter()
+            transcriber.write_musicxml(path)
+            writer_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            transcriber.sheet.write(fp=str(Path(tmp_dir) / f"case_{case}_music21.musicxml"))
+            music21_time += time.perf_counter() - start
+
+            errors = check_case(transcriber, str(path))
+            if errors:
+                print(f"❌ Case {case} (bpm={bpm:.1f}): {', '.join(errors)}")
+                sys.exit(1)
+
+    print(f"✅ {args.cases} cases round-trip "
+          f"(music21 sheet + write {music21_time:.2f}s, MusicXML writer {writer_time:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Segment Pipeline Check
+Runs apply_model with pipeline_depth > 0 (SegmentPipeline) on a small toy model:
+  - the separated output must match the worker pool path (pipeline_depth=0)
+  - a model forward raising must make apply_model raise that error, within a few seconds,
+    for any number of workers and with preparation slower than the forward passes
+    (it used to hang with 2 workers or more)
+
+Usage:
+    python check_segment_pipeline.py [--timeout 30]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from threading import Thread
+
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+import torch as th
+from torch import nn
+
+from demucs import apply
+
+
+class ToyModel(nn.Module):
+    """Splits the mix into a scaled copy per source, raising from its `fail_at`-th call on"""
+    sources = ["drums", "bass", "other", "vocals"]
+    samplerate = 8000
+    audio_channels = 2
+    segment = 1.
+
+    def __init__(self, fail_at=None):
+        super().__init__()
+        self.scale = nn.Parameter(th.arange(1., len(self.sources) + 1)[:, None, None])
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += 1
+        if self.fail_at is not None and self.calls >= self.fail_at:
+            raise RuntimeError("forward failed")
+        time.sleep(0.01)
+        return x[:, None] * self.scale
+
+
+def run_with_timeout(timeout, **kwargs):
+    """apply_model in a daemon thread: returns (output, error), or raises TimeoutError if it hangs"""
+    result = {}
+
+    def target():
+        try:
+            result["output"] = apply.apply_model(**kwargs)
+        except Exception as error:
+            result["error"] = error
+
+    thread = Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError
+    return result.get("output"), result.get("error")
+
+
+def slow_preparation(delay):
+    """Make every segment preparation take `delay` more seconds"""
+    padded_view = apply.TensorChunk.padded_view
+
+    def slow_padded_view(self, *args, **kwargs):
+        time.sleep(delay)
+        return padded_view(self, *args, **kwargs)
+
+    apply.TensorChunk.padded_view = slow_padded_view
+    return lambda: setattr(apply.TensorChunk, "padded_view", padded_view)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the SegmentPipeline of apply_model")
+    parser.add_argument("--timeout", type=float, default=30., help="Seconds before a run counts as hung")
+    args = parser.parse_args()
+
+    mix = th.randn(1, 2, 20 * ToyModel.samplerate)
+    failed = False
+
+    expected, _ = run_with_timeout(args.timeout, model=ToyModel(), mix=mix, shifts=0,
+                                   num_workers=2, pipeline_depth=0)
+    for workers in [1, 2, 4]:
+        output, error = run_with_timeout(args.timeout, model=ToyModel(), mix=mix, shifts=0,
+                                         num_workers=workers, pipeline_depth=2)
+        max_diff = (output - expected).abs().max().item() if error is None else float("inf")
+        ok = max_diff < 1e-5
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {workers} workers: output max difference {max_diff:.2e}")
+
+    restore = slow_preparation(0.05)
+    try:
+        for workers in [1, 2, 4]:
+            for fail_at in [1, 3]:
+                start = time.perf_counter()
+                try:
+                    _, error = run_with_timeout(args.timeout, model=ToyModel(fail_at), mix=mix,
+                                                shifts=0, num_workers=workers, pipeline_depth=2)
+                except TimeoutError:
+                    failed = True
+                    print(f"❌ {workers} workers, failing at call {fail_at}: hung for {args.timeout:.0f}s")
+                    continue
+                ok = isinstance(error, RuntimeError) and str(error) == "forward failed"
+                failed |= not ok
+                print(f"{'✅' if ok else '❌'} {workers} workers, failing at call {fail_at}: "
+                      f"raised {error!r} in {time.perf_counter() - start:.2f}s")
+    finally:
+        restore()
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
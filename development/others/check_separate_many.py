@@ -0,0 +1,164 @@
+"""
+Separator.separate_many Check
+Runs Separator.separate_many on the small untrained demucs_unittest model, with a decoder that
+takes a while and records how many decoded files wait to be separated:
+  - every file must come out identical to Separator.separate_audio_file
+  - memory_budget must bound the decoded files waiting to be separated, and prefetch still
+    fill up to that bound since separating takes longer than decoding
+  - a file failing to decode must reach on_error while the other files still come out, and
+    raise from the iterator without on_error, within a few seconds
+
+Decoding goes through Separator._load_audio, with a synthetic track per file name instead of
+ffmpeg, so that the check runs anywhere.
+
+Usage:
+    python check_separate_many.py [--files 8] [--timeout 60]
+"""
+
+import argparse
+import math
+import sys
+import time
+import zlib
+from pathlib import Path
+from threading import Lock, Thread
+
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+import torch as th
+
+from demucs.api import LoadAudioError, Separator
+
+DURATION = 4.
+
+
+class InstrumentedSeparator(Separator):
+    """Separator decoding a synthetic track per file name in `decode_time` seconds, files named
+    broken* fail to decode. Records the most decoded files waiting to be separated at once."""
+
+    def __init__(self, decode_time=0.1):
+        super().__init__(model="demucs_unittest", device="cpu", shifts=0)
+        self.decode_time = decode_time
+        self.lock = Lock()
+        self.waiting = 0
+        self.max_waiting = 0
+
+    def _load_audio(self, track):
+        time.sleep(self.decode_time)
+        if track.name.startswith("broken"):
+            raise LoadAudioError(f"Could not decode {track}")
+        generator = th.Generator().manual_seed(zlib.crc32(track.name.encode()))
+        wav = 0.1 * th.randn(self.audio_channels, int(DURATION * self.samplerate), generator=generator)
+        with self.lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        return wav
+
+    def separate_tensor(self, wav, sr=None):
+        with self.lock:
+            self.waiting -= 1
+        return super().separate_tensor(wav, sr)
+
+
+def run_with_timeout(timeout, separator, files, **kwargs):
+    """Consume separate_many in a daemon thread: returns (outputs, error), or raises TimeoutError if it hangs"""
+    result = {"outputs": {}}
+
+    def target():
+        try:
+            for file, wav, stems in separator.separate_many(files, **kwargs):
+                result["outputs"][file] = (wav, stems)
+        except Exception as error:
+            result["error"] = error
+
+    thread = Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError
+    return result["outputs"], result.get("error")
+
+
+def max_difference(outputs, expected):
+    """Largest difference between the outputs and the expected (wav, stems) of every file"""
+    if outputs.keys() != expected.keys():
+        return float("inf")
+    diff = 0.
+    for file, (wav, stems) in outputs.items():
+        expected_wav, expected_stems = expected[file]
+        diff = max(diff, (wav - expected_wav).abs().max().item(),
+                   *((stems[name] - expected_stems[name]).abs().max().item() for name in stems))
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Separator.separate_many")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=60., help="Seconds before a run counts as hung")
+    args = parser.parse_args()
+
+    th.manual_seed(0)
+    separator = InstrumentedSeparator()
+    files = [Path(f"track_{i}.wav") for i in range(args.files)]
+    file_bytes = separator.audio_channels * int(DURATION * separator.samplerate) * 4
+    failed = False
+
+    start = time.perf_counter()
+    expected = {file: separator.separate_audio_file(file) for file in files}
+    sequential_time = time.perf_counter() - start
+
+    # Outputs and memory budget: with a slow separation, the decoded files waiting must reach
+    # the budget (at least one) or prefetch, whichever is lower, and never exceed it.
+    for prefetch, budget in [(4, math.inf), (4, 1.5), (4, 2.5), (4, 0.5), (1, math.inf)]:
+        separator.max_waiting = 0
+        start = time.perf_counter()
+        try:
+            outputs, error = run_with_timeout(args.timeout, separator, files, io_workers=2,
+                                              prefetch=prefetch,
+                                              memory_budget=budget * file_bytes)
+        except TimeoutError:
+            failed = True
+            print(f"❌ prefetch {prefetch}, budget {budget} files: hung for {args.timeout:.0f}s")
+            continue
+        elapsed = time.perf_counter() - start
+        diff = max_difference(outputs, expected) if error is None else float("inf")
+        bound = prefetch if budget == math.inf else min(prefetch, max(1, math.ceil(budget)))
+        ok = diff == 0 and separator.max_waiting == bound
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} prefetch {prefetch}, budget {budget:g} files: max difference {diff:.1e}, "
+              f"at most {separator.max_waiting} decoded files waiting (bound {bound}), "
+              f"{elapsed:.2f}s vs {sequential_time:.2f}s one by one")
+
+    # A file failing to decode: reported to on_error, the other files still come out
+    with_broken = files[:2] + [Path("broken.wav")] + files[2:]
+    errors = []
+    try:
+        outputs, error = run_with_timeout(args.timeout, separator, with_broken, prefetch=2,
+                                          on_error=lambda file, error: errors.append((file, error)))
+        ok = (error is None and max_difference(outputs, expected) == 0 and len(errors) == 1
+              and errors[0][0] == Path("broken.wav") and isinstance(errors[0][1], LoadAudioError))
+        print(f"{'✅' if ok else '❌'} failing decode with on_error: {len(outputs)} files out, "
+              f"errors reported: {[str(file) for file, _ in errors]}")
+    except TimeoutError:
+        ok = False
+        print(f"❌ failing decode with on_error: hung for {args.timeout:.0f}s")
+    failed |= not ok
+
+    # Without on_error, the iterator raises the error
+    try:
+        outputs, error = run_with_timeout(args.timeout, separator, with_broken, prefetch=2)
+        ok = isinstance(error, LoadAudioError) and len(outputs) <= 2
+        print(f"{'✅' if ok else '❌'} failing decode without on_error: raised {error!r} "
+              f"after {len(outputs)} files")
+    except TimeoutError:
+        ok = False
+        print(f"❌ failing decode without on_error: hung for {args.timeout:.0f}s")
+    failed |= not ok
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
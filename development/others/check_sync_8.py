@@ -0,0 +1,105 @@
+"""
+sync_8 Equivalence Check
+Randomized property check of drum_transcriber.sync_8 (binary search for the closest onset)
+against the original implementation (np.argmin over all onsets for every eighth note):
+both must return bit-identical synced grids, for random tempos, timing jitter, missing or
+duplicated onsets, offset pre-roll and unsorted onsets.
+
+Usage:
+    python check_sync_8.py [--cases 500] [--seed 0]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "AnNOTEator"))
+
+from inference.transcriber import drum_transcriber
+
+
+def reference_sync_8(transcriber, _8_div):
+    """drum_transcriber.sync_8 as it was before the binary search"""
+    synced_8_div = [_8_div[0]]
+    diff_log = 0
+    for note in _8_div[1:]:
+        pos = np.argmin(np.abs(transcriber.note_line - (note + diff_log)))
+        diff = transcriber.note_line[pos] - (note + diff_log)
+        if np.abs(diff) > transcriber._32_duration:
+            synced_8_div.append(synced_8_div[-1] + transcriber._8_duration)
+        else:
+            diff_log = diff_log + diff
+            synced_8_div.append(note + diff_log)
+    if transcriber.offset == True:
+        [synced_8_div.insert(0, synced_8_div[0] - transcriber._8_duration)
+         for i in range(transcriber.beats_in_measure)]
+    return np.array(synced_8_div)
+
+
+def random_case(rng, sample_rate=44100):
+    """Random transcriber state and eighth note grid"""
+    bpm = rng.uniform(50, 280)
+    duration = rng.uniform(5, 240)
+    step = 60 / bpm / rng.choice([1, 2, 4, 6])
+    times = np.arange(rng.uniform(0, 2), duration, step)
+    times = times + rng.normal(0, rng.uniform(0, 60 / bpm / 8), len(times))
+    times = times[rng.random(len(times)) > rng.uniform(0, 0.5)]
+    if rng.random() < 0.2:
+        # Duplicated onsets
+        times = np.concatenate([times, rng.choice(times, size=len(times) // 10)])
+    times = np.clip(times, 0, None)
+    samples = np.round(times * sample_rate).astype(int)
+    if rng.random() < 0.9:
+        samples = np.sort(samples)
+    df = pd.DataFrame({"peak_sample": samples})
+
+    transcriber = drum_transcriber.__new__(drum_transcriber)
+    transcriber.offset = bool(rng.random() < 0.5)
+    transcriber.beats_in_measure = 2 * int(rng.integers(2, 8))
+    transcriber.bpm = bpm
+    transcriber.df = df
+    transcriber.sample_rate = sample_rate
+    transcriber.note_line = samples / sample_rate
+    transcriber.get_note_duration()
+    note_offset = int(rng.integers(0, min(20, len(df))))
+    _8_div = transcriber.get_eighth_note_time_grid(duration, note_offset=note_offset)
+    return transcriber, _8_div
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check drum_transcriber.sync_8 against the original implementation")
+    parser.add_argument("--cases", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    reference_time = 0.
+    sync_time = 0.
+    checked = 0
+    for case in range(args.cases):
+        transcriber, _8_div = random_case(rng)
+        if len(transcriber.note_line) == 0 or len(_8_div) == 0:
+            continue
+        start = time.perf_counter()
+        expected = reference_sync_8(transcriber, _8_div)
+        reference_time += time.perf_counter() - start
+        start = time.perf_counter()
+        synced = transcriber.sync_8(_8_div)
+        sync_time += time.perf_counter() - start
+        if not np.array_equal(expected, synced):
+            print(f"❌ Case {case} differs (bpm={transcriber.bpm:.1f}, "
+                  f"{len(transcriber.note_line)} onsets, offset={transcriber.offset})")
+            sys.exit(1)
+        checked += 1
+
+    print(f"✅ {checked} cases identical "
+          f"(argmin {reference_time:.2f}s, binary search {sync_time:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
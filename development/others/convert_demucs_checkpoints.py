@@ -0,0 +1,59 @@
+"""
+Demucs Checkpoint Conversion
+Converts the pickled `.th` model packages of a local Demucs model directory into
+memory-mapped `.safetensors` files, which LocalRepo then loads instead. Worker processes
+loading the same converted file share its pages, and startup no longer deserializes
+the full state dict.
+
+Usage:
+    python convert_demucs_checkpoints.py /path/to/demucs/models
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+from demucs.repo import LocalRepo, check_checksum
+from demucs.states import MAPPED_SUFFIX, load_mapped_model, load_model, save_mapped_model
+
+
+def convert(model_dir: Path, force: bool = False):
+    repo = LocalRepo(model_dir)
+    for sig, th_file in sorted(repo._models.items()):
+        target = model_dir / (sig + MAPPED_SUFFIX)
+        if target.exists() and not force:
+            print(f"⏭️  {sig}: {target.name} already exists")
+            continue
+        if sig in repo._checksums:
+            check_checksum(th_file, repo._checksums[sig])
+
+        start = time.time()
+        model = load_model(th_file)
+        th_load_time = time.time() - start
+        save_mapped_model(model, target)
+
+        start = time.time()
+        load_mapped_model(target)
+        mapped_load_time = time.time() - start
+        print(f"✅ {sig}: {th_file.name} -> {target.name} "
+              f"({target.stat().st_size / 2**20:.1f} MiB, load {th_load_time:.2f}s -> "
+              f"{mapped_load_time:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Demucs .th packages to memory-mapped files")
+    parser.add_argument("model_dir", type=Path, help="Directory containing the .th model files")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing converted files")
+    args = parser.parse_args()
+
+    if not args.model_dir.is_dir():
+        sys.exit(f"❌ {args.model_dir} is not a directory")
+    convert(args.model_dir, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Drum Hit Classifier Conversion
+Converts the AnNOTEator Keras drum hit classifier (complete_network.h5) into an ONNX
+graph next to it, which predict_drumhit then runs with onnxruntime without importing
+TensorFlow. Checks that both models predict the same probabilities on random input.
+
+Needs tensorflow and tf2onnx, only for the conversion.
+
+Usage:
+    python convert_drumhit_onnx.py [--network path/to/complete_network.h5] [--opset 13]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ANNOTEATOR_PATH = Path(__file__).parent.parent.parent / "library" / "AnNOTEator"
+DEFAULT_NETWORK = ANNOTEATOR_PATH / "inference" / "pretrained_models" / "annoteators" / "complete_network.h5"
+
+# Use the AnNOTEator inference package
+sys.path.insert(0, str(ANNOTEATOR_PATH))
+
+from inference.prediction import load_drumhit_model
+
+
+def convert(network: Path, target: Path, opset: int = 13):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(network)
+    # Dynamic batch dimension: (clips, mel bands, frames, 1)
+    input_signature = [tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="mel_spectrogram")]
+    start = time.time()
+    tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=opset,
+                               output_path=str(target))
+    print(f"✅ {network.name} -> {target.name} ({target.stat().st_size / 2**10:.0f} KiB, "
+          f"opset {opset}, {time.time() - start:.1f}s)")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the drum hit classifier to ONNX")
+    parser.add_argument("--network", type=Path, default=DEFAULT_NETWORK, help="Keras .h5 network")
+    parser.add_argument("--opset", type=int, default=13)
+    args = parser.parse_args()
+
+    target = args.network.with_suffix(".onnx")
+    keras_model = convert(args.network, target, opset=args.opset)
+
+    X = np.random.default_rng(0).gamma(0.5, 2., size=(512,) + tuple(keras_model.input_shape[1:])).astype(np.float32)
+    expected = keras_model.predict(X, verbose=0)
+    predicted = load_drumhit_model(target).predict(X)
+    max_diff = np.abs(predicted - expected).max()
+    if max_diff > 1e-4:
+        sys.exit(f"❌ ONNX predictions differ from Keras by up to {max_diff:.2e}")
+    print(f"✅ ONNX predictions match Keras (max difference {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
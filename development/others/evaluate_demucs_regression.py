@@ -0,0 +1,190 @@
+"""
+Demucs Regression Evaluation
+Separates a regression set in parallel worker processes and scores every track with the
+MDX definition of the SDR (nSDR), batched over all tracks and sources at the end.
+Writes a JSON report with per-track nSDR and wall-clock, and can compare it against a
+baseline report to gate model or optimization changes on quality.
+
+The regression set uses the same layout as demucs wav datasets: one folder per track,
+containing mixture.wav and one {source}.wav reference per evaluated source.
+
+Usage:
+    python evaluate_demucs_regression.py regression_set --model 83fc094f --repo models \\
+        --workers 4 --output report.json --baseline baseline_report.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+import torch as th
+
+# Separator of the current process, loaded once by init_worker
+_separator = None
+
+
+def init_worker(model_name, repo, shifts, segment, overlap, num_threads=None):
+    """Load the model once for this process"""
+    global _separator
+    from demucs.api import Separator
+
+    if num_threads:
+        th.set_num_threads(num_threads)
+    _separator = Separator(model=model_name, repo=repo, device="cpu", shifts=shifts,
+                           segment=segment, overlap=overlap, progress=False)
+
+
+def evaluate_track(track_dir, sources):
+    """
+    Separate one track and return the nSDR terms of each source
+
+    Returns:
+        tuple: (track name, reference energies, error energies, audio seconds, wall seconds)
+    """
+    from demucs.evaluate import sdr_energies
+
+    track_dir = Path(track_dir)
+    start_time = time.time()
+    _, estimates = _separator.separate_audio_file(track_dir / "mixture.wav")
+    references = th.stack([_separator._load_audio(track_dir / f"{source}.wav")
+                           for source in sources])
+    estimates = th.stack([estimates[source] for source in sources])
+    length = min(references.shape[-1], estimates.shape[-1])
+    num, den = sdr_energies(references[None, ..., :length].double(),
+                            estimates[None, ..., :length].double())
+    return (track_dir.name, num[0], den[0], length / _separator.samplerate,
+            time.time() - start_time)
+
+
+def find_tracks(root, sources):
+    """Track folders containing a mixture and every reference"""
+    tracks = []
+    for track_dir in sorted(Path(root).iterdir()):
+        if not (track_dir / "mixture.wav").exists():
+            continue
+        missing = [source for source in sources if not (track_dir / f"{source}.wav").exists()]
+        if missing:
+            print(f"⚠️  Skipping {track_dir.name}: missing {', '.join(missing)}")
+            continue
+        tracks.append(track_dir)
+    return tracks
+
+
+def run_evaluation(root, model_name, repo=None, sources=None, workers=1, shifts=0,
+                   segment=None, overlap=0.25):
+    """
+    Evaluate `model_name` on the regression set in `root`
+
+    Returns:
+        dict: JSON serializable report
+    """
+    from demucs.evaluate import sdr_from_energies
+    from demucs.pretrained import get_model
+
+    sources = sources or list(get_model(model_name, repo=repo).sources)
+    tracks = find_tracks(root, sources)
+    if not tracks:
+        raise ValueError(f"No complete track found in {root}")
+    print(f"📁 Evaluating {len(tracks)} tracks on {', '.join(sources)} with {workers} workers")
+
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    start_time = time.time()
+    results = []
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker,
+                             initargs=(model_name, repo, shifts, segment, overlap,
+                                       num_threads)) as pool:
+        futures = [pool.submit(evaluate_track, track_dir, sources) for track_dir in tracks]
+        for future in as_completed(futures):
+            results.append(future.result())
+            name, _, _, duration, elapsed = results[-1]
+            print(f"✓ {name}: {duration:.1f}s of audio in {elapsed:.1f}s")
+    wall_clock = time.time() - start_time
+
+    # nSDR of all tracks and sources in one batch
+    results.sort(key=lambda result: result[0])
+    nsdr = sdr_from_energies(th.stack([result[1] for result in results]),
+                             th.stack([result[2] for result in results]))
+
+    total_duration = sum(result[3] for result in results)
+    report = {
+        "model": model_name,
+        "settings": {"shifts": shifts, "segment": segment, "overlap": overlap,
+                     "workers": workers},
+        "tracks": {},
+        "nsdr": {},
+        "wall_clock": wall_clock,
+        "audio_seconds": total_duration,
+        "realtime_factor": wall_clock / total_duration,
+    }
+    for (name, _, _, duration, elapsed), scores in zip(results, nsdr.tolist()):
+        report["tracks"][name] = {
+            "nsdr": dict(zip(sources, scores)),
+            "duration": duration,
+            "elapsed": elapsed,
+        }
+    for source, scores in zip(sources, nsdr.mean(dim=0).tolist()):
+        report["nsdr"][source] = scores
+    report["nsdr"]["mean"] = nsdr.mean().item()
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Return the sources whose mean nSDR dropped by more than `tolerance` dB
+    """
+    regressions = []
+    for source, score in report["nsdr"].items():
+        if source in baseline["nsdr"] and score < baseline["nsdr"][source] - tolerance:
+            regressions.append(source)
+            print(f"✗ {source}: {score:.3f} dB vs {baseline['nsdr'][source]:.3f} dB baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate Demucs on a regression set")
+    parser.add_argument("root", type=Path, help="Folder with one sub-folder per track")
+    parser.add_argument("--model", default="htdemucs", help="Pretrained model name or signature")
+    parser.add_argument("--repo", type=Path, help="Local model repository")
+    parser.add_argument("--sources", nargs="+", help="Sources to evaluate (default: all)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    parser.add_argument("--shifts", type=int, default=0)
+    parser.add_argument("--segment", type=float)
+    parser.add_argument("--overlap", type=float, default=0.25)
+    parser.add_argument("--output", type=Path, default=Path("regression_report.json"),
+                        help="Output JSON report")
+    parser.add_argument("--baseline", type=Path, help="Report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Maximum allowed nSDR drop versus the baseline, in dB")
+    args = parser.parse_args()
+
+    report = run_evaluation(args.root, args.model, repo=args.repo, sources=args.sources,
+                            workers=args.workers, shifts=args.shifts, segment=args.segment,
+                            overlap=args.overlap)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n📊 nSDR: " + ", ".join(f"{source}={score:.3f}"
+                                   for source, score in report["nsdr"].items()))
+    print(f"⏱️  {report['audio_seconds']:.1f}s of audio in {report['wall_clock']:.1f}s "
+          f"(realtime factor {report['realtime_factor']:.3f})")
+    print(f"📁 Report saved to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare_to_baseline(report, baseline, args.tolerance):
+            sys.exit(1)
+        print(f"✅ No nSDR regression versus {args.baseline} (tolerance {args.tolerance} dB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Demucs ONNX Export
+Exports the network of a hybrid Demucs model (HDemucs / HTDemucs) of a local model
+directory to `{signature}.onnx` next to it, which the demucs-worker runs with onnxruntime
+when DEMUCS_BACKEND=onnx. The STFT, masking and iSTFT stay in torch: the graph goes from
+the segment waveform and its spectrogram to the source spectrograms and waveforms.
+Checks that the graph gives the same outputs as the torch network on random segments.
+
+The export has the fixed segment length of the model (or --segment for HDemucs, e.g. the
+autotuned one): the worker then always separates with that segment.
+
+Usage:
+    python export_demucs_onnx.py 83fc094f --repo /path/to/demucs/models [--segment 8] [--opset 17]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+import torch as th
+
+from demucs.onnx_model import ONNX_SUFFIX, OnnxModel, export_onnx
+from demucs.pretrained import get_model
+
+
+def check_parity(model, target, segments=3):
+    """Largest difference between the torch and onnxruntime network outputs on random segments"""
+    onnx_model = OnnxModel(model, target)
+    max_diff = 0.
+    for seed in range(segments):
+        th.manual_seed(seed)
+        mix = th.randn(1, model.audio_channels, onnx_model.length)
+        mag = model._magnitude(model._spec(mix))
+        with th.no_grad():
+            expected = model._core(mix, mag)
+        predicted = onnx_model._core(mix, mag)
+        max_diff = max(max_diff, *((p - e).abs().max().item() for p, e in zip(predicted, expected)))
+    return max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Demucs model network to ONNX")
+    parser.add_argument("model", nargs="?", default="83fc094f", help="Model signature (speed mode: 83fc094f)")
+    parser.add_argument("--repo", type=Path, required=True, help="Directory containing the model files")
+    parser.add_argument("--segment", type=float, help="Segment in seconds (default: the model segment)")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    model = get_model(args.model, repo=args.repo)
+    if hasattr(model, "models"):
+        sys.exit(f"❌ {args.model} is a bag of models, export each of its models instead")
+    target = args.repo / (args.model + ONNX_SUFFIX)
+
+    start = time.time()
+    length = export_onnx(model, target, segment=args.segment, opset_version=args.opset)
+    print(f"✅ {args.model} -> {target.name} ({target.stat().st_size / 2**20:.1f} MiB, "
+          f"{length / model.samplerate:.2f}s segments, opset {args.opset}, {time.time() - start:.1f}s)")
+
+    max_diff = check_parity(model, target)
+    if max_diff > 1e-3:
+        sys.exit(f"❌ ONNX outputs differ from torch by up to {max_diff:.2e}")
+    print(f"✅ ONNX outputs match torch (max difference {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
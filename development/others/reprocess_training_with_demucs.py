@@ -11,19 +11,27 @@ This addresses the critical issue identified by AnNOTEator team:
 "We suggest looking into how the Demucs package generates the extracted drum track,
 and in particular, the type of effects or filters that are automatically applied.
 Ideally, the training sound clips should receive a similar treatment."
+
+Demucs runs in-process: each worker process loads the model once and separates its share
+of the files, and progress is checkpointed to processing_stats.json after every file so that
+an interrupted run resumes where it stopped.
 """
 
 import os
-import subprocess
 import sys
 from pathlib import Path
 from tqdm import tqdm
+import multiprocessing
 import shutil
 import time
 import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
-def check_requirements():
+# Use the vendored demucs package
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "library" / "demucs" / "build" / "lib"))
+
+def check_requirements(assume_yes=False):
     """
     Check if Demucs is installed and system has enough resources
     """
@@ -31,14 +39,10 @@ def check_requirements():
     
     # Check Demucs installation
     try:
-        result = subprocess.run(['demucs', '--help'], 
-                              capture_output=True, text=True, timeout=10)
+        import demucs.api  # noqa: F401
         print("✓ Demucs is installed")
-    except FileNotFoundError:
-        print("✗ Demucs not found. Please install: pip install demucs")
-        return False
-    except Exception as e:
-        print(f"✗ Error checking Demucs: {e}")
+    except ImportError as e:
+        print(f"✗ Demucs could not be imported: {e}")
         return False
     
     # Check available disk space
@@ -49,9 +53,10 @@ def check_requirements():
         
         if free_gb < 250:
             print(f"⚠️  WARNING: Low disk space. Recommended: 250+ GB, Available: {free_gb:.1f} GB")
-            response = input("Continue anyway? (yes/no): ")
-            if response.lower() != 'yes':
-                return False
+            if not assume_yes:
+                response = input("Continue anyway? (yes/no): ")
+                if response.lower() != 'yes':
+                    return False
     except Exception as e:
         print(f"⚠️  Could not check disk space: {e}")
     
@@ -84,67 +89,58 @@ def get_demucs_models():
         }
     }
 
-def process_single_file(wav_file, output_dir, model_name="htdemucs", save_format="mp3"):
+# Separator of the current process, loaded once by init_worker
+_separator = None
+
+def init_worker(model_name="htdemucs", num_threads=None):
+    """
+    Load the Demucs model once for this process
+
+    Args:
+        model_name: Demucs model to use
+        num_threads: Torch intra-op threads for this process (default: torch's choice)
     """
-    Process a single WAV file through Demucs
+    global _separator
+    import torch
+    from demucs.api import Separator
+    
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    _separator = Separator(model=model_name, device="cpu", progress=False)
+
+def process_single_file(wav_file, output_file, save_format="mp3"):
+    """
+    Extract the drum stem of a single WAV file with the model loaded by init_worker
     
     Args:
         wav_file: Path to input WAV file
-        output_dir: Output directory
-        model_name: Demucs model to use
+        output_file: Path of the drum stem to write
         save_format: Output format (mp3, wav, flac)
     
     Returns:
-        tuple: (success: bool, output_path: str, error_message: str)
+        tuple: (input: str, success: bool, output_path: str, error_message: str)
     """
+    from demucs.api import save_audio
+    
     try:
-        # Build Demucs command
-        cmd = [
-            'demucs',
-            '--two-stems=drums',  # Only extract drums (faster)
-            '-n', model_name,
-            '-o', str(output_dir),
-        ]
-        
-        # Add format options
-        if save_format == 'mp3':
-            cmd.extend(['--mp3', '--mp3-bitrate', '320'])
-        elif save_format == 'flac':
-            cmd.append('--flac')
-        # Default is WAV
-        
-        cmd.append(str(wav_file))
-        
-        # Run Demucs
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=600  # 10 minute timeout per file
-        )
-        
-        if result.returncode != 0:
-            return False, None, f"Demucs failed: {result.stderr}"
-        
-        # Find output file
-        # Demucs creates: output_dir/model_name/filename/drums.{format}
-        basename = Path(wav_file).stem
-        demucs_subdir = Path(output_dir) / model_name / basename
-        
-        drum_file = demucs_subdir / f"drums.{save_format}"
-        
-        if not drum_file.exists():
-            return False, None, f"Output file not found: {drum_file}"
-        
-        return True, str(drum_file), None
-        
-    except subprocess.TimeoutExpired:
-        return False, None, "Processing timeout (>10 minutes)"
+        _, stems = _separator.separate_audio_file(Path(wav_file))
+        save_audio(stems['drums'], str(output_file), samplerate=_separator.samplerate,
+                   bitrate=320)
+        return str(wav_file), True, str(output_file), None
     except Exception as e:
-        return False, None, str(e)
+        return str(wav_file), False, None, str(e)
+
+def save_stats(stats, stats_file):
+    """
+    Atomically write the progress manifest, so an interruption never leaves it truncated
+    """
+    tmp_file = stats_file.with_suffix('.json.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(stats, f, indent=2)
+    tmp_file.replace(stats_file)
 
 def process_dataset(input_dir, output_dir, model_name="htdemucs", 
-                   save_format="mp3", preserve_structure=True):
+                   save_format="mp3", preserve_structure=True, workers=1, assume_yes=False):
     """
     Process entire dataset through Demucs
     
@@ -154,6 +150,8 @@ def process_dataset(input_dir, output_dir, model_name="htdemucs",
         model_name: Demucs model to use
         save_format: Output format (mp3, wav, flac)
         preserve_structure: Maintain original directory structure
+        workers: Number of worker processes, each holding one copy of the model
+        assume_yes: Do not ask for confirmation before starting
     """
     input_path = Path(input_dir)
     output_path = Path(output_dir)
@@ -171,12 +169,32 @@ def process_dataset(input_dir, output_dir, model_name="htdemucs",
     
     print(f"✓ Found {len(wav_files)} audio files")
     
+    # Resume from the manifest of a previous run with the same settings
+    stats_file = output_path / 'processing_stats.json'
+    stats = None
+    if stats_file.exists():
+        with open(stats_file) as f:
+            previous = json.load(f)
+        if previous.get('model') == model_name and previous.get('format') == save_format:
+            stats = previous
+        else:
+            print(f"⚠️  Ignoring {stats_file}: it was written for another model or format")
+    done = {entry['input'] for entry in stats['processed']} if stats else set()
+    todo = [wav_file for wav_file in wav_files if str(wav_file) not in done]
+    if done:
+        print(f"✓ Resuming: {len(wav_files) - len(todo)} files already processed, "
+              f"{len(todo)} to go")
+    
+    if len(todo) == 0:
+        print("✓ Nothing left to process")
+        return stats
+    
     # Estimate processing time
-    avg_time_per_file = 120  # seconds (conservative estimate)
-    total_time_hours = (len(wav_files) * avg_time_per_file) / 3600
+    avg_time_per_file = 30  # seconds per file and worker (conservative estimate)
+    total_time_hours = (len(todo) * avg_time_per_file) / 3600 / workers
     
     print(f"\n⏱️  Estimated processing time: {total_time_hours:.1f} hours")
-    print(f"   ({avg_time_per_file}s per file × {len(wav_files)} files)")
+    print(f"   ({avg_time_per_file}s per file × {len(todo)} files / {workers} workers)")
     print(f"\n⚠️  This will take a LONG time. Consider:")
     print(f"   • Running overnight")
     print(f"   • Using tmux/screen to prevent disconnection")
@@ -190,13 +208,15 @@ def process_dataset(input_dir, output_dir, model_name="htdemucs",
     print(f"Output: {output_dir}")
     print(f"Model:  {model_name}")
     print(f"Format: {save_format}")
-    print(f"Files:  {len(wav_files)}")
+    print(f"Files:  {len(todo)}")
+    print(f"Workers: {workers}")
     print(f"="*70)
     
-    response = input("\nContinue? (yes/no): ")
-    if response.lower() != 'yes':
-        print("Cancelled.")
-        return
+    if not assume_yes:
+        response = input("\nContinue? (yes/no): ")
+        if response.lower() != 'yes':
+            print("Cancelled.")
+            return
     
     # Process files
     start_time = time.time()
@@ -204,21 +224,22 @@ def process_dataset(input_dir, output_dir, model_name="htdemucs",
     failed = 0
     errors = []
     
-    # Create stats file
-    stats = {
-        'start_time': datetime.now().isoformat(),
-        'input_dir': str(input_dir),
-        'output_dir': str(output_dir),
-        'model': model_name,
-        'format': save_format,
-        'total_files': len(wav_files),
-        'processed': [],
-        'failed': []
-    }
-    
-    print(f"\n🚀 Starting processing...\n")
+    # Create stats file (failures of a previous run are retried)
+    if stats is None:
+        stats = {
+            'start_time': datetime.now().isoformat(),
+            'input_dir': str(input_dir),
+            'output_dir': str(output_dir),
+            'model': model_name,
+            'format': save_format,
+            'processed': [],
+        }
+    stats['total_files'] = len(wav_files)
+    stats['failed'] = []
     
-    for i, wav_file in enumerate(tqdm(wav_files, desc="Processing", unit="file")):
+    # Output path of each file
+    jobs = {}
+    for wav_file in todo:
         # Calculate relative path to preserve structure
         rel_path = wav_file.relative_to(input_path)
         
@@ -228,48 +249,52 @@ def process_dataset(input_dir, output_dir, model_name="htdemucs",
             file_output_dir = output_path
         
         file_output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Process file
-        success, output_file, error = process_single_file(
-            wav_file, 
-            file_output_dir, 
-            model_name, 
-            save_format
-        )
-        
-        if success:
-            successful += 1
-            
-            # Move and rename output
-            final_output = file_output_dir / f"{wav_file.stem}_drums.{save_format}"
-            shutil.move(output_file, final_output)
-            
-            # Clean up Demucs temp directories
-            demucs_temp = file_output_dir / model_name
-            if demucs_temp.exists():
-                shutil.rmtree(demucs_temp)
-            
-            stats['processed'].append({
-                'input': str(wav_file),
-                'output': str(final_output),
-                'relative_path': str(rel_path)
-            })
-            
-        else:
-            failed += 1
-            error_info = {
-                'file': str(wav_file),
-                'error': error
-            }
-            errors.append(error_info)
-            stats['failed'].append(error_info)
+        jobs[str(wav_file)] = (file_output_dir / f"{wav_file.stem}_drums.{save_format}", rel_path)
+    
+    print(f"\n🚀 Starting processing...\n")
+    
+    if workers > 1:
+        # Split the cpu threads between the worker processes
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=init_worker, initargs=(model_name, num_threads))
+        futures = [pool.submit(process_single_file, wav_file, jobs[str(wav_file)][0], save_format)
+                   for wav_file in todo]
+        results = (future.result() for future in as_completed(futures))
+    else:
+        pool = None
+        init_worker(model_name)
+        results = (process_single_file(wav_file, jobs[str(wav_file)][0], save_format)
+                   for wav_file in todo)
+    
+    try:
+        for wav_file, success, output_file, error in tqdm(results, total=len(todo),
+                                                            desc="Processing", unit="file"):
+            if success:
+                successful += 1
+                stats['processed'].append({
+                    'input': wav_file,
+                    'output': output_file,
+                    'relative_path': str(jobs[wav_file][1])
+                })
+            else:
+                failed += 1
+                error_info = {
+                    'file': wav_file,
+                    'error': error
+                }
+                errors.append(error_info)
+                stats['failed'].append(error_info)
+                
+                tqdm.write(f"✗ Failed: {Path(wav_file).name} - {error}")
             
-            tqdm.write(f"✗ Failed: {wav_file.name} - {error}")
-        
-        # Save stats periodically (every 10 files)
-        if (i + 1) % 10 == 0:
-            with open(output_path / 'processing_stats.json', 'w') as f:
-                json.dump(stats, f, indent=2)
+            # Checkpoint after every file so an interrupted run can resume
+            save_stats(stats, stats_file)
+    finally:
+        if pool is not None:
+            for future in futures:
+                future.cancel()
+            pool.shutdown()
     
     # Final statistics
     end_time = time.time()
@@ -277,23 +302,21 @@ def process_dataset(input_dir, output_dir, model_name="htdemucs",
     
     stats['end_time'] = datetime.now().isoformat()
     stats['total_time_seconds'] = total_time
-    stats['successful'] = successful
-    stats['failed'] = failed
+    stats['successful'] = len(stats['processed'])
     
     # Save final stats
-    with open(output_path / 'processing_stats.json', 'w') as f:
-        json.dump(stats, f, indent=2)
+    save_stats(stats, stats_file)
     
     # Print summary
     print(f"\n" + "="*70)
     print(f"  PROCESSING COMPLETE")
     print(f"="*70)
-    print(f"✓ Successful: {successful}/{len(wav_files)} files")
-    print(f"✗ Failed:     {failed}/{len(wav_files)} files")
+    print(f"✓ Successful: {successful}/{len(todo)} files ({stats['successful']}/{len(wav_files)} in total)")
+    print(f"✗ Failed:     {failed}/{len(todo)} files")
     print(f"⏱️  Total time:  {total_time/3600:.2f} hours")
-    print(f"⏱️  Avg per file: {total_time/len(wav_files):.1f} seconds")
+    print(f"⏱️  Avg per file: {total_time/len(todo):.1f} seconds")
     print(f"\n📁 Output directory: {output_dir}")
-    print(f"📊 Stats saved to: {output_path / 'processing_stats.json'}")
+    print(f"📊 Stats saved to: {stats_file}")
     
     if failed > 0:
         print(f"\n⚠️  {failed} files failed. Check errors:")
@@ -301,6 +324,7 @@ def process_dataset(input_dir, output_dir, model_name="htdemucs",
             print(f"   • {Path(error['file']).name}: {error['error']}")
         if len(errors) > 5:
             print(f"   ... and {len(errors)-5} more (see processing_stats.json)")
+        print(f"   Run the same command again to retry them")
     
     print(f"="*70)
     
@@ -332,6 +356,12 @@ Examples:
       --output training_data/demucs_processed \\
       --model mdx \\
       --format mp3
+  
+  # Unattended run on 4 worker processes (re-run the same command to resume)
+  python reprocess_training_with_demucs.py \\
+      --input AnNOTEator/dataset/e-gmd-v1.0.0 \\
+      --output training_data/demucs_processed \\
+      --workers 4 --yes
         """
     )
     
@@ -347,6 +377,10 @@ Examples:
                        help='Output audio format (default: mp3 to save space)')
     parser.add_argument('--no-preserve-structure', action='store_true',
                        help='Do not preserve directory structure')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Worker processes, each loading the model once (default: 1)')
+    parser.add_argument('--yes', action='store_true',
+                       help='Do not ask for confirmation, to run unattended')
     
     args = parser.parse_args()
     
@@ -359,7 +393,7 @@ Examples:
     print("   This addresses the train/production audio mismatch issue\n")
     
     # Check requirements
-    if not check_requirements():
+    if not check_requirements(args.yes):
         sys.exit(1)
     
     # Show model info
@@ -376,10 +410,12 @@ Examples:
         args.output,
         args.model,
         args.format,
-        not args.no_preserve_structure
+        not args.no_preserve_structure,
+        workers=args.workers,
+        assume_yes=args.yes
     )
     
-    if stats and stats['successful'] > 0:
+    if stats and stats.get('successful', len(stats['processed'])) > 0:
         print("\n✅ SUCCESS! You can now retrain AnNOTEator with:")
         print(f"\n   python AnNOTEator/model_development/train_model.py \\")
         print(f"       --dataset {args.output} \\")
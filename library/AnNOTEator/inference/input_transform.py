@@ -5,6 +5,7 @@ try:
 except ImportError:
     YouTube = None  # YouTube functionality will be disabled if pytube not installed
 import numpy as np
+import soxr
 from pathlib import Path
 import multiprocessing
 import os
@@ -14,7 +15,7 @@ from pedalboard import Pedalboard, Compressor
 # Add lightweight logger (container-wide logging config already set in worker)
 logger = logging.getLogger("annoteator.input_transform")
 
-def drum_extraction(path, dir=None, kernel='demucs', mode='performance', drum_start=None, drum_end=None):
+def drum_extraction(path, dir=None, kernel='demucs', mode='performance', drum_start=None, drum_end=None, callback=None):
     """
     This is a function to transform the input audio file into a ready-dataframe for prediction task  
     :param path (str):                  the path to the audio file
@@ -26,6 +27,9 @@ def drum_extraction(path, dir=None, kernel='demucs', mode='performance', drum_st
                                         A as a result, speed mode will run 4x faster, but quality could be worse. Performance mode will ensure the best quality but much slower.  
     :param drum_start (int):            the start of the music in the file (in seconds). Shorter audio will reduce the processing time significantly. If not set, assume to start at the begining of the track
     :param drum_end (int):              the end of the music in the file (in seconds). Shorter audio will reduce the processing time significantly. If not set, assume to end at the end of the track
+    :param callback (callable):         only applicable when demucs kernel is used. Called with a dict after each segment went through a model,
+                                        with the same keys as the demucs apply_model callbacks ('state', 'model_idx_in_bag', 'models', 'audio_length'),
+                                        plus 'segments', the expected number of segments for the whole separation.
 
     :return drum_track (numpy array):   the extracted drum track
     :return sample_rate (int):          the sampling rate of the extracted drum track
@@ -106,15 +110,22 @@ def drum_extraction(path, dir=None, kernel='demucs', mode='performance', drum_st
         else:
             num_workers = multiprocessing.cpu_count()
         logger.info(f"Demucs apply_model starting (mode={mode}, workers={num_workers})...")
-        sources = apply.apply_model(
-            model, wav[None],
-            device='cpu',
-            shifts=1,
-            split=True,
-            overlap=0.25,
-            progress=True,
-            num_workers=num_workers
-            )[0]
+        hooks = []
+        if callback is not None:
+            hooks = _add_segment_callbacks(model, wav.shape[-1], callback, overlap=0.25, shifts=1)
+        try:
+            sources = apply.apply_model(
+                model, wav[None],
+                device='cpu',
+                shifts=1,
+                split=True,
+                overlap=0.25,
+                progress=True,
+                num_workers=num_workers
+                )[0]
+        finally:
+            for hook in hooks:
+                hook.remove()
         logger.info("Demucs apply_model completed successfully.")
         
         sources = sources * ref.std() + ref.mean()
@@ -127,6 +138,30 @@ def drum_extraction(path, dir=None, kernel='demucs', mode='performance', drum_st
 
     return drum_track, sample_rate
 
+def _add_segment_callbacks(model, audio_length, callback, overlap=0.25, shifts=1):
+    """
+    Report every segment processed by the models of a demucs bag to `callback`.
+    The annoteator-worker pins demucs==3.0.4, whose apply_model takes no `callback`/`callback_arg`
+    (added in demucs 4) and does not expose how many segments it will run. So this hooks the forward of
+    each model, which apply_model calls once per segment, and counts the segments itself.
+    Returns the hook handles to remove afterwards.
+    """
+    # Same count as count_segments in {annoteator,demucs}-worker/services/progress.py, which this
+    # library cannot import (it also runs on its own through main.py): keep them in sync.
+    # Shifted mixes are up to 0.5s longer than the input, count the worst case
+    max_shift = int(0.5 * model.samplerate) if shifts else 0
+    segments = 0
+    for sub_model in model.models:
+        stride = int((1 - overlap) * int(model.samplerate * sub_model.segment))
+        segments += max(1, shifts) * int(np.ceil((audio_length + max_shift) / stride))
+
+    hooks = []
+    for idx, sub_model in enumerate(model.models):
+        info = {'state': 'end', 'model_idx_in_bag': idx, 'models': len(model.models),
+                'audio_length': audio_length, 'segments': segments}
+        hooks.append(sub_model.register_forward_hook(lambda module, inputs, output, info=info: callback(dict(info))))
+    return hooks
+
 def drum_to_frame(drum_track, sample_rate, estimated_bpm=None, resolution=16, fixed_clip_length=False, hop_length=1024, backtrack=False):
 
     """
@@ -232,27 +267,59 @@ def drum_to_frame(drum_track, sample_rate, estimated_bpm=None, resolution=16, fi
     for onset in onset_samples:
         if onset-padding<0:
             onset=0
-        df_dict['audio_clip'].append(drum_track[onset-padding:onset+window_size])
         df_dict['sample_start'].append(onset-padding)
         df_dict['sample_end'].append(onset+window_size)
-        df_dict['sampling_rate'].append(sample_rate)
 
-    df=pd.DataFrame.from_dict(df_dict)
-    df['peak_sample']=pd.Series(peak_samples)
+    #slice all the clips at once. Clips running over the start or the end of the track are zero padded, so that every clip has the same length
+    clip_length=int(padding+window_size)
+    starts=np.array(df_dict['sample_start'], dtype=int)
+    clips=np.pad(drum_track, clip_length)[starts[:, None]+clip_length+np.arange(clip_length)]
 
     #check clip length to align with model requirement
-    def resampling(x, target_length):
-        org_sr=x['sampling_rate']
-        tar_sr_ratio=target_length/len(x['audio_clip'])
-        return pd.Series([librosa.resample(x['audio_clip'], orig_sr=org_sr, target_sr=int(org_sr*tar_sr_ratio)), int(org_sr*tar_sr_ratio)])
-    df[['audio_clip', 'sampling_rate']]=df.apply(
-            lambda x:resampling(x, 8820) if len(x['audio_clip'])!=8820 else pd.Series([x['audio_clip'], x['sampling_rate']]) , axis=1)
+    clip_sr=sample_rate
+    if clip_length!=8820 and len(clips)>0:
+        clips, clip_sr=resample_clips(clips, sample_rate, 8820)
+    df_dict['sampling_rate']=[clip_sr]*len(clips)
+    df_dict['audio_clip']=list(compress_clips(clips, clip_sr))
 
-    pb = Pedalboard([Compressor(threshold_db=-27, ratio=4,attack_ms=1,release_ms=200)])
-    df['audio_clip']=df.apply(lambda x:pb(x.audio_clip, x.sampling_rate), axis=1)
+    df=pd.DataFrame.from_dict(df_dict)
+    df['peak_sample']=pd.Series(peak_samples)
 
     return df, bpm
 
+def resample_clips(clips, sample_rate, target_length):
+    """
+    This is a function to resample a batch of audio clips of the same length to target_length samples at once.
+    The clips go through a single soxr resampler as channels of one signal, so the resampling filter is designed once for the whole batch,
+    with the same output as librosa.resample (soxr_hq) on each clip
+    :param clips (numpy array):         2-D array of audio clips, one clip per row
+    :param sample_rate (int):           the sampling rate of the clips
+    :param target_length (int):         the number of samples of each clip after resampling
+
+    :return clips (numpy array):        2-D array of the resampled clips, padded or truncated to exactly target_length samples
+    :return sample_rate (int):          the sampling rate of the resampled clips
+    """
+    target_sr=int(sample_rate*target_length/clips.shape[1])
+    resampled=soxr.resample(np.ascontiguousarray(clips.T), sample_rate, target_sr, quality='soxr_hq').T
+    resampled=librosa.util.fix_length(resampled, size=target_length, axis=1)
+    return np.ascontiguousarray(resampled, dtype=clips.dtype), target_sr
+
+def compress_clips(clips, sample_rate, batch_size=1024):
+    """
+    This is a function to apply the dynamic range compressor of the model input (threshold -27 dB, ratio 4, attack 1 ms, release 200 ms) to a batch of audio clips.
+    The clips are the channels of one multichannel signal: the compressor follows a separate envelope per channel, starting from silence at every call,
+    so each clip is compressed exactly as if it was processed alone
+    :param clips (numpy array):         2-D array of audio clips, one clip per row
+    :param sample_rate (int):           the sampling rate of the clips
+    :param batch_size (int):            the number of clips per compressor call. Must stay below the clip length, so that pedalboard reads the rows as channels
+
+    :return clips (numpy array):        2-D array of the compressed clips
+    """
+    if len(clips)==0:
+        return clips
+    pb = Pedalboard([Compressor(threshold_db=-27, ratio=4,attack_ms=1,release_ms=200)])
+    return np.concatenate([pb(clips[i:i+batch_size], sample_rate) for i in range(0, len(clips), batch_size)])
+
 def get_yt_audio(link):
     if YouTube is None:
         raise ImportError("pytube is not installed. Install it with: pip install pytube")
@@ -0,0 +1,169 @@
+'''
+A streaming MusicXML writer for the drum_transcriber output.
+
+It consumes drum_transcriber.music21_data directly and writes the drum sheet music measure by measure, with the percussion clef,
+the drumset instrument, unpitched notes, noteheads, tuplets and stems, without building any music21 object.
+music21 remains the backend for rendering and the other formats (pdf, png, midi), through drum_transcriber.sheet.
+'''
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+#Duration unit of the MusicXML file, in divisions per quarter note. Every note of music21_data is a whole number of divisions
+DIVISIONS=24
+
+label_pitch_map={'KD':('F', 4), 'SD':('C', 5), 'SD_xstick':('C', 5), 'HH_close':('G', 5), 'HH_open':('G', 5), 'RC':('G', 5), 'CC':('A', 5),
+                 'HT':('E', 5), 'MT':('D', 5), 'FT':('A', 4), 'HH':('G', 5), 'TT':('E', 5)}
+x_notehead_labels={'HH_close', 'HH_open', 'RC', 'HH'}
+
+#Note types that can be written without a tuplet, in divisions, with their dotted and double dotted values
+note_types=[('breve', 8*DIVISIONS), ('whole', 4*DIVISIONS), ('half', 2*DIVISIONS), ('quarter', DIVISIONS), ('eighth', DIVISIONS//2),
+            ('16th', DIVISIONS//4), ('32nd', DIVISIONS//8)]
+plain_durations=sorted([(value*(2**(dots+1)-1)//2**dots, name, dots) for name, value in note_types for dots in range(3)
+                        if (value*(2**(dots+1)-1))%2**dots==0], reverse=True)
+
+#Eighth note triplets and sixthlets, written as eighth notes with 3 (or 6) notes in the time of 1 eighth note, like music21 does
+tuplet_durations={DIVISIONS//6: 3, DIVISIONS//12: 6}
+tuplet_span=DIVISIONS//2
+
+def split_duration(ticks):
+    '''
+    A function to split a duration (in divisions) into note types that can be written without a tuplet, longest first
+    '''
+    parts=[]
+    for value, name, dots in plain_durations:
+        while ticks>=value:
+            parts.append((value, name, dots))
+            ticks-=value
+    if ticks>0:
+        raise ValueError(f'Duration of {ticks} divisions cannot be written in MusicXML with {DIVISIONS} divisions per quarter note')
+    return parts
+
+def note_xml(labels, ticks, name, dots=0, tuplet=None, tuplet_type=None, tie=None):
+    '''
+    A function to write one note, chord or rest of the sheet music as MusicXML <note> elements
+    '''
+    lines=[]
+    pitches=[None] if labels[0]=='rest' else labels
+    for i, label in enumerate(pitches):
+        lines.append('      <note>')
+        if i>0:
+            lines.append('        <chord/>')
+        if label is None:
+            lines.append('        <rest/>')
+        else:
+            step, octave=label_pitch_map[label]
+            lines.append(f'        <unpitched><display-step>{step}</display-step><display-octave>{octave}</display-octave></unpitched>')
+        lines.append(f'        <duration>{ticks}</duration>')
+        if tie and label is not None:
+            lines.extend(f'        <tie type="{t}"/>' for t in tie)
+        lines.append(f'        <type>{name}</type>')
+        lines.extend(['        <dot/>']*dots)
+        if tuplet:
+            lines.append(f'        <time-modification><actual-notes>{tuplet}</actual-notes><normal-notes>1</normal-notes>'
+                         '<normal-type>eighth</normal-type></time-modification>')
+        if label is not None:
+            if i==0:
+                lines.append('        <stem>up</stem>')
+            if label in x_notehead_labels:
+                lines.append('        <notehead>x</notehead>')
+        notations=[]
+        if tie and label is not None:
+            notations.extend(f'<tied type="{t}"/>' for t in tie)
+        if tuplet_type and i==0:
+            notations.append(f'<tuplet type="{tuplet_type}" bracket="yes" placement="above"/>')
+        if notations:
+            lines.append(f'        <notations>{"".join(notations)}</notations>')
+        lines.append('      </note>')
+    return lines
+
+def iter_notes(music21_data, measure_ticks):
+    '''
+    A function to lay out the notes of music21_data over the measures of the time signature.
+    Notes crossing a barline are split at the barline (tied if not a rest), and rests filling a whole measure become measure rests.
+
+    :return generator of (measure index, list of MusicXML lines) for every note
+    '''
+    position=0
+    for _measure in music21_data:
+        for dur, labels in _measure:
+            ticks=round(dur*DIVISIONS)
+            if ticks in tuplet_durations:
+                #a tuplet group always fills one eighth note, which never crosses a barline
+                tuplet_type='start' if position%tuplet_span==0 else 'stop' if (position+ticks)%tuplet_span==0 else None
+                yield position//measure_ticks, note_xml(labels, ticks, 'eighth', tuplet=tuplet_durations[ticks], tuplet_type=tuplet_type)
+                position+=ticks
+                continue
+
+            pieces=[]
+            while ticks>0:
+                piece=min(ticks, measure_ticks-position%measure_ticks)
+                pieces.append((position, piece))
+                position+=piece
+                ticks-=piece
+            for start, piece in pieces:
+                if labels[0]=='rest' and piece==measure_ticks:
+                    yield start//measure_ticks, [f'      <note><rest measure="yes"/><duration>{piece}</duration></note>']
+                    continue
+                for value, name, dots in split_duration(piece):
+                    tie=[]
+                    if start>pieces[0][0]:
+                        tie.append('stop')
+                    if start+value<pieces[-1][0]+pieces[-1][1]:
+                        tie.append('start')
+                    yield start//measure_ticks, note_xml(labels, value, name, dots, tie=tie)
+                    start+=value
+
+def write_musicxml(music21_data, fp, beats=4, beat_type=4, song_title=None, composer='Generated by GrooveSheet'):
+    '''
+    A function to write the drum sheet music of music21_data in MusicXML format, as a percussion staff played by a drumset on MIDI channel 10.
+    Beams are left out, so that notation softwares (MuseScore) beam the notes by the time signature.
+
+    :param  music21_data (list):    drum_transcriber.music21_data, a list of measures of (quarter note duration, list of labels or ['rest'])
+    :param  fp (str):               file path of the MusicXML file. '.musicxml' is appended when it has no extension, like music21 does
+    :param  beats (int):            The UPPER NUMBER of the time signature
+    :param  beat_type (int):        The LOWER NUMBER of the time signature
+    :param  song_title (str):       The title displayed in the sheet music. Default 'Drum Sheet Music'
+    :param  composer (str):         The composer displayed in the sheet music
+
+    :return fp (pathlib.Path):      file path of the MusicXML file
+    '''
+    measure_ticks=beats*DIVISIONS*4//beat_type
+    title=escape(song_title if song_title is not None else 'Drum Sheet Music')
+    fp=Path(fp)
+    if not fp.suffix:
+        fp=fp.with_suffix('.musicxml')
+    with open(fp, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" "http://www.musicxml.org/dtds/partwise.dtd">\n'
+                '<score-partwise version="4.0">\n'
+                f'  <work><work-title>{title}</work-title></work>\n'
+                f'  <movement-title>{title}</movement-title>\n'
+                '  <identification>\n'
+                f'    <creator type="composer">{escape(composer)}</creator>\n'
+                '    <encoding><software>GrooveSheet</software><supports element="stem" type="yes"/></encoding>\n'
+                '  </identification>\n'
+                '  <part-list>\n'
+                '    <score-part id="P1">\n'
+                '      <part-name>Drumset</part-name>\n'
+                '      <score-instrument id="P1-I1"><instrument-name>Drumset</instrument-name></score-instrument>\n'
+                '      <midi-instrument id="P1-I1"><midi-channel>10</midi-channel><midi-program>1</midi-program></midi-instrument>\n'
+                '    </score-part>\n'
+                '  </part-list>\n'
+                '  <part id="P1">\n'
+                '    <measure number="1">\n'
+                '      <attributes>\n'
+                f'        <divisions>{DIVISIONS}</divisions>\n'
+                f'        <time><beats>{beats}</beats><beat-type>{beat_type}</beat-type></time>\n'
+                '        <clef><sign>percussion</sign></clef>\n'
+                '      </attributes>\n')
+        current=0
+        for measure, lines in iter_notes(music21_data, measure_ticks):
+            while current<measure:
+                current+=1
+                f.write(f'    </measure>\n    <measure number="{current+1}">\n')
+            f.write('\n'.join(lines)+'\n')
+        f.write('      <barline location="right"><bar-style>light-heavy</bar-style></barline>\n'
+                '    </measure>\n'
+                '  </part>\n'
+                '</score-partwise>\n')
+    return fp
@@ -1,19 +1,66 @@
+import os
 import pandas as pd
 import numpy as np
-from tensorflow import keras
 import librosa
 
+class onnx_drumhit_model():
+  '''
+  The drum hit classifier converted to ONNX, run with onnxruntime on the CPU. Provides the predict method of the keras model it replaces
+
+  :param network (file path):           Path to the ONNX network
+  :param num_threads (int):             Number of threads used inside each operator (intra-op threads). Default None, let onnxruntime decide
+  '''
+  def __init__(self, network, num_threads=None):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    if num_threads:
+      options.intra_op_num_threads = num_threads
+    options.inter_op_num_threads = 1
+    self.session = ort.InferenceSession(network, sess_options=options, providers=['CPUExecutionProvider'])
+    self.input_name = self.session.get_inputs()[0].name
+
+  def predict(self, X, batch_size=256):
+    '''
+    :param X (numpy array):               Mel spectrograms of shape (clips, 128, 18, 1)
+    :param batch_size (int):              Number of clips per onnxruntime run
+
+    :return pred_raw (numpy array):       The hit probability of each label, of shape (clips, 6)
+    '''
+    X = np.asarray(X, dtype=np.float32)
+    pred_raw = [self.session.run(None, {self.input_name: X[i:i+batch_size]})[0] for i in range(0, len(X), batch_size)]
+    return np.concatenate(pred_raw) if pred_raw else np.zeros((0, 6), dtype=np.float32)
+
+def load_drumhit_model(network, backend=None, num_threads=None):
+  '''
+  :param network (file path):           Path to the trained keras network (.h5) or to its ONNX conversion (.onnx)
+  :param backend (str):                 'keras' or 'onnx'. Default None, picked from the file extension of the network.
+                                        The onnx backend only needs onnxruntime, TensorFlow is not imported
+  :param num_threads (int):             onnx backend only. Number of intra-op threads, default None let onnxruntime decide
+
+  :return model:                        The drum hit classifier, with a predict method
+  '''
+  if backend is None:
+    backend = 'onnx' if os.path.splitext(str(network))[1] == '.onnx' else 'keras'
+  if backend == 'onnx':
+    return onnx_drumhit_model(str(network), num_threads=num_threads)
+  elif backend == 'keras':
+    from tensorflow import keras
+    return keras.models.load_model(network)
+  else:
+    raise ValueError(f"Unknown drum hit classifier backend '{backend}'. Please use either 'keras' or 'onnx'")
+
 def predict_drumhit(network,df, song_sampling_rate):
 
   '''
-  :param network (file path):           Path to the trained keras network
+  :param network (file path / model):   Path to the trained keras network, or to its ONNX conversion. A model returned by load_drumhit_model is also accepted, to load it only once
   :param df (Pandas DataFrame):         The output dataframe from drum_to_frame function 
   :param song_sampling_rate (int):      The sampling rate of the song
 
   :return result (Pandas DataFrame):    The dataframe with prediction labels
   '''
 
-  model = keras.models.load_model(network)
+  model = network if hasattr(network, 'predict') else load_drumhit_model(network)
   
   pred_x = []
 
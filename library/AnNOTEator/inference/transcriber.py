@@ -1,8 +1,22 @@
+import bisect
 import pandas as pd
 import librosa
 import numpy as np
-from music21 import * 
 import copy
+from inference import musicxml_writer
+
+#Integer time index of the quantized notes: the n-th synced eighth note starts at tick n*TICKS_PER_EIGHTH,
+#and every note division (16th, 32th, eighth triplets, eighth sixthlet) falls on a whole tick
+TICKS_PER_EIGHTH=24
+
+def closest_value(sorted_values, x):
+    '''
+    Return the element of sorted_values closest to each element of x, using a binary search. Equidistant elements resolve to the first one, like np.argmin does
+    '''
+    pos=np.searchsorted(sorted_values, x)
+    before=sorted_values[np.clip(pos-1, 0, len(sorted_values)-1)]
+    after=sorted_values[np.clip(pos, 0, len(sorted_values)-1)]
+    return np.where(np.abs(before-x)<=np.abs(after-x), before, after)
 
 class drum_transcriber():
     '''
@@ -15,7 +29,7 @@ class drum_transcriber():
     :attr   synced_8_3_div_clean (list):    The synced eighth triplets division line for plotting use
     :attr   synced_8_6_div_clean (list):    The synced eighth sixthlet division line for plotting use
     :attr   music21_data (dict):            note data that in format friendly to music21 processing
-    :attr   sheet (Music21 object):         The object that contained the transcribed drum sheet music  
+    :attr   sheet (Music21 object):         The object that contained the transcribed drum sheet music. Constructed on first access, music21 is only required from there
 
     :param  prediction_df (pd.DataFrame):   The dataframe that contains the predicted labels. Default output from the model
     :param  song_duration (float):          The duration of the song / drum_track in seconds
@@ -41,6 +55,9 @@ class drum_transcriber():
         fmt='musicxml.pdf'  Export he sheet music in pdf format
         fp                  file path of store location
     
+    drum_transcriber.write_musicxml(fp)
+        fp                  file path of store location. Export the sheet music in MusicXML format without music21, much faster than drum_transcriber.sheet.write
+
     drum_transcriber.sheet is basically a music21.Stream Object, please refer to the official documentation for all the available attributes and methods.
     https://web.mit.edu/music21/doc/moduleReference/moduleStreamBase.html
     '''
@@ -56,12 +73,7 @@ class drum_transcriber():
         self.get_note_duration()
 
         if note_offset==None:
-            total_8_note=[]
-            for n in range(20):
-                temp_8_div=self.get_eighth_note_time_grid(song_duration, note_offset=n)
-                temp_synced_8_div=self.sync_8(temp_8_div)
-                total_8_note.append(len(np.intersect1d(np.around(self.note_line,8), np.around(temp_synced_8_div,8))))
-            note_offset=np.argmax(total_8_note)
+            note_offset=np.argmax(self.score_note_offsets(song_duration))
         else:
             pass
         
@@ -82,7 +94,23 @@ class drum_transcriber():
         self.pitch_dict=self.get_pitch_dict()
         stream_time_map, stream_pitch, stream_note=self.build_stream()
         self.music21_data=self.get_music21_data(stream_time_map, stream_pitch, stream_note)
-        self.sheet=self.sheet_construction(self.music21_data, song_title=song_title)
+        self.song_title=song_title
+        self._sheet=None
+
+    @property
+    def sheet(self):
+        '''
+        The music21.Stream object of the sheet music, constructed from music21_data on first access
+        '''
+        if self._sheet is None:
+            self._sheet=self.sheet_construction(self.music21_data, song_title=self.song_title)
+        return self._sheet
+
+    def write_musicxml(self, fp):
+        '''
+        A function to export the sheet music in MusicXML format straight from music21_data, as a percussion staff played by a drumset
+        '''
+        return musicxml_writer.write_musicxml(self.music21_data, fp, beats=int(self.beats_in_measure/2), beat_type=self.note_value, song_title=self.song_title)
         
 
     def get_note_duration(self):
@@ -101,6 +129,51 @@ class drum_transcriber():
         first_note=librosa.samples_to_time(self.df.peak_sample.iloc[note_offset], sr=self.sample_rate)
         return np.arange(first_note, song_duration, self._8_duration)
     
+    def score_note_offsets(self, song_duration, n_offsets=20):
+        '''
+        A function to count, for each candidate note_offset, the onsets that land on the synced eighth note time grid.
+        All candidates are synced at once: this runs the same drift correction as sync_8 on every grid, one eighth note at a time,
+        finding the closest onsets of all the grids with one np.searchsorted on the sorted onsets
+        '''
+        if np.any(np.diff(self.note_line)<0):
+            #the binary search requires sorted onsets, fall back to syncing every grid on its own
+            scores=[]
+            for n in range(n_offsets):
+                temp_synced_8_div=self.sync_8(self.get_eighth_note_time_grid(song_duration, note_offset=n))
+                scores.append(len(np.intersect1d(np.around(self.note_line,8), np.around(temp_synced_8_div,8))))
+            return np.array(scores)
+
+        #one column per grid. Shorter grids are extended past the song end (np.arange computes the same values), the extra eighth notes are not counted
+        lengths=np.array([len(self.get_eighth_note_time_grid(song_duration, note_offset=n)) for n in range(n_offsets)])
+        first_notes=librosa.samples_to_time(self.df.peak_sample.iloc[:n_offsets].to_numpy(), sr=self.sample_rate)
+        _8_div=np.stack([np.arange(first_note, first_note+(lengths.max()+0.5)*self._8_duration, self._8_duration)[:lengths.max()]
+                         for first_note in first_notes], axis=1)
+
+        #the onsets before and after each searchsorted position, -inf and inf past the first and last onset
+        previous_onset=np.concatenate([[-np.inf], self.note_line])
+        next_onset=np.concatenate([self.note_line, [np.inf]])
+        synced_8_div=np.empty_like(_8_div)
+        synced_8_div[0]=_8_div[0]
+        diff_log=np.zeros(n_offsets)
+        for i in range(1, len(_8_div)):
+            note=_8_div[i]+diff_log
+            pos=np.searchsorted(self.note_line, note)
+            before=previous_onset[pos]-note
+            after=next_onset[pos]-note
+            #equidistant onsets resolve to the earlier one, like np.argmin does
+            diff=np.where(before+after>=0, before, after)
+            synced=np.abs(diff)<=self._32_duration
+            diff_log=np.where(synced, diff_log+diff, diff_log)
+            synced_8_div[i]=np.where(synced, _8_div[i]+diff_log, synced_8_div[i-1]+self._8_duration)
+
+        #count the distinct synced eighth notes of each grid that are also onsets, as np.intersect1d does
+        synced_8_div=np.around(synced_8_div,8)
+        synced_8_div[np.arange(len(synced_8_div))[:, None]>=lengths]=np.nan
+        synced_8_div=np.sort(synced_8_div, axis=0)
+        distinct=np.ones(synced_8_div.shape, dtype=bool)
+        distinct[1:]=synced_8_div[1:]!=synced_8_div[:-1]
+        return (np.isin(synced_8_div, np.around(self.note_line,8)) & distinct).sum(axis=0)
+
     def sync_8(self, _8_div):
         '''
         A function to map the eighth note time grid to the onsets
@@ -109,12 +182,23 @@ class drum_transcriber():
         synced_8_div=[_8_div[0]]
         diff_log=0
 
+        #the closest onset is found with a binary search when the onsets are sorted (they come out of onset detection in order)
+        onsets=self.note_line.tolist()
+        sorted_onsets=not np.any(np.diff(self.note_line)<0)
+
         #first, map and sync 8th notes to the onset  
-        for note in _8_div[1:]:
-            pos=np.argmin(np.abs(self.note_line-(note+diff_log)))
-            diff=self.note_line[pos]-(note+diff_log)
+        for note in _8_div[1:].tolist():
+            target=note+diff_log
+            if sorted_onsets:
+                pos=bisect.bisect_left(onsets, target)
+                #equidistant onsets resolve to the earlier one, like np.argmin does
+                if pos==len(onsets) or (pos>0 and abs(onsets[pos-1]-target)<=abs(onsets[pos]-target)):
+                    pos-=1
+            else:
+                pos=np.argmin(np.abs(self.note_line-target))
+            diff=onsets[pos]-target
 
-            if np.abs(diff) > self._32_duration:
+            if abs(diff) > self._32_duration:
                 synced_8_div.append(synced_8_div[-1]+self._8_duration)
             else:
                 diff_log=diff_log+diff
@@ -150,108 +234,105 @@ class drum_transcriber():
         note_line_r=np.round(self.note_line,8)
         synced_eighth_r=np.round(self.synced_8_div,8)
 
-        #declare a few variables to store the result
-        synced_16_div=[]
-        synced_32_div=[]
-        synced_8_3_div=[]
-        synced_8_6_div=[]
-
-        # iterate though all synced 8 notes
-        for i in range(len(synced_eighth_r) - 1):
-            #retrive the current 8th note and the next 8th note (n and n+1)
-            eighth_pair=synced_eighth_r[i:i+2]
-            sub_notes=note_line_r[(note_line_r>eighth_pair[0]) & (note_line_r<eighth_pair[1])]
-            #Check whether there is any detected onset exist between 2 consecuive eighth notes
-            if len(sub_notes)>0:
-                #if onsets are deteced between 2 consecuive eighth notes, 
-                #the below algo will match each note (based on its position in the time domain) to the closest note division (16th, 32th, eighth triplets or eighth sixthlet note)
-                dist_dict={'_16':[],'_32':[], '_8_3':[], '_8_6':[]}
-                sub_notes_dict={'_16':np.round(np.linspace(self.synced_8_div[i], self.synced_8_div[i+1], 3),8)[:-1],
-                                '_32':np.round(np.linspace(self.synced_8_div[i], self.synced_8_div[i+1], 5),8)[:-1],
-                                '_8_3':np.round(np.linspace(self.synced_8_div[i], self.synced_8_div[i+1], 4),8)[:-1],
-                                '_8_6':np.round(np.linspace(self.synced_8_div[i], self.synced_8_div[i+1], 7),8)[:-1]}
-
-                for sub_note in sub_notes:
-                    diff_16=np.min(np.abs(_16_div-sub_note))
-                    dist_dict['_16'].append(diff_16)
-                    _16closest_line=_16_div[np.argmin(np.abs(_16_div-sub_note))]
-                    sub_notes_dict['_16'] = np.where(sub_notes_dict['_16'] == np.round(_16closest_line,8), sub_note, sub_notes_dict['_16'])
-
-                    diff_32=np.min(np.abs(_32_div-sub_note))
-                    dist_dict['_32'].append(diff_32)
-                    _32closest_line=_32_div[np.argmin(np.abs(_32_div-sub_note))]
-                    sub_notes_dict['_32'] = np.where(sub_notes_dict['_32'] == np.round(_32closest_line,8), sub_note, sub_notes_dict['_32'])
-
-                    diff_8_triplet=np.min(np.abs(_8_triplet_div-sub_note))
-                    dist_dict['_8_3'].append(diff_8_triplet)
-                    _8_3closest_line=_8_triplet_div[np.argmin(np.abs(_8_triplet_div-sub_note))]
-                    sub_notes_dict['_8_3'] = np.where(sub_notes_dict['_8_3'] == np.round(_8_3closest_line,8), sub_note, sub_notes_dict['_8_3'])
-
-                    diff_8_sixlet=np.min(np.abs(_8_sixlet_div-sub_note))
-                    dist_dict['_8_6'].append(diff_8_sixlet)
-                    _8_6closest_line=_8_sixlet_div[np.argmin(np.abs(_8_sixlet_div-sub_note))]
-                    sub_notes_dict['_8_6'] = np.where(sub_notes_dict['_8_6'] == np.round(_8_6closest_line,8), sub_note, sub_notes_dict['_8_6'])
-
-
-                for key in dist_dict.keys():
-                    dist_dict[key]=sum(dist_dict[key])/len(dist_dict[key])
-                best_div=min(dist_dict, key=dist_dict.get)
-                if best_div=='_16':
-                    synced_16_div.extend(sub_notes_dict['_16'])
-                elif best_div=='_32':
-                    synced_32_div.extend(sub_notes_dict['_32'])
-                elif best_div=='_8_3':
-                    synced_8_3_div.extend(sub_notes_dict['_8_3'])
-                else:
-                    synced_8_6_div.extend(sub_notes_dict['_8_6'])
-
-            else:
-                pass
+        #bucket the onsets into the eighth note interval they lie strictly within (sync_8 returns increasing eighth notes)
+        #and group them by interval, keeping the onset order within each interval
+        interval=np.searchsorted(synced_eighth_r, note_line_r, side='right')-1
+        inside=(interval>=0) & (interval<len(synced_eighth_r)-1)
+        inside[inside]=note_line_r[inside]>synced_eighth_r[interval[inside]]
+        order=np.argsort(interval[inside], kind='stable')
+        sub_notes=note_line_r[inside][order]
+        intervals, starts, counts=np.unique(interval[inside][order], return_index=True, return_counts=True)
+        group=np.repeat(np.arange(len(intervals)), counts)
+        rank=np.arange(len(sub_notes))-starts[group]
+
+        #match each onset to the closest line of every note division, and average the distances over each interval
+        #the distances are summed one onset at a time, like a python sum, so that ties between divisions resolve the same way
+        divisions={'_16':(_16_div, 3), '_32':(_32_div, 5), '_8_3':(_8_triplet_div, 4), '_8_6':(_8_sixlet_div, 7)}
+        closest_lines={}
+        dist=np.zeros((len(intervals), len(divisions)))
+        for d, (key, (div, _)) in enumerate(divisions.items()):
+            closest_line=closest_value(div, sub_notes)
+            closest_lines[key]=np.round(closest_line,8)
+            padded_dist=np.zeros((len(intervals), counts.max(initial=0)))
+            padded_dist[group, rank]=np.abs(closest_line-sub_notes)
+            total_dist=0
+            for column in padded_dist.T:
+                total_dist=total_dist+column
+            dist[:, d]=total_dist/counts
+        best_div=np.argmin(dist, axis=1)
+
+        #each interval is written with the best division: the division line closest to an onset takes the onset timing
+        #the division of each eighth note and the timing of each of its slots are also kept in the tick index, see build_measure
+        synced_divs={}
+        self.eighth_slots=np.ones(len(self.synced_8_div), dtype=int)
+        self.slot_times={}
+        for d, (key, (div, points)) in enumerate(divisions.items()):
+            chosen=np.flatnonzero(best_div==d)
+            sub_notes_div=np.round(np.linspace(self.synced_8_div[intervals[chosen]], self.synced_8_div[intervals[chosen]+1], points, axis=1),8)[:, :-1]
+            row=np.full(len(intervals), -1)
+            row[chosen]=np.arange(len(chosen))
+            notes=np.flatnonzero(best_div[group]==d)
+            note_row=row[group[notes]]
+            #when several onsets share a closest line, the first one takes it
+            first=np.full(sub_notes_div.shape, len(sub_notes))
+            match_note, match_pos=np.nonzero(sub_notes_div[note_row]==closest_lines[key][notes][:, None])
+            np.minimum.at(first, (note_row[match_note], match_pos), notes[match_note])
+            matched=first<len(sub_notes)
+            synced_div=sub_notes_div.copy()
+            synced_div[matched]=sub_notes[first[matched]]
+            #a line that is also an onset timing can be taken again by a later onset, replay those intervals one onset at a time
+            for r in np.unique(note_row[np.isin(closest_lines[key][notes], sub_notes)]):
+                line=sub_notes_div[r]
+                for n in notes[note_row==r]:
+                    line=np.where(line==closest_lines[key][n], sub_notes[n], line)
+                synced_div[r]=line
+            synced_divs[key]=synced_div.ravel()
+
+            slots=points-1
+            self.eighth_slots[intervals[chosen]]=slots
+            ticks=intervals[chosen][:, None]*TICKS_PER_EIGHTH+np.arange(slots)*(TICKS_PER_EIGHTH//slots)
+            self.slot_times.update(zip(ticks.ravel().tolist(), synced_divs[key].tolist()))
 
         #If there is any notes living in between 2 consecutive 8th notes, the first 8th note is not an 8th note anymore.
-        # Bleow for loop will remove those notes from the synced_8_div variable
-        synced_8_div_clean=self.synced_8_div.copy()
-        for div in [synced_16_div, synced_32_div, synced_8_3_div, synced_8_6_div]:
-            synced_8_div_clean=synced_8_div_clean[~np.in1d(np.around(synced_8_div_clean,8), np.around(div, 8))]
-        return synced_8_div_clean, np.array(synced_16_div), np.array(synced_32_div), np.array(synced_8_3_div), np.array(synced_8_6_div)
+        #Below removes those notes from the synced_8_div variable
+        all_divs=np.around(np.concatenate(list(synced_divs.values())),8)
+        synced_8_div_clean=self.synced_8_div[~np.isin(np.around(self.synced_8_div,8), all_divs)]
+        return synced_8_div_clean, synced_divs['_16'], synced_divs['_32'], synced_divs['_8_3'], synced_divs['_8_6']
     
-    def build_measure(self, measure_iter):
+    def build_measure(self, eighths):
         """
-        A function to clean up note quantization result information in a format that can pass to the build_stream step to build all the required data for sheet music construction step 
+        A function to clean up note quantization result information in a format that can pass to the build_stream step to build all the required data for sheet music construction step.
+        Each synced eighth note (by index) is split into the slots of its note division, returned as ticks along with their note duration
         """
-        synced_16_div=np.around(self.synced_16_div,8)
-        synced_32_div=np.around(self.synced_32_div,8)
-        synced_8_3_div=np.around(self.synced_8_3_div,8)
-        synced_8_6_div=np.around(self.synced_8_6_div,8)
         measure=[]
         note_dur=[]
-        for note in measure_iter:
-            _div=False
-            for div in [(synced_16_div,2,0.25), (synced_32_div,4,0.125), (synced_8_3_div,3,1/6), (synced_8_6_div,6,1/12)]:
-                if note in div[0]:
-                    pos=np.where(div[0] == note)
-                    pos=pos[0][0]
-                    measure.append(list(div[0][pos:pos+div[1]]))
-                    note_dur.append([div[2]]*div[1])
-                    _div=True
-            if _div==False:
-                measure.append([note])
-                note_dur.append([0.5])
-
-        measure=[item for sublist in measure for item in sublist]
-        note_dur=[item for sublist in note_dur for item in sublist]
+        for eighth in eighths:
+            slots=int(self.eighth_slots[eighth])
+            slot_ticks=TICKS_PER_EIGHTH//slots
+            measure.extend(range(eighth*TICKS_PER_EIGHTH, (eighth+1)*TICKS_PER_EIGHTH, slot_ticks))
+            note_dur.extend([slot_ticks/(2*TICKS_PER_EIGHTH)]*slots)
         return measure, note_dur
 
     def get_pitch_dict(self):
         """
-        A function to reformat the prediction result in a format that can pass to the build_stream step to build all the required data for sheet music construction step
+        A function to reformat the prediction result in a format that can pass to the build_stream step to build all the required data for sheet music construction step.
+        Maps the tick of every note played on an onset to the predicted labels of that onset
         """
-        pitch_mapping=self.df[['peak_sample','SD','HH', 'KD', 'RC', 'TT', 'CC']].set_index('peak_sample')
-        pitch_mapping=pitch_mapping.to_dict(orient='index')
-        pitch_dict={}
-        for p in pitch_mapping.keys():
-            pitch_dict[round(librosa.samples_to_time(p, sr=self.sample_rate),8)]=[d for d in pitch_mapping[p].keys() if pitch_mapping[p][d]==1]
-        return pitch_dict
+        labels=self.df[['SD','HH', 'KD', 'RC', 'TT', 'CC']]
+        onset_labels=[[d for d, hit in zip(labels.columns, row) if hit==1] for row in labels.to_numpy()]
+
+        #timing of every tick: synced eighth notes, overridden by the note division slots (an onset may have taken the slot)
+        slot_times={tick*TICKS_PER_EIGHTH: t for tick, t in enumerate(np.round(self.synced_8_div,8).tolist())}
+        slot_times.update(self.slot_times)
+        ticks=np.array(list(slot_times.keys()), dtype=int)
+        times=np.array(list(slot_times.values()))
+
+        #match the tick timings to the onset timings at once
+        note_line_r=np.round(self.note_line,8)
+        sorter=np.argsort(note_line_r, kind='stable')
+        pos=sorter[np.clip(np.searchsorted(note_line_r, times, sorter=sorter), 0, len(note_line_r)-1)]
+        on_onset=note_line_r[pos]==times
+        return {tick: onset_labels[onset] for tick, onset in zip(ticks[on_onset].tolist(), pos[on_onset].tolist())}
 
     def build_stream(self):
         """
@@ -261,17 +342,17 @@ class drum_transcriber():
         stream_time_map=[]
         stream_pitch=[]
         stream_note=[]
-        synced_8_div=np.around(self.synced_8_div,8)
-        for i in range(len(synced_8_div) //self.beats_in_measure):
+        eighths=np.arange(len(self.synced_8_div))
+        for i in range(len(eighths) //self.beats_in_measure):
 
-            measure_iter=list(synced_8_div[measure_log: measure_log + self.beats_in_measure])
+            measure_iter=eighths[measure_log: measure_log + self.beats_in_measure]
             measure, note_dur=self.build_measure(measure_iter)
             stream_time_map.append(measure)
             stream_note.append(note_dur)
             measure_log=measure_log+self.beats_in_measure
 
-        remaining_8=len(synced_8_div)%self.beats_in_measure
-        measure, note_dur=self.build_measure(synced_8_div[-remaining_8:])
+        remaining_8=len(eighths)%self.beats_in_measure
+        measure, note_dur=self.build_measure(eighths[-remaining_8:])
         measure.extend([-1]*(self.beats_in_measure-remaining_8))
         note_dur.extend([8]*(self.beats_in_measure-remaining_8))
 
@@ -280,12 +361,9 @@ class drum_transcriber():
 
         for measure in stream_time_map:
             pitch_set=[]
-            for note in measure:
-                if note in self.pitch_dict.keys():
-                    if len(self.pitch_dict[note])==0:
-                        pitch_set.append(['rest'])
-                    else:    
-                        pitch_set.append(self.pitch_dict[note])
+            for tick in measure:
+                if self.pitch_dict.get(tick):
+                    pitch_set.append(self.pitch_dict[tick])
                 else:
                     pitch_set.append(['rest'])
             stream_pitch.append(pitch_set)
@@ -304,6 +382,7 @@ class drum_transcriber():
         """
         A function to set the duration of the music21.Note object based on its note duration information
         """
+        from music21 import duration
         if pred_note[0]==1/6:
             t = duration.Tuplet(3, 1, 'eighth')
             n.duration.type='eighth'
@@ -321,6 +400,7 @@ class drum_transcriber():
         """
         A master script construct the music21.Stream object where contains the sheet music file for final output 
         """
+        from music21 import clef, instrument, meter, metadata, note, percussion, stream
         label_pitch_map={'KD':'F4', 'SD':'C5', 'SD_xstick':'C5', 'HH_close':'G5', 'HH_open':'G5', 'RC':'G5', 'CC':'A5', 'HT':'E5',
                         'MT':'D5', 'FT':'A4', 'HH':'G5', 'TT':'E5'}
         
@@ -332,6 +412,13 @@ class drum_transcriber():
         else:
             s.metadata.title = song_title
         s.metadata.composer = 'Generated by GrooveSheet'
+        #percussion staff played by a drumset on MIDI channel 10, so that notation softwares (MuseScore) display it as drums
+        s.insert(0, clef.PercussionClef())
+        drumset=instrument.Instrument()
+        drumset.instrumentName='Drumset'
+        drumset.midiProgram=0
+        drumset.midiChannel=9
+        s.insert(0, drumset)
         for _measure in music21_data:
             for pred_note in _measure:
                 if pred_note[1][0]=='rest':
@@ -112,7 +112,7 @@ def main():
         out_path=sheet_music.sheet.write(fmt='musicxml.pdf', fp=os.path.join(args.outpath, args.outputfile_name))
         print(f'Sheet music saved at {out_path}')
     else:
-        out_path= sheet_music.sheet.write(fp=os.path.join(args.outpath, args.outputfile_name))
+        out_path=sheet_music.write_musicxml(os.path.join(args.outpath, args.outputfile_name))
         print(f'Sheet music saved at {out_path}')
     if args.link!=None:
         os.remove(f_path)
@@ -20,6 +20,8 @@ Examples
 See the end of this module (if __name__ == "__main__")
 """
 
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 import subprocess
 
 import torch as th
@@ -27,7 +29,7 @@ import torchaudio as ta
 
 from dora.log import fatal
 from pathlib import Path
-from typing import Optional, Callable, Dict, Tuple, Union
+from typing import Optional, Callable, Deque, Dict, Iterable, Iterator, Set, Tuple, Union
 
 from .apply import apply_model, _replace_dict
 from .audio import AudioFile, convert_audio, save_audio
@@ -110,9 +112,12 @@ class Separator:
         - `shift_idx`: The index of shifts. Starts from 0.
         - `segment_offset`: The offset of current segment. If the number is 441000, it doesn't
             mean that it is at the 441000 second of the audio, but the "frame" of the tensor.
-        - `state`: Could be `"start"` or `"end"`.
+        - `state`: Could be `"start"` or `"end"`, or `"skip"` for segments gated out by
+            `silence_threshold`.
         - `audio_length`: Length of the audio (in "frame" of the tensor).
         - `models`: Count of submodels in the model.
+        When `apply_model` runs with `pipeline_depth`, `"end"` callbacks also carry a
+        `pipeline` dict with the stage queue depths and timings, see `SegmentPipeline`.
         """
         self._name = model
         self._repo = repo
@@ -177,9 +182,12 @@ class Separator:
         - `shift_idx`: The index of shifts. Starts from 0.
         - `segment_offset`: The offset of current segment. If the number is 441000, it doesn't
             mean that it is at the 441000 second of the audio, but the "frame" of the tensor.
-        - `state`: Could be `"start"` or `"end"`.
+        - `state`: Could be `"start"` or `"end"`, or `"skip"` for segments gated out by
+            `silence_threshold`.
         - `audio_length`: Length of the audio (in "frame" of the tensor).
         - `models`: Count of submodels in the model.
+        When `apply_model` runs with `pipeline_depth`, `"end"` callbacks also carry a
+        `pipeline` dict with the stage queue depths and timings, see `SegmentPipeline`.
         """
         if not isinstance(device, _NotProvided):
             self._device = device
@@ -306,6 +314,108 @@ class Separator:
         """
         return self.separate_tensor(self._load_audio(file), self.samplerate)
 
+    def separate_many(
+        self,
+        files: Iterable[Path],
+        save: Optional[Callable[[Path, th.Tensor, Dict[str, th.Tensor]], None]] = None,
+        io_workers: int = 2,
+        prefetch: int = 2,
+        memory_budget: int = 2**30,
+        on_error: Optional[Callable[[Path, Exception], None]] = None,
+    ) -> Iterator[Tuple[Path, th.Tensor, Dict[str, th.Tensor]]]:
+        """
+        Separate several audio files with the resident model, overlapping the decoding of the
+        upcoming files and the encoding of the previous ones with the current separation.
+
+        Parameters
+        ----------
+        files: Paths of the files to be separated.
+        save: Optional function called as `save(file, wav, stems)` on a background thread once \
+            a file is separated, e.g. to encode the stems with `save_audio`.
+        io_workers: Number of threads used for decoding, and as many for `save`.
+        prefetch: Maximum number of files decoded ahead of the one being separated.
+        memory_budget: Maximum size in bytes of decoded audio waiting to be separated, \
+            counting the files being decoded as large as the largest one decoded so far. \
+            At least one file is always decoded ahead, whatever its size.
+        on_error: Optional function called as `on_error(file, error)` when loading, separating \
+            or saving a file fails, the file is then skipped.
+
+        Returns
+        -------
+        An iterator over `(file, wav, stems)` tuples in completion order, i.e. once `save` \
+        has returned if given, with the same `wav` and `stems` as `separate_audio_file`. \
+        Without `on_error`, errors raised when loading a file or from `save` are raised \
+        by the iterator.
+        """
+        files = iter(files)
+        decoding: Deque[Tuple[Path, Future]] = deque()
+        saving: Set[Future] = set()
+        largest_nbytes = 0
+
+        def _buffered_bytes():
+            # Decodes in progress count as large as the largest file decoded so far, and take
+            # the whole budget until the first one is done.
+            nonlocal largest_nbytes
+            decoded = [future.result().nbytes for _, future in decoding
+                       if future.done() and future.exception() is None]
+            largest_nbytes = max([largest_nbytes] + decoded)
+            in_progress = sum(not future.done() for _, future in decoding)
+            return sum(decoded) + in_progress * (largest_nbytes or memory_budget)
+
+        def _prefetch():
+            while len(decoding) < prefetch and (not decoding or _buffered_bytes() < memory_budget):
+                file = next(files, None)
+                if file is None:
+                    return
+                decoding.append((file, decode_pool.submit(self._load_audio, file)))
+
+        def _save(file, wav, stems):
+            if save is not None:
+                try:
+                    save(file, wav, stems)
+                except Exception as error:
+                    if on_error is None:
+                        raise
+                    return file, error, None
+            return file, wav, stems
+
+        def _saved(futures):
+            for future in futures:
+                file, wav, stems = future.result()
+                if isinstance(wav, Exception):
+                    on_error(file, wav)  # type: ignore
+                else:
+                    yield file, wav, stems
+
+        decode_pool = ThreadPoolExecutor(io_workers)
+        save_pool = ThreadPoolExecutor(io_workers)
+        try:
+            _prefetch()
+            while decoding:
+                file, future = decoding.popleft()
+                try:
+                    wav = future.result()
+                    largest_nbytes = max(largest_nbytes, wav.nbytes)
+                    _prefetch()
+                    wav, stems = self.separate_tensor(wav, self.samplerate)
+                except Exception as error:
+                    if on_error is None:
+                        raise
+                    on_error(file, error)
+                    _prefetch()
+                    continue
+                saving.add(save_pool.submit(_save, file, wav, stems))
+                # Outputs waiting to be saved are bounded as well.
+                done, saving = wait(saving, timeout=0 if len(saving) <= io_workers else None,
+                                    return_when=FIRST_COMPLETED)
+                yield from _saved(done)
+            yield from _saved(as_completed(saving))
+        finally:
+            for _, future in decoding:
+                future.cancel()
+            decode_pool.shutdown()
+            save_pool.shutdown()
+
     @property
     def samplerate(self):
         return self._samplerate
@@ -9,8 +9,10 @@ inteprolation between chunks, as well as the "shift trick".
 """
 from concurrent.futures import ThreadPoolExecutor
 import copy
+import queue
 import random
-from threading import Lock
+from threading import Event, Lock, Thread, local
+import time
 import typing as tp
 
 import torch as th
@@ -25,6 +27,19 @@ from .utils import center_trim, DummyPoolExecutor
 
 Model = tp.Union[Demucs, HDemucs, HTDemucs]
 
+# Per thread reusable buffers for `TensorChunk.padded_view`, one per (shape, dtype, device).
+_pad_buffers = local()
+
+
+def _pad_buffer(shape: tp.List[int], dtype: th.dtype, device: th.device) -> th.Tensor:
+    buffers = getattr(_pad_buffers, 'buffers', None)
+    if buffers is None:
+        buffers = _pad_buffers.buffers = {}
+    key = (tuple(shape), dtype, device)
+    if key not in buffers:
+        buffers[key] = th.empty(shape, dtype=dtype, device=device)
+    return buffers[key]
+
 
 class BagOfModels(nn.Module):
     def __init__(self, models: tp.List[Model],
@@ -123,6 +138,40 @@ class TensorChunk:
         assert out.shape[-1] == target_length
         return out
 
+    def padded_view(self, target_length, reuse=True):
+        """
+        Same as `padded`, but without allocating: when no padding is needed,
+        this returns a view of the underlying tensor, otherwise the padded chunk
+        is written into a buffer reused by the following calls from the same thread.
+        The output must thus be consumed before the next call and never modified inplace.
+        If `reuse` is False, edge chunks are padded into a fresh tensor instead,
+        e.g. when the output is handed over to another thread.
+        """
+        delta = target_length - self.length
+        total_length = self.tensor.shape[-1]
+        assert delta >= 0
+
+        start = self.offset - delta // 2
+        end = start + target_length
+        if start >= 0 and end <= total_length:
+            return self.tensor[..., start:end]
+
+        if not reuse:
+            return self.padded(target_length)
+
+        correct_start = max(0, start)
+        correct_end = min(total_length, end)
+        pad_left = correct_start - start
+        pad_right = end - correct_end
+
+        shape = list(self.tensor.shape)
+        shape[-1] = target_length
+        out = _pad_buffer(shape, self.tensor.dtype, self.tensor.device)
+        out[..., :pad_left] = 0
+        out[..., pad_left:target_length - pad_right] = self.tensor[..., correct_start:correct_end]
+        out[..., target_length - pad_right:] = 0
+        return out
+
 
 def tensor_chunk(tensor_or_chunk):
     if isinstance(tensor_or_chunk, TensorChunk):
@@ -132,6 +181,147 @@ def tensor_chunk(tensor_or_chunk):
         return TensorChunk(tensor_or_chunk)
 
 
+def _valid_length(model: Model, length: int, segment: tp.Optional[float]) -> int:
+    if isinstance(model, HTDemucs) and segment is not None:
+        return int(segment * model.samplerate)
+    elif hasattr(model, 'valid_length'):
+        return model.valid_length(length)  # type: ignore
+    else:
+        return length
+
+
+class SegmentPipeline:
+    """
+    Three stage pipeline used by `apply_model` when `pipeline_depth > 0`:
+    a preparation thread extracts and pads the segments, `num_workers` threads run
+    the model forward, and the caller's thread overlap-adds the outputs as they come.
+    Stages are connected with queues holding at most `depth` segments, so that at most
+    `2 * depth + num_workers` segments are in flight at any time.
+
+    Each `"end"` callback additionally carries a `pipeline` dict with the current queue
+    depths (`prepared`, `computed`) and the time spent so far in each stage
+    (`prepare_time`, `forward_time`, `accumulate_time`, in seconds, summed over threads).
+    """
+    _DONE = object()
+    # Seconds between checks of the stop flag by blocked stages, and maximum wait for each
+    # thread once stopped: a worker still in a model forward is left to finish on its own,
+    # its output being dropped.
+    _POLL_INTERVAL = 0.1
+    _JOIN_TIMEOUT = 1.
+
+    def __init__(self, model: Model, device, segment: tp.Optional[float],
+                 num_workers: int = 1, depth: int = 2, lock=None,
+                 callback: tp.Optional[tp.Callable[[dict], None]] = None,
+                 callback_arg: tp.Optional[dict] = None):
+        self.model = model
+        self.device = device
+        self.segment = segment
+        self.num_workers = max(1, num_workers)
+        self.lock = lock or Lock()
+        self.callback = callback
+        self.callback_arg = callback_arg or {}
+        self.prepared: queue.Queue = queue.Queue(depth)
+        self.computed: queue.Queue = queue.Queue(depth)
+        self.timings = {"prepare_time": 0., "forward_time": 0., "accumulate_time": 0.}
+        self._stop = Event()
+
+    def stats(self) -> dict:
+        return dict(self.timings, prepared=self.prepared.qsize(), computed=self.computed.qsize())
+
+    def _put(self, target: queue.Queue, item):
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=self._POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, source: queue.Queue):
+        # Once stopped, `_put` drops items, `_DONE` included: never wait for them then.
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=self._POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return self._DONE
+
+    def _notify(self, offset: int, state: str):
+        with self.lock:
+            if self.callback is not None:
+                subs = [("segment_offset", offset), ("state", state)]
+                if state == "end":
+                    subs.append(("pipeline", self.stats()))
+                self.callback(_replace_dict(self.callback_arg, *subs))
+
+    def _prepare(self, mix: TensorChunk, offsets: tp.Sequence[int], segment_length: int):
+        try:
+            for offset in offsets:
+                if self._stop.is_set():
+                    return
+                begin = time.perf_counter()
+                chunk = TensorChunk(mix, offset, segment_length)
+                valid_length = _valid_length(self.model, chunk.length, self.segment)
+                padded = chunk.padded_view(valid_length, reuse=False).to(self.device)
+                with self.lock:
+                    self.timings["prepare_time"] += time.perf_counter() - begin
+                self._put(self.prepared, (offset, chunk.length, padded))
+        except BaseException as error:
+            self._put(self.computed, error)
+        finally:
+            for _ in range(self.num_workers):
+                self._put(self.prepared, self._DONE)
+
+    def _forward(self):
+        try:
+            while not self._stop.is_set():
+                item = self._get(self.prepared)
+                if item is self._DONE:
+                    break
+                offset, length, padded = item
+                self._notify(offset, "start")
+                begin = time.perf_counter()
+                with th.no_grad():
+                    chunk_out = center_trim(self.model(padded), length)
+                with self.lock:
+                    self.timings["forward_time"] += time.perf_counter() - begin
+                self._put(self.computed, (offset, chunk_out))
+                self._notify(offset, "end")
+        except BaseException as error:
+            self._put(self.computed, error)
+        finally:
+            self._put(self.computed, self._DONE)
+
+    def run(self, mix: TensorChunk, offsets: tp.Sequence[int], segment_length: int,
+            accumulate: tp.Callable[[int, th.Tensor], None],
+            progress_bar: tp.Optional[tp.Any] = None):
+        """Process the segments at `offsets`, calling `accumulate(offset, chunk_out)`
+        from the caller's thread for each of them, in completion order."""
+        threads = [Thread(target=self._prepare, args=(mix, offsets, segment_length), daemon=True)]
+        threads += [Thread(target=self._forward, daemon=True) for _ in range(self.num_workers)]
+        for thread in threads:
+            thread.start()
+        running = self.num_workers
+        try:
+            while running:
+                item = self.computed.get()
+                if item is self._DONE:
+                    running -= 1
+                    continue
+                if isinstance(item, BaseException):
+                    raise item
+                offset, chunk_out = item
+                begin = time.perf_counter()
+                accumulate(offset, chunk_out)
+                with self.lock:
+                    self.timings["accumulate_time"] += time.perf_counter() - begin
+                if progress_bar is not None:
+                    progress_bar.update(1)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join(self._JOIN_TIMEOUT)
+
+
 def _replace_dict(_dict: tp.Optional[dict], *subs: tp.Tuple[tp.Hashable, tp.Any]) -> dict:
     if _dict is None:
         _dict = {}
@@ -142,6 +332,40 @@ def _replace_dict(_dict: tp.Optional[dict], *subs: tp.Tuple[tp.Hashable, tp.Any]
     return _dict
 
 
+def segment_activity(mix: th.Tensor, offsets: tp.Sequence[int], segment_length: int,
+                     n_fft: int = 2048) -> tp.Tuple[th.Tensor, th.Tensor]:
+    """
+    Cheap per segment statistics used to gate `apply_model`.
+    Returns the RMS and the mean positive spectral flux of each segment of the mono
+    downmix of `mix`, both in dB relative to the same statistics over the whole mix.
+    A segment is given by its offset in `offsets` and spans `segment_length` samples.
+    """
+    mono = mix.reshape(-1, mix.shape[-1]).mean(0).float()
+    length = mono.shape[-1]
+    starts = th.tensor(list(offsets), dtype=th.long)
+    ends = (starts + segment_length).clamp(max=length)
+
+    energy = F.pad(th.cumsum(mono.double().square(), 0), (1, 0))
+    rms = ((energy[ends] - energy[starts]) / (ends - starts)).sqrt()
+    ref_rms = (energy[-1] / length).sqrt()
+    rms_db = 20 * th.log10((rms + 1e-8) / (ref_rms + 1e-8))
+
+    if length <= n_fft:
+        # Too short for a meaningful spectrogram, only rely on the energy.
+        return rms_db.float(), rms_db.float()
+    hop_length = n_fft // 4
+    spec = th.stft(mono, n_fft, hop_length, window=th.hann_window(n_fft, device=mono.device),
+                   center=True, return_complex=True).abs()
+    flux = F.relu(spec[:, 1:] - spec[:, :-1]).sum(0)
+    frames = F.pad(th.cumsum(flux.double(), 0), (1, 0))
+    first = (starts // hop_length).clamp(max=len(flux) - 1)
+    last = th.maximum((ends // hop_length).clamp(max=len(flux)), first + 1)
+    seg_flux = (frames[last] - frames[first]) / (last - first)
+    ref_flux = frames[-1] / len(flux)
+    flux_db = 20 * th.log10((seg_flux + 1e-8) / (ref_flux + 1e-8))
+    return rms_db.float(), flux_db.float()
+
+
 def apply_model(model: tp.Union[BagOfModels, Model],
                 mix: tp.Union[th.Tensor, TensorChunk],
                 shifts: int = 1, split: bool = True,
@@ -150,7 +374,9 @@ def apply_model(model: tp.Union[BagOfModels, Model],
                 num_workers: int = 0, segment: tp.Optional[float] = None,
                 pool=None, lock=None,
                 callback: tp.Optional[tp.Callable[[dict], None]] = None,
-                callback_arg: tp.Optional[dict] = None) -> th.Tensor:
+                callback_arg: tp.Optional[dict] = None,
+                silence_threshold: tp.Optional[float] = None,
+                pipeline_depth: int = 0) -> th.Tensor:
     """
     Apply model to a given mixture.
 
@@ -170,6 +396,16 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         num_workers (int): if non zero, device is 'cpu', how many threads to
             use in parallel.
         segment (float or None): override the model segment parameter.
+        silence_threshold (float or None): if provided (in dB, relative to the whole mix),
+            segments whose RMS and spectral flux are both below this threshold are not
+            passed through the model, and contribute silence to the output instead
+            (requires split=True). Each skipped segment is reported to `callback`
+            with `state` set to `"skip"`.
+        pipeline_depth (int): if non zero (and split=True), segments go through a
+            `SegmentPipeline` instead of `pool`: preparation, model forward on
+            `max(1, num_workers)` threads and overlap-add run concurrently, with at most
+            `pipeline_depth` segments queued between stages. Queue depths and stage timings
+            are reported in the `pipeline` entry of the `"end"` callbacks.
     """
     if device is None:
         device = mix.device
@@ -195,6 +431,8 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         'pool': pool,
         'segment': segment,
         'lock': lock,
+        'silence_threshold': silence_threshold,
+        'pipeline_depth': pipeline_depth,
     }
     out: tp.Union[float, th.Tensor]
     res: tp.Union[float, th.Tensor]
@@ -274,8 +512,53 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         # If the overlap < 50%, this will translate to linear transition when
         # transition_power is 1.
         weight = (weight / weight.max())**transition_power
+        mix = tensor_chunk(mix)
+        assert isinstance(mix, TensorChunk)
+        active = [True] * len(offsets)
+        if silence_threshold is not None:
+            rms_db, flux_db = segment_activity(
+                mix.tensor[..., mix.offset:mix.offset + mix.length], offsets, segment_length)
+            active = ((rms_db >= silence_threshold) | (flux_db >= silence_threshold)).tolist()
+        for offset, is_active in zip(offsets, active):
+            if not is_active:
+                with lock:
+                    if callback is not None:
+                        callback(_replace_dict(  # type: ignore
+                            callback_arg, ("segment_offset", offset), ("state", "skip")))
+                # Skipped segment: the model output is assumed to be silent, but the
+                # overlap-add weights still need to account for it.
+                chunk_length = min(segment_length, length - offset)
+                sum_weight[offset:offset + segment_length] += weight[:chunk_length].to(mix.device)
+
+        if pipeline_depth > 0:
+            def _accumulate(offset: int, chunk_out: th.Tensor):
+                chunk_length = chunk_out.shape[-1]
+                out[..., offset:offset + segment_length] += (
+                    weight[:chunk_length] * chunk_out).to(mix.device)
+                sum_weight[offset:offset + segment_length] += weight[:chunk_length].to(mix.device)
+
+            active_offsets = [offset for offset, is_active in zip(offsets, active) if is_active]
+            segment_pipeline = SegmentPipeline(
+                model, device, kwargs['segment'], num_workers=num_workers, depth=pipeline_depth,
+                lock=lock, callback=callback, callback_arg=callback_arg)
+            progress_bar = None
+            if progress:
+                progress_bar = tqdm.tqdm(total=len(active_offsets), unit_scale=scale,
+                                         ncols=120, unit='seconds')
+            try:
+                segment_pipeline.run(mix, active_offsets, segment_length, _accumulate,
+                                     progress_bar=progress_bar)
+            finally:
+                if progress_bar is not None:
+                    progress_bar.close()
+            assert sum_weight.min() > 0
+            out /= sum_weight
+            return out
+
         futures = []
-        for offset in offsets:
+        for offset, is_active in zip(offsets, active):
+            if not is_active:
+                continue
             chunk = TensorChunk(mix, offset, segment_length)
             future = pool.submit(apply_model, model, chunk, **kwargs, callback_arg=callback_arg,
                                  callback=(lambda d, i=offset:
@@ -300,16 +583,10 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         assert isinstance(out, th.Tensor)
         return out
     else:
-        valid_length: int
-        if isinstance(model, HTDemucs) and segment is not None:
-            valid_length = int(segment * model.samplerate)
-        elif hasattr(model, 'valid_length'):
-            valid_length = model.valid_length(length)  # type: ignore
-        else:
-            valid_length = length
+        valid_length = _valid_length(model, length, segment)
         mix = tensor_chunk(mix)
         assert isinstance(mix, TensorChunk)
-        padded_mix = mix.padded(valid_length).to(device)
+        padded_mix = mix.padded_view(valid_length).to(device)
         with lock:
             if callback is not None:
                 callback(_replace_dict(callback_arg, ("state", "start")))  # type: ignore
@@ -7,11 +7,8 @@ import json
 import subprocess as sp
 from pathlib import Path
 
-import lameenc
-import julius
 import numpy as np
 import torch
-import torchaudio as ta
 import typing as tp
 
 from .utils import temp_filenames
@@ -168,6 +165,8 @@ def convert_audio_channels(wav, channels=2):
 
 def convert_audio(wav, from_samplerate, to_samplerate, channels) -> torch.Tensor:
     """Convert audio from a given samplerate to a target one and target number of channels."""
+    import julius
+
     wav = convert_audio_channels(wav, channels)
     return julius.resample_frac(wav, from_samplerate, to_samplerate)
 
@@ -198,6 +197,8 @@ def as_dtype_pcm(wav, dtype):
 
 def encode_mp3(wav, path, samplerate=44100, bitrate=320, quality=2, verbose=False):
     """Save given audio as mp3. This should work on all OSes."""
+    import lameenc
+
     C, T = wav.shape
     wav = i16_pcm(wav)
     encoder = lameenc.Encoder()
@@ -252,6 +253,7 @@ def save_audio(wav: torch.Tensor,
     if suffix == ".mp3":
         encode_mp3(wav, path, samplerate, bitrate, preset, verbose=True)
     elif suffix == ".wav":
+        import torchaudio as ta
         if as_float:
             bits_per_sample = 32
             encoding = 'PCM_F'
@@ -260,6 +262,7 @@ def save_audio(wav: torch.Tensor,
         ta.save(str(path), wav, sample_rate=samplerate,
                 encoding=encoding, bits_per_sample=bits_per_sample)
     elif suffix == ".flac":
+        import torchaudio as ta
         ta.save(str(path), wav, sample_rate=samplerate, bits_per_sample=bits_per_sample)
     else:
         raise ValueError(f"Invalid suffix for path: {suffix}")
@@ -7,7 +7,6 @@
 import math
 import typing as tp
 
-import julius
 import torch
 from torch import nn
 from torch.nn import functional as F
@@ -203,8 +202,9 @@ class LocalState(nn.Module):
             decay_kernel = - decays.view(-1, 1, 1) * delta.abs() / self.ndecay**0.5
             dots += torch.einsum("fts,bhfs->bhts", decay_kernel, decay_q)
 
-        # Kill self reference.
-        dots.masked_fill_(torch.eye(T, device=dots.device, dtype=torch.bool), -100)
+        # Kill self reference. Same mask as `torch.eye(T, dtype=torch.bool)`, whose
+        # ONNX export (EyeLike on booleans) onnxruntime cannot run.
+        dots.masked_fill_(delta == 0, -100)
         weights = torch.softmax(dots, dim=2)
 
         content = self.content(x).view(B, heads, -1, T)
@@ -413,6 +413,7 @@ class Demucs(nn.Module):
         x = F.pad(x, (delta // 2, delta - delta // 2))
 
         if self.resample:
+            import julius
             x = julius.resample_frac(x, 1, 2)
 
         saved = []
@@ -14,8 +14,6 @@ import logging
 
 from dora.log import LogProgress
 import numpy as np
-import musdb
-import museval
 import torch as th
 
 from .apply import apply_model
@@ -34,13 +32,23 @@ def new_sdr(references, estimates):
     """
     assert references.dim() == 4
     assert estimates.dim() == 4
-    delta = 1e-7  # avoid numerical errors
+    return sdr_from_energies(*sdr_energies(references, estimates))
+
+
+def sdr_energies(references, estimates):
+    """
+    Energies of the references and of the errors summed over channels and time,
+    i.e. the terms of `new_sdr`. Those can be stacked for tracks of different lengths
+    and turned into SDRs in a single batch with `sdr_from_energies`.
+    """
     num = th.sum(th.square(references), dim=(2, 3))
     den = th.sum(th.square(references - estimates), dim=(2, 3))
-    num += delta
-    den += delta
-    scores = 10 * th.log10(num / den)
-    return scores
+    return num, den
+
+
+def sdr_from_energies(num, den):
+    delta = 1e-7  # avoid numerical errors
+    return 10 * th.log10((num + delta) / (den + delta))
 
 
 def eval_track(references, estimates, win, hop, compute_sdr=True):
@@ -52,6 +60,7 @@ def eval_track(references, estimates, win, hop, compute_sdr=True):
     if not compute_sdr:
         return None, new_scores
     else:
+        import museval
         references = references.numpy()
         estimates = estimates.numpy()
         scores = museval.metrics.bss_eval(
@@ -70,6 +79,7 @@ def evaluate(solver, compute_sdr=False):
     compute_sdr=False means using only the MDX definition of the SDR, which
     is much faster to evaluate.
     """
+    import musdb
 
     args = solver.args
 
@@ -10,7 +10,6 @@ from copy import deepcopy
 import math
 import typing as tp
 
-from openunmix.filtering import wiener
 import torch
 from torch import nn
 from torch.nn import functional as F
@@ -660,6 +659,8 @@ class HDemucs(nn.Module):
 
     def _wiener(self, mag_out, mix_stft, niters):
         # apply wiener filtering from OpenUnmix.
+        from openunmix.filtering import wiener
+
         init = mix_stft.dtype
         wiener_win_len = 300
         residual = self.wiener_residual
@@ -686,12 +687,43 @@ class HDemucs(nn.Module):
         assert list(out.shape) == [B, S, C, Fq, T]
         return out.to(init)
 
-    def forward(self, mix):
-        x = mix
-        length = x.shape[-1]
+    def forward(self, mix, core=None):
+        """
+        `core` optionally replaces `_core`, the network between the spectrogram
+        of `mix` and the masking, e.g. to run its ONNX export (see `demucs.onnx_model`).
+        """
+        length = mix.shape[-1]
 
         z = self._spec(mix)
         mag = self._magnitude(z).to(mix.device)
+        x, xt = (core or self._core)(mix, mag)
+
+        # to cpu as mps doesnt support complex numbers
+        # demucs issue #435 ##432
+        # NOTE: in this case z already is on cpu
+        # TODO: remove this when mps supports complex numbers
+        x_is_mps = x.device.type == "mps"
+        if x_is_mps:
+            x = x.cpu()
+
+        zout = self._mask(z, x)
+        x = self._ispec(zout, length)
+
+        # back to mps device
+        if x_is_mps:
+            x = x.to('mps')
+
+        if self.hybrid:
+            x = xt + x
+        return x
+
+    def _core(self, mix, mag):
+        """
+        Network from the waveform `mix` and its spectrogram magnitude `mag`
+        (or complex as channels) to the source spectrograms and, if hybrid,
+        the source waveforms of the time branch.
+        """
+        length = mix.shape[-1]
         x = mag
 
         B, C, Fq, T = x.shape
@@ -772,23 +804,8 @@ class HDemucs(nn.Module):
         x = x.view(B, S, -1, Fq, T)
         x = x * std[:, None] + mean[:, None]
 
-        # to cpu as mps doesnt support complex numbers
-        # demucs issue #435 ##432
-        # NOTE: in this case z already is on cpu
-        # TODO: remove this when mps supports complex numbers
-        x_is_mps = x.device.type == "mps"
-        if x_is_mps:
-            x = x.cpu()
-
-        zout = self._mask(z, x)
-        x = self._ispec(zout, length)
-
-        # back to mps device
-        if x_is_mps:
-            x = x.to('mps')
-
-        if self.hybrid:
-            xt = xt.view(B, S, -1, length)
-            xt = xt * stdt[:, None] + meant[:, None]
-            x = xt + x
-        return x
+        if not self.hybrid:
+            return x, None
+        xt = xt.view(B, S, -1, length)
+        xt = xt * stdt[:, None] + meant[:, None]
+        return x, xt
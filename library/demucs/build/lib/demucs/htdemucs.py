@@ -9,7 +9,6 @@ This code contains the spectrogram and Hybrid version of Demucs.
 """
 import math
 
-from openunmix.filtering import wiener
 import torch
 from torch import nn
 from torch.nn import functional as F
@@ -479,6 +478,8 @@ class HTDemucs(nn.Module):
 
     def _wiener(self, mag_out, mix_stft, niters):
         # apply wiener filtering from OpenUnmix.
+        from openunmix.filtering import wiener
+
         init = mix_stft.dtype
         wiener_win_len = 300
         residual = self.wiener_residual
@@ -524,7 +525,11 @@ class HTDemucs(nn.Module):
                     f"training length {training_length}")
         return training_length
 
-    def forward(self, mix):
+    def forward(self, mix, core=None):
+        """
+        `core` optionally replaces `_core`, the network between the spectrogram
+        of `mix` and the masking, e.g. to run its ONNX export (see `demucs.onnx_model`).
+        """
         length = mix.shape[-1]
         length_pre_pad = None
         if self.use_train_segment:
@@ -537,6 +542,40 @@ class HTDemucs(nn.Module):
                     mix = F.pad(mix, (0, training_length - length_pre_pad))
         z = self._spec(mix)
         mag = self._magnitude(z).to(mix.device)
+        x, xt = (core or self._core)(mix, mag)
+
+        # to cpu as mps doesnt support complex numbers
+        # demucs issue #435 ##432
+        # NOTE: in this case z already is on cpu
+        # TODO: remove this when mps supports complex numbers
+        x_is_mps = x.device.type == "mps"
+        if x_is_mps:
+            x = x.cpu()
+
+        zout = self._mask(z, x)
+        if self.use_train_segment:
+            if self.training:
+                x = self._ispec(zout, length)
+            else:
+                x = self._ispec(zout, training_length)
+        else:
+            x = self._ispec(zout, length)
+
+        # back to mps device
+        if x_is_mps:
+            x = x.to("mps")
+
+        x = xt + x
+        if length_pre_pad:
+            x = x[..., :length_pre_pad]
+        return x
+
+    def _core(self, mix, mag):
+        """
+        Network from the waveform `mix` and its spectrogram magnitude `mag`
+        (or complex as channels) to the source spectrograms and the source
+        waveforms of the time branch.
+        """
         x = mag
 
         B, C, Fq, T = x.shape
@@ -625,36 +664,7 @@ class HTDemucs(nn.Module):
         x = x.view(B, S, -1, Fq, T)
         x = x * std[:, None] + mean[:, None]
 
-        # to cpu as mps doesnt support complex numbers
-        # demucs issue #435 ##432
-        # NOTE: in this case z already is on cpu
-        # TODO: remove this when mps supports complex numbers
-        x_is_mps = x.device.type == "mps"
-        if x_is_mps:
-            x = x.cpu()
-
-        zout = self._mask(z, x)
-        if self.use_train_segment:
-            if self.training:
-                x = self._ispec(zout, length)
-            else:
-                x = self._ispec(zout, training_length)
-        else:
-            x = self._ispec(zout, length)
-
-        # back to mps device
-        if x_is_mps:
-            x = x.to("mps")
-
-        if self.use_train_segment:
-            if self.training:
-                xt = xt.view(B, S, -1, length)
-            else:
-                xt = xt.view(B, S, -1, training_length)
-        else:
-            xt = xt.view(B, S, -1, length)
+        # `mix` is already padded to the training length outside of training
+        xt = xt.view(B, S, -1, mix.shape[-1])
         xt = xt * stdt[:, None] + meant[:, None]
-        x = xt + x
-        if length_pre_pad:
-            x = x[..., :length_pre_pad]
-        return x
+        return x, xt
@@ -0,0 +1,126 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""ONNX export of the hybrid Demucs models and inference with onnxruntime.
+
+Only the network between the spectrogram and the masking (`_core` of `HDemucs` and
+`HTDemucs`) is exported: ONNX has no complex tensors, so the STFT, the masking and
+the iSTFT stay in torch. An export has a fixed segment length: `OnnxModel` runs
+the segments of that length from it, and shorter ones through the torch network.
+"""
+from fractions import Fraction
+import inspect
+from pathlib import Path
+import typing as tp
+
+import torch as th
+from torch import nn
+
+from .hdemucs import HDemucs
+from .htdemucs import HTDemucs
+
+ONNX_SUFFIX = '.onnx'
+INPUT_NAMES = ['mix', 'mag']
+OUTPUT_NAMES = ['spec', 'wave']
+
+
+class _Core(nn.Module):
+    # `torch.onnx.export` traces the `forward` of a module.
+    def __init__(self, model: tp.Union[HDemucs, HTDemucs]):
+        super().__init__()
+        self.model = model
+
+    def forward(self, mix, mag):
+        return self.model._core(mix, mag)
+
+
+def export_onnx(model: tp.Union[HDemucs, HTDemucs], path: tp.Union[str, Path],
+                segment: tp.Optional[float] = None, opset_version: int = 17) -> int:
+    """Export the network of `model` to `path`, for segments of `segment` seconds
+    (the model segment by default, always the training segment for `HTDemucs`).
+    The batch dimension is dynamic. Returns the segment length in samples."""
+    if isinstance(model, HTDemucs):
+        if segment is not None and segment != model.segment:
+            raise ValueError(f"HTDemucs only runs on its training segment ({model.segment}s)")
+    elif not isinstance(model, HDemucs) or not model.hybrid:
+        raise ValueError(f"Only hybrid HDemucs and HTDemucs models can be exported, "
+                         f"got {model.__class__.__name__}")
+    segment = model.segment if segment is None else segment
+    length = int(segment * model.samplerate)
+
+    model.eval()
+    mix = th.randn(1, model.audio_channels, length)
+    mag = model._magnitude(model._spec(mix))
+    kwargs: tp.Dict[str, tp.Any] = {}
+    if 'dynamo' in inspect.signature(th.onnx.export).parameters:
+        # The TorchScript exporter, the only one of older torch releases.
+        kwargs['dynamo'] = False
+    # The fused attention kernel of `nn.MultiheadAttention` has no ONNX export.
+    mha = getattr(th.backends, 'mha', None)
+    fastpath = mha.get_fastpath_enabled() if mha is not None else None
+    if mha is not None:
+        mha.set_fastpath_enabled(False)
+    try:
+        with th.no_grad():
+            th.onnx.export(_Core(model), (mix, mag), str(path),
+                           input_names=INPUT_NAMES, output_names=OUTPUT_NAMES,
+                           dynamic_axes={name: {0: 'batch'} for name in INPUT_NAMES + OUTPUT_NAMES},
+                           opset_version=opset_version, **kwargs)
+    finally:
+        if mha is not None:
+            mha.set_fastpath_enabled(fastpath)
+    return length
+
+
+class OnnxModel(nn.Module):
+    def __init__(self, model: tp.Union[HDemucs, HTDemucs], path: tp.Union[str, Path],
+                 num_threads: tp.Optional[int] = None):
+        """
+        Runs the network of `model` from its ONNX export at `path` with onnxruntime on CPU,
+        `model` itself provides the STFT, masking and iSTFT. Use it like the model with
+        `apply_model`, with `split=True` and `segment` left to None: the network only runs
+        from the export for inputs of its exact length, so shorter ones (the last segment
+        of a track with `HDemucs`) go through the torch network instead.
+
+        Args:
+            num_threads (int or None): intra-op threads of each onnxruntime run,
+                None lets onnxruntime decide.
+        """
+        super().__init__()
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(path), sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+        self.length: int = self.session.get_inputs()[0].shape[-1]
+
+        self.model = model.eval()
+        self.sources = model.sources
+        self.samplerate = model.samplerate
+        self.audio_channels = model.audio_channels
+        self.segment = Fraction(self.length, model.samplerate)
+
+    def valid_length(self, length: int) -> int:
+        if length > self.length:
+            raise ValueError(f"Cannot process {length} samples at once, the ONNX export "
+                             f"takes at most {self.length} (use split=True)")
+        if isinstance(self.model, HTDemucs):
+            return self.model.valid_length(length)
+        return length
+
+    def _core(self, mix, mag):
+        if mix.shape[-1] != self.length:
+            return self.model._core(mix, mag)
+        spec, wave = self.session.run(OUTPUT_NAMES, {
+            'mix': mix.detach().cpu().contiguous().numpy(),
+            'mag': mag.detach().cpu().contiguous().numpy(),
+        })
+        return th.from_numpy(spec), th.from_numpy(wave)
+
+    def forward(self, mix):
+        return self.model(mix, core=self._core)
@@ -10,8 +10,6 @@ import logging
 from pathlib import Path
 import typing as tp
 
-from dora.log import fatal, bold
-
 from .hdemucs import HDemucs
 from .repo import RemoteRepo, LocalRepo, ModelOnlyRepo, BagOnlyRepo, AnyModelRepo, ModelLoadingError  # noqa
 from .states import _check_diffq
@@ -70,6 +68,7 @@ def get_model(name: str,
         bag_repo = BagOnlyRepo(REMOTE_ROOT, model_repo)
     else:
         if not repo.is_dir():
+            from dora.log import fatal
             fatal(f"{repo} must exist and be a directory.")
         model_repo = LocalRepo(repo)
         bag_repo = BagOnlyRepo(repo, model_repo)
@@ -89,6 +88,8 @@ def get_model_from_args(args):
     """
     Load local model package or pre-trained model.
     """
+    from dora.log import bold
+
     if args.name is None:
         args.name = DEFAULT_MODEL
         print(bold("Important: the default model was recently changed to `htdemucs`"),
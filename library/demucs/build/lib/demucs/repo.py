@@ -9,14 +9,17 @@ with your own models.
 """
 
 from hashlib import sha256
+import json
+import os
 from pathlib import Path
 import typing as tp
+import warnings
 
 import torch
 import yaml
 
 from .apply import BagOfModels, Model
-from .states import load_model
+from .states import load_model, load_mapped_model, MAPPED_SUFFIX
 
 
 AnyModel = tp.Union[Model, BagOfModels]
@@ -26,7 +29,59 @@ class ModelLoadingError(RuntimeError):
     pass
 
 
-def check_checksum(path: Path, checksum: str):
+class ChecksumCache:
+    """Sidecar file recording which files already had their checksum verified.
+    Entries are keyed by path and only trusted while the size, mtime and inode of the file
+    are unchanged, so that any modification triggers a new verification.
+    Saving is best effort, e.g. a read-only model directory simply disables the cache.
+
+    With `build=True`, this is instead the sidecar written once when building an image
+    (see `LocalRepo.verify`), then only read. Its entries leave out the inode, which changes
+    whenever the image layers are extracted, and keep the mtime to the second, like the
+    layers do. Failing to save it is an error.
+    """
+    FILENAME = '.verified_checksums.json'
+    BUILD_FILENAME = '.build_verified.json'
+
+    def __init__(self, path: Path, build: bool = False):
+        self.path = path
+        self.build = build
+        self._entries: tp.Optional[dict] = None
+
+    @property
+    def entries(self) -> dict:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _stat(self, path: Path) -> dict:
+        stat = path.stat()
+        if self.build:
+            return {'size': stat.st_size, 'mtime': stat.st_mtime_ns // 10**9}
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino}
+
+    def is_verified(self, path: Path, checksum: str) -> bool:
+        entry = self.entries.get(str(path.resolve()))
+        return entry is not None and entry == dict(self._stat(path), checksum=checksum)
+
+    def add(self, path: Path, checksum: str):
+        self.entries[str(path.resolve())] = dict(self._stat(path), checksum=checksum)
+        tmp_path = self.path.parent / (self.path.name + f'.{os.getpid()}.tmp')
+        try:
+            tmp_path.write_text(json.dumps(self.entries, indent=2))
+            tmp_path.replace(self.path)
+        except OSError as exc:
+            if self.build:
+                raise
+            warnings.warn(f"Could not save verified checksums to {self.path}: {exc}")
+
+
+def check_checksum(path: Path, checksum: str, cache: tp.Optional[ChecksumCache] = None):
+    if cache is not None and cache.is_verified(path, checksum):
+        return
     sha = sha256()
     with open(path, 'rb') as file:
         while True:
@@ -38,6 +93,8 @@ def check_checksum(path: Path, checksum: str):
     if actual_checksum != checksum:
         raise ModelLoadingError(f'Invalid checksum for file {path}, '
                                 f'expected {checksum} but got {actual_checksum}')
+    if cache is not None:
+        cache.add(path, checksum)
 
 
 class ModelOnlyRepo:
@@ -74,15 +131,27 @@ class RemoteRepo(ModelOnlyRepo):
 
 
 class LocalRepo(ModelOnlyRepo):
+    """Local directory of `.th` packages, optionally along with memory mappable
+    `.safetensors` conversions of them (see `states.save_mapped_model`),
+    which are preferred when present.
+    Verified checksums are recorded in a `ChecksumCache` sidecar in `root`, so that unchanged
+    files are only hashed once. Files recorded in the build sidecar are not hashed at all,
+    see `verify`.
+    """
     def __init__(self, root: Path):
         self.root = root
+        self.checksum_cache = ChecksumCache(root / ChecksumCache.FILENAME)
+        self.build_checksum_cache = ChecksumCache(root / ChecksumCache.BUILD_FILENAME, build=True)
         self.scan()
 
     def scan(self):
         self._models = {}
         self._checksums = {}
+        self._mapped = {}
         for file in self.root.iterdir():
-            if file.suffix == '.th':
+            if file.suffix == MAPPED_SUFFIX:
+                self._mapped[file.stem] = file
+            elif file.suffix == '.th':
                 if '-' in file.stem:
                     xp_sig, checksum = file.stem.split('-')
                     self._checksums[xp_sig] = checksum
@@ -95,19 +164,31 @@ class LocalRepo(ModelOnlyRepo):
                 self._models[xp_sig] = file
 
     def has_model(self, sig: str) -> bool:
-        return sig in self._models
+        return sig in self._models or sig in self._mapped
 
     def get_model(self, sig: str) -> Model:
+        if sig in self._mapped:
+            return load_mapped_model(self._mapped[sig])
         try:
             file = self._models[sig]
         except KeyError:
             raise ModelLoadingError(f'Could not find pre-trained model with signature {sig}.')
-        if sig in self._checksums:
-            check_checksum(file, self._checksums[sig])
+        if sig in self._checksums and not self.build_checksum_cache.is_verified(file, self._checksums[sig]):
+            check_checksum(file, self._checksums[sig], self.checksum_cache)
         return load_model(file)
 
     def list_model(self) -> tp.Dict[str, tp.Union[str, Path]]:
-        return self._models
+        return {**self._models, **self._mapped}
+
+    def verify(self, build: bool = False) -> tp.List[str]:
+        """Verify the checksum of every model, recording them in the sidecar cache.
+        With `build=True`, record them in the build sidecar instead: meant to be run when
+        building an image, in the same layer as the model files, so that workers trust them
+        at runtime as long as they keep their size and mtime."""
+        cache = self.build_checksum_cache if build else self.checksum_cache
+        for sig, checksum in self._checksums.items():
+            check_checksum(self._models[sig], checksum, cache)
+        return list(self._checksums)
 
 
 class BagOnlyRepo:
@@ -164,3 +245,30 @@ class AnyModelRepo:
         for key, value in self.bag_repo.list_model().items():
             models[key] = value
         return models
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        "demucs.repo", description="Verify the checksums of a local model repository "
+        f"and record them in its {ChecksumCache.FILENAME} sidecar.")
+    parser.add_argument("root", type=Path)
+    parser.add_argument("--download", nargs="+", default=[], metavar="SIG",
+                        help="First download these pretrained models into root.")
+    parser.add_argument("--build", action="store_true",
+                        help=f"Record them in the {ChecksumCache.BUILD_FILENAME} sidecar instead, "
+                        "trusted while the files keep their size and mtime (image builds).")
+    args = parser.parse_args()
+    if args.download:
+        from .pretrained import REMOTE_ROOT, _parse_remote_files
+
+        remote = _parse_remote_files(REMOTE_ROOT / 'files.txt')
+        args.root.mkdir(parents=True, exist_ok=True)
+        for sig in args.download:
+            if sig not in remote:
+                parser.error(f"Unknown pretrained model signature {sig}.")
+            url = remote[sig]
+            torch.hub.download_url_to_file(url, str(args.root / url.rsplit('/', 1)[1]))
+    verified = LocalRepo(args.root).verify(build=args.build)
+    print(f"Verified {len(verified)} model(s) in {args.root}: {', '.join(sorted(verified))}")
@@ -5,8 +5,15 @@
 # LICENSE file in the root directory of this source tree.
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import functools
+import json
+import multiprocessing
+import os
 import sys
 from pathlib import Path
+import time
+import typing as tp
 
 from dora.log import fatal
 import torch as th
@@ -94,11 +101,167 @@ def get_parser():
                         default=0,
                         type=int,
                         help="Number of jobs. This can increase memory usage but will "
-                             "be much faster when multiple cores are available.")
+                             "be much faster when multiple cores are available. "
+                             "With --batch, number of worker processes.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Multi-file mode: keep the model loaded, separate the tracks in "
+                        "--jobs worker processes sharing the cpu threads (or with prefetched "
+                        "decoding and background encoding in a single process), record finished "
+                        "tracks in a manifest to skip them when resuming and print the throughput.")
+    parser.add_argument("--manifest", type=Path,
+                        help="Manifest of finished tracks for --batch. "
+                        "Default is manifest.json in the output folder.")
 
     return parser
 
 
+def _save_track(args, out: Path, track: Path, origin: th.Tensor, res: dict, samplerate: int):
+    if args.mp3:
+        ext = "mp3"
+    elif args.flac:
+        ext = "flac"
+    else:
+        ext = "wav"
+    kwargs = {
+        "samplerate": samplerate,
+        "bitrate": args.mp3_bitrate,
+        "preset": args.mp3_preset,
+        "clip": args.clip_mode,
+        "as_float": args.float32,
+        "bits_per_sample": 24 if args.int24 else 16,
+    }
+    if args.stem is None:
+        for name, source in res.items():
+            stem = out / args.filename.format(
+                track=track.name.rsplit(".", 1)[0],
+                trackext=track.name.rsplit(".", 1)[-1],
+                stem=name,
+                ext=ext,
+            )
+            stem.parent.mkdir(parents=True, exist_ok=True)
+            save_audio(source, str(stem), **kwargs)
+    else:
+        stem = out / args.filename.format(
+            track=track.name.rsplit(".", 1)[0],
+            trackext=track.name.rsplit(".", 1)[-1],
+            stem="minus_" + args.stem,
+            ext=ext,
+        )
+        if args.other_method == "minus":
+            stem.parent.mkdir(parents=True, exist_ok=True)
+            save_audio(origin - res[args.stem], str(stem), **kwargs)
+        stem = out / args.filename.format(
+            track=track.name.rsplit(".", 1)[0],
+            trackext=track.name.rsplit(".", 1)[-1],
+            stem=args.stem,
+            ext=ext,
+        )
+        stem.parent.mkdir(parents=True, exist_ok=True)
+        save_audio(res.pop(args.stem), str(stem), **kwargs)
+        # Warning : after poping the stem, selected stem is no longer in the dict 'res'
+        if args.other_method == "add":
+            other_stem = th.zeros_like(next(iter(res.values())))
+            for i in res.values():
+                other_stem += i
+            stem = out / args.filename.format(
+                track=track.name.rsplit(".", 1)[0],
+                trackext=track.name.rsplit(".", 1)[-1],
+                stem="no_" + args.stem,
+                ext=ext,
+            )
+            stem.parent.mkdir(parents=True, exist_ok=True)
+            save_audio(other_stem, str(stem), **kwargs)
+
+
+class _Manifest:
+    """Finished tracks of a --batch run, saved after each track so that an interrupted run
+    can be resumed."""
+    def __init__(self, path: Path):
+        self.path = path
+        self.tracks = json.loads(path.read_text()) if path.exists() else {}
+
+    def done(self, track: Path) -> bool:
+        return str(track.resolve()) in self.tracks
+
+    def add(self, track: Path, duration: float, elapsed: float):
+        self.tracks[str(track.resolve())] = {"duration": duration, "elapsed": elapsed}
+        tmp_path = self.path.parent / (self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.tracks, indent=2))
+        tmp_path.replace(self.path)
+
+
+_batch_separator = None
+
+
+def _init_batch_worker(args, threads: int):
+    global _batch_separator
+    th.set_num_threads(threads)
+    _batch_separator = Separator(model=args.name, repo=args.repo, device=args.device,
+                                 shifts=args.shifts, split=args.split, overlap=args.overlap,
+                                 segment=args.segment)
+
+
+def _separate_batch_track(args, out: Path, track: Path):
+    assert _batch_separator is not None
+    begin = time.time()
+    origin, res = _batch_separator.separate_audio_file(track)
+    _save_track(args, out, track, origin, res, _batch_separator.samplerate)
+    return track, origin.shape[-1] / _batch_separator.samplerate, time.time() - begin
+
+
+def _run_batch(args, separator: tp.Optional[Separator], out: Path, tracks):
+    manifest = _Manifest(args.manifest or out / "manifest.json")
+    todo = [track for track in tracks if not manifest.done(track)]
+    print(f"Batch: {len(tracks) - len(todo)} track(s) already done "
+          f"according to {manifest.path}, {len(todo)} to go")
+    failed = 0
+    total_duration = 0.
+    begin = time.time()
+
+    def _done(track, duration, elapsed):
+        nonlocal total_duration
+        total_duration += duration
+        manifest.add(track, duration, elapsed)
+        print(f"Separated {track} ({duration:.1f}s of audio in {elapsed:.1f}s)")
+
+    if args.jobs <= 1:
+        assert separator is not None
+        separator.update_parameter(progress=False)
+
+        def _failed(track, error):
+            nonlocal failed
+            failed += 1
+            print(f"Failed to separate {track}: {error}", file=sys.stderr)
+
+        last = time.time()
+        for track, origin, _ in separator.separate_many(
+                todo, save=functools.partial(_save_track, args, out,
+                                             samplerate=separator.samplerate),
+                on_error=_failed):
+            now = time.time()
+            _done(track, origin.shape[-1] / separator.samplerate, now - last)
+            last = now
+    else:
+        threads = max(1, (os.cpu_count() or 1) // args.jobs)
+        print(f"Batch: {args.jobs} worker processes with {threads} thread(s) each")
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(args.jobs, mp_context=context, initializer=_init_batch_worker,
+                                 initargs=(args, threads)) as pool:
+            futures = {pool.submit(_separate_batch_track, args, out, track): track
+                       for track in todo}
+            for future in as_completed(futures):
+                try:
+                    _done(*future.result())
+                except Exception as error:
+                    failed += 1
+                    print(f"Failed to separate {futures[future]}: {error}", file=sys.stderr)
+
+    elapsed = time.time() - begin
+    print(f"Batch done: {len(todo) - failed} track(s), {total_duration:.1f}s of audio in "
+          f"{elapsed:.1f}s ({total_duration / max(elapsed, 1e-9):.2f} audio-seconds per second)"
+          + (f", {failed} failed" if failed else ""))
+
+
 def main(opts=None):
     parser = get_parser()
     args = parser.parse_args(opts)
@@ -151,71 +314,30 @@ def main(opts=None):
     out = args.out / args.name
     out.mkdir(parents=True, exist_ok=True)
     print(f"Separated tracks will be stored in {out.resolve()}")
+    tracks = []
     for track in args.tracks:
         if not track.exists():
             print(f"File {track} does not exist. If the path contains spaces, "
                   'please try again after surrounding the entire path with quotes "".',
                   file=sys.stderr)
             continue
+        tracks.append(track)
+    if args.batch:
+        if args.jobs > 1:
+            # Each worker process loads its own model, the one above only served to validate
+            # the options and must not stay resident next to theirs.
+            del separator
+            if th.cuda.is_available():
+                th.cuda.empty_cache()
+            _run_batch(args, None, out, tracks)
+        else:
+            _run_batch(args, separator, out, tracks)
+        return
+    for track in tracks:
         print(f"Separating track {track}")
 
         origin, res = separator.separate_audio_file(track)
-
-        if args.mp3:
-            ext = "mp3"
-        elif args.flac:
-            ext = "flac"
-        else:
-            ext = "wav"
-        kwargs = {
-            "samplerate": separator.samplerate,
-            "bitrate": args.mp3_bitrate,
-            "preset": args.mp3_preset,
-            "clip": args.clip_mode,
-            "as_float": args.float32,
-            "bits_per_sample": 24 if args.int24 else 16,
-        }
-        if args.stem is None:
-            for name, source in res.items():
-                stem = out / args.filename.format(
-                    track=track.name.rsplit(".", 1)[0],
-                    trackext=track.name.rsplit(".", 1)[-1],
-                    stem=name,
-                    ext=ext,
-                )
-                stem.parent.mkdir(parents=True, exist_ok=True)
-                save_audio(source, str(stem), **kwargs)
-        else:
-            stem = out / args.filename.format(
-                track=track.name.rsplit(".", 1)[0],
-                trackext=track.name.rsplit(".", 1)[-1],
-                stem="minus_" + args.stem,
-                ext=ext,
-            )
-            if args.other_method == "minus":
-                stem.parent.mkdir(parents=True, exist_ok=True)
-                save_audio(origin - res[args.stem], str(stem), **kwargs)
-            stem = out / args.filename.format(
-                track=track.name.rsplit(".", 1)[0],
-                trackext=track.name.rsplit(".", 1)[-1],
-                stem=args.stem,
-                ext=ext,
-            )
-            stem.parent.mkdir(parents=True, exist_ok=True)
-            save_audio(res.pop(args.stem), str(stem), **kwargs)
-            # Warning : after poping the stem, selected stem is no longer in the dict 'res'
-            if args.other_method == "add":
-                other_stem = th.zeros_like(next(iter(res.values())))
-                for i in res.values():
-                    other_stem += i
-                stem = out / args.filename.format(
-                    track=track.name.rsplit(".", 1)[0],
-                    trackext=track.name.rsplit(".", 1)[-1],
-                    stem="no_" + args.stem,
-                    ext=ext,
-                )
-                stem.parent.mkdir(parents=True, exist_ok=True)
-                save_audio(other_stem, str(stem), **kwargs)
+        _save_track(args, out, track, origin, res, separator.samplerate)
 
 
 if __name__ == "__main__":
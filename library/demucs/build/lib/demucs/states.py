@@ -10,13 +10,15 @@ from contextlib import contextmanager
 
 import functools
 import hashlib
+import importlib
 import inspect
 import io
+import json
+import mmap
 from pathlib import Path
+import struct
 import warnings
 
-from omegaconf import OmegaConf
-from dora.log import fatal
 import torch
 
 
@@ -24,6 +26,7 @@ def _check_diffq():
     try:
         import diffq  # noqa
     except ImportError:
+        from dora.log import fatal
         fatal('Trying to use DiffQ, but diffq is not installed.\n'
               'On Windows run: python.exe -m pip install diffq \n'
               'On Linux/Mac, run: python3 -m pip install diffq')
@@ -63,23 +66,127 @@ def load_model(path_or_package, strict=False):
     klass = package["klass"]
     args = package["args"]
     kwargs = package["kwargs"]
+    model = _build_model(klass, args, kwargs, strict)
 
-    if strict:
-        model = klass(*args, **kwargs)
-    else:
+    state = package["state"]
+
+    set_state(model, state)
+    return model
+
+
+def _build_model(klass, args, kwargs, strict=False):
+    if not strict:
         sig = inspect.signature(klass)
         for key in list(kwargs):
             if key not in sig.parameters:
                 warnings.warn("Dropping inexistant parameter " + key)
                 del kwargs[key]
-        model = klass(*args, **kwargs)
+    return klass(*args, **kwargs)
 
-    state = package["state"]
 
-    set_state(model, state)
+MAPPED_SUFFIX = '.safetensors'
+_MAPPED_DTYPES = {
+    torch.float64: 'F64', torch.float32: 'F32', torch.float16: 'F16', torch.bfloat16: 'BF16',
+    torch.int64: 'I64', torch.int32: 'I32', torch.int16: 'I16', torch.int8: 'I8',
+    torch.uint8: 'U8', torch.bool: 'BOOL',
+}
+
+
+def save_mapped_model(model, path):
+    """Save `model` as a flat tensor file that `load_mapped_model` can memory-map.
+    The layout is the safetensors one: the size of the JSON header as a little endian u64,
+    the JSON header giving dtype, shape and byte range of each tensor along with
+    the model class and init arguments under `__metadata__`, then the raw tensor data.
+    Quantized models must be restored (i.e. loaded with `load_model`) before saving,
+    the weights are then stored unquantized."""
+    path = Path(path)
+    args, kwargs = model._init_args_kwargs
+    klass = model.__class__
+    try:
+        metadata = {
+            'klass': f'{klass.__module__}.{klass.__qualname__}',
+            'args': json.dumps(args),
+            'kwargs': json.dumps(kwargs),
+        }
+    except TypeError as exc:
+        raise ValueError(f"Cannot serialize the init arguments of {klass.__name__}: {exc}")
+
+    state = {k: v.detach().cpu().contiguous() for k, v in model.state_dict().items()}
+    # Largest items first, so that every tensor is aligned on its item size.
+    names = sorted(state, key=lambda k: -state[k].element_size())
+    header: dict = {'__metadata__': metadata}
+    offset = 0
+    for name in names:
+        tensor = state[name]
+        size = tensor.numel() * tensor.element_size()
+        header[name] = {
+            'dtype': _MAPPED_DTYPES[tensor.dtype],
+            'shape': list(tensor.shape),
+            'data_offsets': [offset, offset + size],
+        }
+        offset += size
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b' ' * (-len(header_bytes) % 8)
+
+    tmp_path = path.parent / (path.name + '.tmp')
+    with open(tmp_path, 'wb') as file:
+        file.write(struct.pack('<Q', len(header_bytes)))
+        file.write(header_bytes)
+        for name in names:
+            file.write(state[name].reshape(-1).view(torch.uint8).numpy().tobytes())
+    tmp_path.replace(path)
+
+
+def load_mapped_model(path, strict=False):
+    """Load a model saved with `save_mapped_model`.
+    The weights are views on a private memory map of the file: pages are only read
+    when first used, and processes loading the same file share them through the page cache
+    as long as they do not modify the weights."""
+    dtypes = {v: k for k, v in _MAPPED_DTYPES.items()}
+    with open(path, 'rb') as file:
+        header_size, = struct.unpack('<Q', file.read(8))
+        header = json.loads(file.read(header_size))
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    start = 8 + header_size
+
+    metadata = header.pop('__metadata__')
+    module_name, _, name = metadata['klass'].rpartition('.')
+    klass = getattr(importlib.import_module(module_name), name)
+    model = _build_model(klass, json.loads(metadata['args']), json.loads(metadata['kwargs']),
+                         strict)
+
+    state = {}
+    for key, info in header.items():
+        dtype = dtypes[info['dtype']]
+        begin, end = info['data_offsets']
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        if count:
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=start + begin)
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        state[key] = tensor.view(info['shape'])
+    _assign_state(model, state, path)
     return model
 
 
+def _assign_state(model, state, path):
+    # `load_state_dict` copies into the existing parameters, which would defeat the memory map.
+    # Rebinding `.data` instead works for both parameters and buffers.
+    own = model.state_dict(keep_vars=True)
+    if set(own) != set(state):
+        missing = sorted(set(own) - set(state))
+        unexpected = sorted(set(state) - set(own))
+        raise ValueError(f"State mismatch when loading {path}, "
+                         f"missing: {missing}, unexpected: {unexpected}")
+    for key, value in own.items():
+        tensor = state[key]
+        if value.shape != tensor.shape or value.dtype != tensor.dtype:
+            raise ValueError(f"Invalid shape or dtype for {key} in {path}, "
+                             f"expected {value.dtype}{list(value.shape)}, "
+                             f"got {tensor.dtype}{list(tensor.shape)}")
+        value.data = tensor
+
+
 def get_state(model, quantizer, half=False):
     """Get the state from a model, potentially with quantization applied.
     If `half` is True, model are stored as half precision, which shouldn't impact performance
@@ -119,6 +226,8 @@ def save_with_checksum(content, path):
 
 
 def serialize_model(model, training_args, quantizer=None, half=True):
+    from omegaconf import OmegaConf
+
     args, kwargs = model._init_args_kwargs
     klass = model.__class__
 
@@ -5,8 +5,11 @@
 # LICENSE file in the root directory of this source tree.
 """Loading wav based datasets, including MusdbHQ."""
 
+import bisect
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import hashlib
+import itertools
 import math
 import json
 import os
@@ -15,11 +18,17 @@ import tqdm
 
 import musdb
 import julius
+import numpy as np
 import torch as th
 from torch import distributed
 import torchaudio as ta
 from torch.nn import functional as F
 
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
 from .audio import convert_audio_channels
 from . import distrib
 
@@ -34,16 +43,22 @@ def _track_metadata(track, sources, normalize=True, ext=EXT):
     std = 1
     for source in sources + [MIXTURE]:
         file = track / f"{source}{ext}"
+        mixture_stats = None
         if source == MIXTURE and not file.exists():
-            audio = 0
-            for sub_source in sources:
-                sub_file = track / f"{sub_source}{ext}"
-                sub_audio, sr = ta.load(sub_file)
-                audio += sub_audio
-            would_clip = audio.abs().max() >= 1
-            if would_clip:
-                assert ta.get_audio_backend() == 'soundfile', 'use dset.backend=soundfile'
-            ta.save(file, audio, sr, encoding='PCM_F')
+            stems = [track / f"{sub_source}{ext}" for sub_source in sources]
+            if soundfile is None:
+                audio = 0
+                for sub_file in stems:
+                    sub_audio, sr = ta.load(sub_file)
+                    audio += sub_audio
+                would_clip = audio.abs().max() >= 1
+                if would_clip:
+                    assert ta.get_audio_backend() == 'soundfile', 'use dset.backend=soundfile'
+                ta.save(file, audio, sr, encoding='PCM_F')
+            else:
+                # The stems were all checked above, their sum is written and its stats
+                # gathered block by block.
+                mixture_stats = _mono_stats(_mix_blocks(stems, file, track_samplerate))
 
         try:
             info = ta.info(str(file))
@@ -62,20 +77,74 @@ def _track_metadata(track, sources, normalize=True, ext=EXT):
             raise ValueError(
                 f"Invalid sample rate for file {file}: "
                 f"expecting {track_samplerate} but got {info.sample_rate}.")
-        if source == MIXTURE and normalize:
+        if source == MIXTURE and normalize and mixture_stats is not None:
+            mean, std = mixture_stats
+        elif source == MIXTURE and normalize:
             try:
-                wav, _ = ta.load(str(file))
+                mean, std = _file_mono_stats(file)
             except RuntimeError:
                 print(file)
                 raise
-            wav = wav.mean(0)
-            mean = wav.mean().item()
-            std = wav.std().item()
 
-    return {"length": length, "mean": mean, "std": std, "samplerate": track_samplerate}
+    return {"length": length, "mean": mean, "std": std, "samplerate": track_samplerate,
+            "normalize": normalize, "mtimes": _track_mtimes(track, sources, ext)}
+
+
+def _read_blocks(file, blocksize=2**20):
+    return soundfile.blocks(str(file), blocksize=blocksize, dtype='float32', always_2d=True)
+
+
+def _mix_blocks(stems, file, samplerate, blocksize=2**20):
+    """Sum the `stems` files block by block into `file` (float samples, so that the
+    mixture never clips), yielding every block of the mixture on the way.
+    A partially written `file` is removed if anything fails."""
+    channels = soundfile.info(str(stems[0])).channels
+    try:
+        with soundfile.SoundFile(str(file), 'w', samplerate, channels, subtype='FLOAT') as out:
+            for blocks in zip(*(_read_blocks(stem, blocksize) for stem in stems)):
+                block = np.sum(blocks, axis=0)
+                out.write(block)
+                yield block
+    except BaseException:
+        file.unlink(missing_ok=True)
+        raise
+
+
+def _mono_stats(blocks):
+    """Mean and (unbiased) std of the mono downmix of `blocks` of (frames, channels) audio,
+    accumulated block by block rather than over the whole track at once."""
+    total = 0.
+    total_squares = 0.
+    count = 0
+    for block in blocks:
+        mono = block.mean(axis=1, dtype=np.float64)
+        total += mono.sum()
+        total_squares += mono.dot(mono)
+        count += len(mono)
+    mean = total / count
+    variance = (total_squares - count * mean**2) / max(count - 1, 1)
+    return float(mean), float(math.sqrt(max(variance, 0.)))
+
+
+def _file_mono_stats(file):
+    """`_mono_stats` of `file`, streamed by blocks rather than decoding it at once."""
+    if soundfile is None:
+        wav, _ = ta.load(str(file))
+        wav = wav.mean(0)
+        return wav.mean().item(), wav.std().item()
+    return _mono_stats(_read_blocks(file))
 
 
-def build_metadata(path, sources, normalize=True, ext=EXT):
+def _track_mtimes(track, sources, ext=EXT):
+    mtimes = {}
+    for source in sources + [MIXTURE]:
+        file = track / f"{source}{ext}"
+        if file.exists():
+            mtimes[file.name] = file.stat().st_mtime_ns
+    return mtimes
+
+
+def build_metadata(path, sources, normalize=True, ext=EXT, previous=None, workers=None):
     """
     Build the metadata for `Wavset`.
 
@@ -85,18 +154,26 @@ def build_metadata(path, sources, normalize=True, ext=EXT):
         normalize (bool): if True, loads full track and store normalization
             values based on the mixture file.
         ext (str): extension of audio files (default is .wav).
+        previous (dict or None): metadata from a previous call. Entries of tracks
+            whose files have the same mtimes are reused instead of being recomputed.
+        workers (int or None): number of processes used, default is the number of cpus.
     """
 
     meta = {}
     path = Path(path)
+    previous = previous or {}
     pendings = []
-    from concurrent.futures import ThreadPoolExecutor
-    with ThreadPoolExecutor(8) as pool:
+    with ProcessPoolExecutor(workers) as pool:
         for root, folders, files in os.walk(path, followlinks=True):
             root = Path(root)
             if root.name.startswith('.') or folders or root == path:
                 continue
             name = str(root.relative_to(path))
+            entry = previous.get(name)
+            if (entry is not None and entry.get('normalize') == normalize and
+                    entry.get('mtimes') == _track_mtimes(root, sources, ext)):
+                meta[name] = entry
+                continue
             pendings.append((name, pool.submit(_track_metadata, root, sources, normalize, ext)))
             # meta[name] = _track_metadata(root, sources, normalize, ext)
         for name, pending in tqdm.tqdm(pendings, ncols=120):
@@ -105,6 +182,9 @@ def build_metadata(path, sources, normalize=True, ext=EXT):
 
 
 class Wavset:
+    # Maximum number of audio files kept open by each process, see `_read`.
+    max_open_files = 64
+
     def __init__(
             self,
             root, metadata, sources,
@@ -148,40 +228,78 @@ class Wavset:
             else:
                 examples = int(math.ceil((track_duration - self.segment) / self.shift) + 1)
             self.num_examples.append(examples)
+        self._names = list(self.metadata)
+        # Index of the first example after each track, for bisecting in `__getitem__`.
+        self._ends = list(itertools.accumulate(self.num_examples))
+        self._handles: OrderedDict = OrderedDict()
 
     def __len__(self):
-        return sum(self.num_examples)
+        return self._ends[-1] if self._ends else 0
+
+    def __getstate__(self):
+        # Open files are not shared with the DataLoader workers, each opens its own.
+        state = dict(self.__dict__)
+        state['_handles'] = OrderedDict()
+        return state
 
     def get_file(self, name, source):
         return self.root / name / f"{source}{self.ext}"
 
+    def _read(self, file, offset, num_frames):
+        # Files stay open (up to `max_open_files`, least recently used are closed) so that
+        # headers are only parsed once per file rather than for every segment.
+        # Falls back to torchaudio when soundfile is missing or cannot read the file.
+        if file in self._handles:
+            self._handles.move_to_end(file)
+            handle = self._handles[file]
+        else:
+            handle = None
+            if soundfile is not None:
+                try:
+                    handle = soundfile.SoundFile(str(file))
+                except RuntimeError:
+                    pass
+            self._handles[file] = handle
+            if len(self._handles) > self.max_open_files:
+                _, old = self._handles.popitem(last=False)
+                if old is not None:
+                    old.close()
+        if handle is None:
+            wav, _ = ta.load(str(file), frame_offset=offset, num_frames=num_frames)
+            return wav
+        handle.seek(offset)
+        wav = handle.read(num_frames, dtype='float32', always_2d=True)
+        return th.from_numpy(wav.T.copy())
+
     def __getitem__(self, index):
-        for name, examples in zip(self.metadata, self.num_examples):
-            if index >= examples:
-                index -= examples
-                continue
-            meta = self.metadata[name]
-            num_frames = -1
-            offset = 0
-            if self.segment is not None:
-                offset = int(meta['samplerate'] * self.shift * index)
-                num_frames = int(math.ceil(meta['samplerate'] * self.segment))
-            wavs = []
-            for source in self.sources:
-                file = self.get_file(name, source)
-                wav, _ = ta.load(str(file), frame_offset=offset, num_frames=num_frames)
-                wav = convert_audio_channels(wav, self.channels)
-                wavs.append(wav)
-
-            example = th.stack(wavs)
-            example = julius.resample_frac(example, meta['samplerate'], self.samplerate)
-            if self.normalize:
-                example = (example - meta['mean']) / meta['std']
-            if self.segment:
-                length = int(self.segment * self.samplerate)
-                example = example[..., :length]
-                example = F.pad(example, (0, length - example.shape[-1]))
-            return example
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        track = bisect.bisect_right(self._ends, index)
+        if track > 0:
+            index -= self._ends[track - 1]
+        name = self._names[track]
+        meta = self.metadata[name]
+        num_frames = -1
+        offset = 0
+        if self.segment is not None:
+            offset = int(meta['samplerate'] * self.shift * index)
+            num_frames = int(math.ceil(meta['samplerate'] * self.segment))
+        wavs = []
+        for source in self.sources:
+            file = self.get_file(name, source)
+            wav = self._read(file, offset, num_frames)
+            wav = convert_audio_channels(wav, self.channels)
+            wavs.append(wav)
+
+        example = th.stack(wavs)
+        example = julius.resample_frac(example, meta['samplerate'], self.samplerate)
+        if self.normalize:
+            example = (example - meta['mean']) / meta['std']
+        if self.segment:
+            length = int(self.segment * self.samplerate)
+            example = example[..., :length]
+            example = F.pad(example, (0, length - example.shape[-1]))
+        return example
 
 
 def get_wav_datasets(args, name='wav'):
@@ -191,11 +309,15 @@ def get_wav_datasets(args, name='wav'):
     metadata_file = Path(args.metadata) / ('wav_' + sig + ".json")
     train_path = Path(path) / "train"
     valid_path = Path(path) / "valid"
-    if not metadata_file.is_file() and distrib.rank == 0:
-        metadata_file.parent.mkdir(exist_ok=True, parents=True)
-        train = build_metadata(train_path, args.sources)
-        valid = build_metadata(valid_path, args.sources)
-        json.dump([train, valid], open(metadata_file, "w"))
+    if distrib.rank == 0:
+        previous = [{}, {}]
+        if metadata_file.is_file():
+            previous = json.load(open(metadata_file))
+        train = build_metadata(train_path, args.sources, previous=previous[0])
+        valid = build_metadata(valid_path, args.sources, previous=previous[1])
+        if [train, valid] != previous:
+            metadata_file.parent.mkdir(exist_ok=True, parents=True)
+            json.dump([train, valid], open(metadata_file, "w"))
     if distrib.world_size > 1:
         distributed.barrier()
     train, valid = json.load(open(metadata_file))
@@ -226,10 +348,14 @@ def get_musdb_wav_datasets(args):
     sig = hashlib.sha1(str(args.musdb).encode()).hexdigest()[:8]
     metadata_file = Path(args.metadata) / ('musdb_' + sig + ".json")
     root = Path(args.musdb) / "train"
-    if not metadata_file.is_file() and distrib.rank == 0:
-        metadata_file.parent.mkdir(exist_ok=True, parents=True)
-        metadata = build_metadata(root, args.sources)
-        json.dump(metadata, open(metadata_file, "w"))
+    if distrib.rank == 0:
+        previous = {}
+        if metadata_file.is_file():
+            previous = json.load(open(metadata_file))
+        metadata = build_metadata(root, args.sources, previous=previous)
+        if metadata != previous:
+            metadata_file.parent.mkdir(exist_ok=True, parents=True)
+            json.dump(metadata, open(metadata_file, "w"))
     if distrib.world_size > 1:
         distributed.barrier()
     metadata = json.load(open(metadata_file))